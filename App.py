@@ -6,12 +6,16 @@ import pandas as pd
 import traceback
 from pipeline.runners import run_colombia_mercancia, run_venezuela_mercancia
 from pipeline.export import write_excel_with_raw
+from pipeline.publish import publish_run
+from pipeline.preview import preview_lines, preview_mercancia
+from core.plan import compile_plan
+from core.profiling import SamplingProfiler, profile_labels, profile_path, top_lines
 
 class App(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Presupuesto Mercancía (CO / VE) - Pandas + YAML")
-        self.geometry("820x540"); self.resizable(False, False)
+        self.geometry("820x630"); self.resizable(False, False)
 
         self.var_country = tk.StringVar(value="Colombia")
         self.var_schema  = tk.StringVar(value="./schema/schema.yaml")
@@ -21,6 +25,9 @@ class App(tk.Tk):
         self.var_rsf     = tk.StringVar(value="")
         self.var_out     = tk.StringVar(value="./mercancia.xlsx")
         self.var_exec    = tk.StringVar(value=pd.Timestamp.today().strftime("%Y-%m-%d"))
+        self.var_stages  = tk.BooleanVar(value=False)
+        self.var_preview = tk.BooleanVar(value=False)
+        self.var_profile = tk.BooleanVar(value=False)
 
         row=0
         tk.Label(self, text="País:").grid(row=row, column=0, padx=10, pady=6, sticky="w")
@@ -43,6 +50,9 @@ class App(tk.Tk):
         tk.Label(self, text="Fecha de ejecución (yyyy-mm-dd):").grid(row=row, column=0, padx=10, pady=6, sticky="w")
         tk.Entry(self, textvariable=self.var_exec, width=20).grid(row=row, column=1, padx=6, pady=6, sticky="w")
         tk.Label(self, text="*Se ajustará al lunes de esa semana.").grid(row=row, column=2, padx=6, pady=6, sticky="w"); row+=1
+        tk.Checkbutton(self, text="Mostrar etapas reutilizadas (checkpoints)", variable=self.var_stages).grid(row=row, column=1, padx=6, pady=2, sticky="w"); row+=1
+        tk.Checkbutton(self, text="Vista previa (muestra por fuente, sin exportar Excel)", variable=self.var_preview).grid(row=row, column=1, padx=6, pady=2, sticky="w"); row+=1
+        tk.Checkbutton(self, text="Perfilar corrida (flame graph junto a la salida + funciones más costosas)", variable=self.var_profile).grid(row=row, column=1, padx=6, pady=2, sticky="w"); row+=1
 
         self.btn_run = tk.Button(self, text="Generar Consolidado", command=self.run_job, height=2)
         self.btn_run.grid(row=row, column=0, columnspan=3, padx=10, pady=12, sticky="we"); row+=1
@@ -69,28 +79,31 @@ class App(tk.Tk):
             self.var_cfg.set(p)
 
     def pick_ebs(self):
-        p = filedialog.askopenfilename(
-            title="Selecciona EBS",
+        # Varios archivos (p. ej. uno por unidad operativa o por mes) quedan separados por ";"
+        p = filedialog.askopenfilenames(
+            title="Selecciona EBS (uno o varios archivos)",
             filetypes=[("Excel/CSV", "*.xlsx *.xls *.csv"), ("Todos", "*.*")],
         )
         if p:
-            self.var_ebs.set(p)
+            self.var_ebs.set(";".join(p))
 
     def pick_reim(self):
-        p = filedialog.askopenfilename(
-            title="Selecciona REIM",
+        # Varios archivos (p. ej. uno por unidad operativa o por mes) quedan separados por ";"
+        p = filedialog.askopenfilenames(
+            title="Selecciona REIM (uno o varios archivos)",
             filetypes=[("Excel/CSV", "*.xlsx *.xls *.csv"), ("Todos", "*.*")],
         )
         if p:
-            self.var_reim.set(p)
+            self.var_reim.set(";".join(p))
 
     def pick_rsf(self):
-        p = filedialog.askopenfilename(
-            title="Selecciona RSF",
+        # Varios archivos (p. ej. uno por unidad operativa o por mes) quedan separados por ";"
+        p = filedialog.askopenfilenames(
+            title="Selecciona RSF (uno o varios archivos)",
             filetypes=[("Excel/CSV", "*.xlsx *.xls *.csv"), ("Todos", "*.*")],
         )
         if p:
-            self.var_rsf.set(p)
+            self.var_rsf.set(";".join(p))
 
     def pick_out(self):
         p = filedialog.asksaveasfilename(
@@ -109,7 +122,16 @@ class App(tk.Tk):
             if value == "Colombia":  self.var_cfg.set("./schema/colombia.yaml")
             elif value == "Venezuela": self.var_cfg.set("./schema/venezuela.yaml")
 
+    def finish_profile(self, prof: SamplingProfiler, out: str):
+            prof.stop()
+            for line in top_lines(prof, 20):
+                self.logln(line)
+            self.logln(f"Flame graph: {prof.write_folded(profile_path(out))}")
+
     def run_job(self):
+            prof = None
+            out = ""
+            raws = None
             try:
                 self.btn_run.config(state="disabled"); self.log.delete("1.0","end")
                 country = self.var_country.get().strip()
@@ -120,8 +142,10 @@ class App(tk.Tk):
                 rsf     = self.var_rsf.get().strip()
                 out     = self.var_out.get().strip()
                 exec_s  = self.var_exec.get().strip()
+                preview = self.var_preview.get()
 
-                for label, path in [("Schema",schema),("Config país",cfg),("EBS",ebs),("REIM",reim),("RSF",rsf),("Salida",out)]:
+                required = [("Schema",schema),("Config país",cfg),("EBS",ebs),("REIM",reim),("RSF",rsf)] + ([] if preview else [("Salida",out)])
+                for label, path in required:
                     if not path:
                         messagebox.showerror("Falta información", f"Selecciona: {label}")
                         self.btn_run.config(state="normal"); return
@@ -134,6 +158,17 @@ class App(tk.Tk):
                 exec_mon = exec_date - pd.to_timedelta(exec_date.weekday(), unit="D")
                 self.logln(f"País: {country}")
                 self.logln(f"Ejecución (lunes): {exec_mon.date()}")
+                if self.var_profile.get():
+                    prof = SamplingProfiler(labels=profile_labels(compile_plan(schema, cfg)))
+                    prof.start()
+
+                if preview:
+                    self.logln("Vista previa sobre una muestra de cada fuente…")
+                    df, export_cfg = preview_mercancia(schema, cfg, ebs, reim, rsf, exec_date=exec_mon)
+                    for line in preview_lines(df, export_cfg):
+                        self.logln(line)
+                    return
+
                 self.logln("Leyendo y consolidando…")
 
                 if country.lower() == "venezuela":
@@ -149,6 +184,39 @@ class App(tk.Tk):
                     df = res; raws={}; export_cfg={}
 
                 self.logln(f"Filas consolidadas: {len(df):,}")
+                val = export_cfg.get("__validation")
+                if val is not None and not val.empty:
+                    for r in val[val["estado"] != "OK"].itertuples(index=False):
+                        self.logln(f"Validación {r.fuente} [{r.chequeo}] {r.columna}: {r.valor}")
+                quar = export_cfg.get("__quarantine")
+                if quar is not None and not quar.empty:
+                    self.logln(f"AVISO: {len(quar):,} filas con celdas no parseables (hoja Cuarentena).")
+                stats = export_cfg.get("__lookup_stats")
+                if stats is not None and not stats.empty:
+                    for r in stats.itertuples(index=False):
+                        fz = f", {r.aproximados:,} aproximados" if r.aproximados else ""
+                        self.logln(f"Lookup {r.lookup} [{r.fuente}]: {r.con_match:,}/{r.filas:,} con match ({r.tasa:.1%}{fz})")
+                terms = export_cfg.get("__payment_terms")
+                if terms is not None and not terms.empty:
+                    self.logln(f"AVISO: {len(terms):,} términos de pago sin días reconocibles ({int(terms['filas'].sum()):,} filas, hoja Terminos sin dias).")
+                ckpt = export_cfg.get("__checkpoints")
+                if self.var_stages.get():
+                    if ckpt is None:
+                        self.logln("Checkpoints desactivados (mercancia.checkpoints.enabled).")
+                    else:
+                        reused = [r.etapa for r in ckpt.itertuples(index=False) if r.estado == "reutilizada"]
+                        self.logln(f"Etapas reutilizadas: {', '.join(reused) if reused else 'ninguna'}")
+                timings = export_cfg.get("__timings")
+                if timings is not None and not timings.empty:
+                    etapas = ", ".join(f"{r.etapa} {r.segundos:.1f}s" for r in timings.itertuples(index=False))
+                    self.logln(f"Etapas ({export_cfg.get('__string_storage', 'python')}): {etapas}")
+                if export_cfg.get("__archive"):
+                    self.logln(f"Archivo histórico: {export_cfg['__archive']}")
+                if export_cfg.get("__archive_error"):
+                    self.logln(f"AVISO: no se pudo agregar al archivo histórico ({export_cfg['__archive_error']}).")
+                pub = publish_run(export_cfg, df, raws, exec_mon)
+                if pub is not None:
+                    self.logln(f"Publicado (Arrow Flight) en {pub[0]}: {len(pub[1])} tickets, p. ej. {pub[1][0]}")
                 self.logln("Exportando a Excel…")
                 tipo_map = export_cfg.get("__tipo_map") if country.lower()=="venezuela" else None
                 if country.lower()=="venezuela" and (tipo_map is None or getattr(tipo_map, "empty", True)):
@@ -162,6 +230,10 @@ class App(tk.Tk):
                 self.logln("ERROR:\n"+err)
                 messagebox.showerror("Error", err)
             finally:
+                if hasattr(raws, "close"):
+                    raws.close()  # libera crudos retenidos / archivos de spill, también si la corrida falló
+                if prof is not None:
+                    self.finish_profile(prof, out)
                 self.btn_run.config(state="normal")
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""
+Tiempo por etapa con los filtros del consolidado en Polars (consulta lazy) vs pandas
+(mercancia.execution.engine) y verificación de que el consolidado es idéntico. Uso:
+  python -m bench.bench_engine --rows 300000 [--country venezuela]
+"""
+from __future__ import annotations
+import argparse
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from bench.synthetic import local_country_config, write_masters, write_sources
+from pipeline.polars_engine import polars_available
+from pipeline.runners import run_mercancia
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--data", default="./bench_data")
+    ap.add_argument("--country", default="venezuela", choices=["venezuela", "colombia"])
+    ap.add_argument("--format", choices=["xlsx", "csv"], default="csv")
+    a = ap.parse_args()
+
+    data = Path(a.data)
+    src = {k: data / f"{k}.{a.format}" for k in ("ebs", "reim", "rsf")}
+    if not all(p.exists() for p in src.values()) or os.environ.get("BENCH_REGEN"):
+        print(f"generando {a.rows} filas en {data} ...")
+        write_sources(str(data), a.rows, a.format)
+    write_masters(str(data))
+
+    engines = ["pandas", "polars"] if polars_available() else ["pandas"]
+    if len(engines) == 1:
+        print("polars no instalado: solo se mide pandas")
+    cols, outs = {}, {}
+    for engine in engines:
+        cfg = local_country_config(str(ROOT / "schema" / f"{a.country}.yaml"), str(data.resolve()),
+                                   str(data / f"{a.country}_{engine}.yaml"), execution={"engine": engine})
+        df, raws, ec = run_mercancia(str(ROOT / "schema" / "schema.yaml"), cfg, str(src["ebs"]), str(src["reim"]),
+                                     str(src["rsf"]), exec_date=pd.Timestamp("2025-03-10"), checkpoints=False)
+        cols[engine] = ec["__timings"].set_index("etapa")["segundos"]
+        outs[engine] = df
+        raws.close()
+
+    table = pd.DataFrame(cols)
+    table.loc["TOTAL"] = table.sum()
+    if len(cols) == 2:
+        table["x"] = (table["pandas"] / table["polars"]).round(2)
+        same = outs["pandas"].equals(outs["polars"])
+        print(f"{a.country}: {len(outs['pandas'])} filas en el consolidado; salida idéntica: {same}")
+    else:
+        print(f"{a.country}: {len(outs['pandas'])} filas en el consolidado")
+    print(table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
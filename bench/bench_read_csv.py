@@ -0,0 +1,58 @@
+"""
+Throughput de los lectores CSV de core.Lectura (pyarrow multihilo vs pandas) sobre una fuente
+sintética con el formato de las exportaciones CO (separador ';', coma decimal).
+Uso:  python -m bench.bench_read_csv --rows 2000000 [--engines arrow pandas] [--memory-map]
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+from pathlib import Path
+
+from bench.synthetic import make_sources
+from core.Lectura import read_source, resolve_csv_engine
+
+
+def _write(path: Path, rows: int) -> None:
+    df = make_sources(rows)["ebs"]
+    df.to_csv(path, index=False, sep=";", decimal=",", encoding="utf-8")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--data", default="./bench_data")
+    ap.add_argument("--engines", nargs="+", default=["arrow", "pandas"])
+    ap.add_argument("--memory-map", action="store_true")
+    ap.add_argument("--repeat", type=int, default=3)
+    a = ap.parse_args()
+
+    path = Path(a.data) / "ebs_co.csv"
+    if not path.exists() or os.environ.get("BENCH_REGEN"):
+        print(f"generando {a.rows} filas en {path} ...")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write(path, a.rows)
+    mb = path.stat().st_size / 2**20
+
+    print(f"{path} ({mb:.0f} MB)")
+    print(f"{'motor':<10}{'filas':>10}{'seg':>9}{'MB/s':>9}{'descartadas':>13}")
+    ref = None
+    for engine in a.engines:
+        opts = {"sep": ";", "decimal": ",", "encoding": "utf-8", "csv_engine": engine, "memory_map": a.memory_map}
+        try:
+            resolve_csv_engine(opts)
+        except ValueError as e:
+            print(f"{engine:<10}  ({e})")
+            continue
+        best = float("inf")
+        for _ in range(max(a.repeat, 1)):
+            t = time.perf_counter()
+            df = read_source(path, opts)
+            best = min(best, time.perf_counter() - t)
+        same = "" if ref is None else ("  = ref" if df.equals(ref) else "  DIFIERE")
+        ref = df if ref is None else ref
+        print(f"{engine:<10}{len(df):>10}{best:>9.2f}{mb / best:>9.1f}{df.attrs.get('bad_lines', 0):>13}{same}")
+
+
+if __name__ == "__main__":
+    main()
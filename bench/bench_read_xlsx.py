@@ -0,0 +1,58 @@
+"""
+Compara los motores de lectura xlsx de core.Lectura sobre fuentes sintéticas.
+Uso:  python -m bench.bench_read_xlsx --rows 300000 [--engines calamine stream openpyxl]
+"""
+from __future__ import annotations
+import argparse
+import os
+import time
+import tracemalloc
+from pathlib import Path
+
+from core.Lectura import calamine_available, iter_xlsx_batches, read_source
+from bench.synthetic import write_sources
+
+
+def _time(fn):
+    """(resultado, segundos, pico MB). El pico se mide en una segunda pasada: tracemalloc distorsiona el tiempo."""
+    t = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, dt, peak
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--data", default="./bench_data")
+    ap.add_argument("--engines", nargs="+", default=["calamine", "stream", "openpyxl"])
+    ap.add_argument("--batch-rows", type=int, default=50_000)
+    a = ap.parse_args()
+
+    path = Path(a.data) / "ebs.xlsx"
+    if not path.exists() or os.environ.get("BENCH_REGEN"):
+        print(f"generando {a.rows} filas en {a.data} ...")
+        write_sources(a.data, a.rows)
+
+    print(f"{'motor':<16}{'filas':>10}{'seg':>9}{'pico MB':>10}")
+    ref = None
+    for engine in a.engines:
+        if engine == "calamine" and not calamine_available():
+            print(f"{engine:<16}{'(python-calamine no instalado)':>29}")
+            continue
+        df, dt, peak = _time(lambda: read_source(path, {"engine": engine, "batch_rows": a.batch_rows}))
+        same = "" if ref is None else ("  = ref" if df.equals(ref) else "  DIFIERE")
+        ref = df if ref is None else ref
+        print(f"{engine:<16}{len(df):>10}{dt:>9.2f}{peak / 2**20:>10.1f}{same}")
+
+    # Lotes del motor stream: memoria acotada al lote (sin concatenar)
+    n, dt, peak = _time(lambda: sum(len(b) for b in iter_xlsx_batches(path, 0, a.batch_rows)))
+    print(f"{'stream (lotes)':<16}{n:>10}{dt:>9.2f}{peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Tiempo por etapa del runner con texto en Arrow (string[pyarrow]) vs objetos Python
+(mercancia.execution.string_storage). Uso:
+  python -m bench.bench_stages --rows 300000 [--country venezuela] [--storages python pyarrow]
+"""
+from __future__ import annotations
+import argparse
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from bench.synthetic import local_country_config, write_masters, write_sources
+from core.dtypes import resolve_string_storage
+from pipeline.runners import run_mercancia
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--data", default="./bench_data")
+    ap.add_argument("--country", default="venezuela", choices=["venezuela", "colombia"])
+    ap.add_argument("--storages", nargs="+", default=["python", "pyarrow"])
+    ap.add_argument("--format", choices=["xlsx", "csv"], default="csv",
+                    help="csv aísla el costo de las etapas del de parsear xlsx")
+    a = ap.parse_args()
+
+    data = Path(a.data)
+    src = {k: data / f"{k}.{a.format}" for k in ("ebs", "reim", "rsf")}
+    if not all(p.exists() for p in src.values()) or os.environ.get("BENCH_REGEN"):
+        print(f"generando {a.rows} filas en {data} ...")
+        write_sources(str(data), a.rows, a.format)
+    write_masters(str(data))
+
+    cols = {}
+    rows = None
+    for storage in a.storages:
+        if resolve_string_storage(storage) != storage:
+            print(f"{storage}: no disponible (pyarrow no instalado), se omite")
+            continue
+        cfg = local_country_config(str(ROOT / "schema" / f"{a.country}.yaml"), str(data.resolve()),
+                                   str(data / f"{a.country}_{storage}.yaml"), execution={"string_storage": storage})
+        df, raws, ec = run_mercancia(str(ROOT / "schema" / "schema.yaml"), cfg, str(src["ebs"]), str(src["reim"]),
+                                     str(src["rsf"]), exec_date=pd.Timestamp("2025-03-10"), checkpoints=False)
+        t = ec["__timings"].set_index("etapa")["segundos"]
+        cols[storage] = t
+        rows = len(df) if rows is None else rows
+        raws.close()
+
+    if not cols:
+        return
+    table = pd.DataFrame(cols)
+    table.loc["TOTAL"] = table.sum()
+    if len(cols) == 2:
+        a_, b_ = table.columns
+        table["x"] = (table[a_] / table[b_]).round(2)
+    print(f"{a.country}: {rows} filas en el consolidado")
+    print(table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Tiempo por etapa con ingesta tipada (fechas/montos nativos de Excel conservados) vs todo
+como texto (mercancia.execution.typed_ingestion), sobre xlsx con celdas fecha/número reales.
+Verifica que las hojas crudas sean idénticas y lista las columnas del consolidado que cambian
+(en modo texto una fecha ISO "2025-03-27 00:00:00" puede caer en NaT o invertir día/mes con
+dayfirst; en modo tipado se conserva la fecha real de la celda). Uso:
+  python -m bench.bench_typed_ingestion --rows 100000 [--country venezuela]
+"""
+from __future__ import annotations
+import argparse
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from bench.synthetic import local_country_config, write_masters, write_sources
+from pipeline.runners import run_mercancia
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--data", default="./bench_data/native")
+    ap.add_argument("--country", default="venezuela", choices=["venezuela", "colombia"])
+    a = ap.parse_args()
+
+    data = Path(a.data)
+    src = {k: data / f"{k}.xlsx" for k in ("ebs", "reim", "rsf")}
+    if not all(p.exists() for p in src.values()) or os.environ.get("BENCH_REGEN"):
+        print(f"generando {a.rows} filas (celdas tipadas) en {data} ...")
+        write_sources(str(data), a.rows, "xlsx", native=True)
+    write_masters(str(data))
+
+    cols, outs = {}, {}
+    for typed in (False, True):
+        label = "tipada" if typed else "texto"
+        cfg = local_country_config(str(ROOT / "schema" / f"{a.country}.yaml"), str(data.resolve()),
+                                   str(data / f"{a.country}_{label}.yaml"), execution={"typed_ingestion": typed})
+        df, raws, ec = run_mercancia(str(ROOT / "schema" / "schema.yaml"), cfg, str(src["ebs"]), str(src["reim"]),
+                                     str(src["rsf"]), exec_date=pd.Timestamp("2025-03-10"), checkpoints=False)
+        cols[label] = ec["__timings"].set_index("etapa")["segundos"]
+        outs[label] = (df, {k: raws[k] for k in raws})
+        raws.close()
+
+    table = pd.DataFrame(cols)
+    table.loc["TOTAL"] = table.sum()
+    table["x"] = (table["texto"] / table["tipada"]).round(2)
+    (d0, r0), (d1, r1) = outs["texto"], outs["tipada"]
+    d0, d1 = d0.reset_index(drop=True), d1.reset_index(drop=True)
+    raws_same = r0.keys() == r1.keys() and all(r0[k].equals(r1[k]) for k in r0)
+    if list(d0.columns) == list(d1.columns) and len(d0) == len(d1):
+        diff = {c: int((d0[c].ne(d1[c]) & ~(d0[c].isna() & d1[c].isna())).sum())
+                for c in d0.columns if not d0[c].equals(d1[c])}
+    else:
+        diff = {"(forma)": abs(len(d0) - len(d1))}
+    print(f"{a.country}: {len(d1)} filas en el consolidado; hojas crudas idénticas: {raws_same}; "
+          f"columnas que difieren: {diff or 'ninguna'}")
+    print(table.round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
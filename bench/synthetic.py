@@ -0,0 +1,150 @@
+"""
+Generador de fuentes sintéticas (EBS/REIM/RSF) con los encabezados de schema/*.yaml,
+para los benchmarks de bench/. Uso:  python -m bench.synthetic --rows 300000 --out ./bench_data
+"""
+from __future__ import annotations
+import argparse
+import os
+from typing import Dict
+import numpy as np
+import pandas as pd
+import xlsxwriter
+import yaml
+
+from pipeline.xlsx_stream import StreamingSheetWriter
+
+PROVEEDORES = [f"PROVEEDOR {i} C.A." for i in range(400)] + ["ACME S.A.", "DROGUERIA  NORTE", "Farmacéutica Sur"]
+
+
+def _dates(rng: np.random.Generator, n: int, fmt: str, native: bool = False) -> np.ndarray:
+    d = pd.Timestamp("2025-03-10") + pd.to_timedelta(rng.integers(-20, 25, n), unit="D")
+    return d.to_numpy() if native else d.strftime(fmt).to_numpy()
+
+
+def _amounts(rng: np.random.Generator, n: int, lo: float, hi: float, native: bool = False) -> np.ndarray:
+    v = rng.uniform(lo, hi, n)
+    return np.round(v, 2) if native else np.char.mod("%.2f", v)
+
+
+def make_sources(rows: int, seed: int = 7, native: bool = False) -> Dict[str, pd.DataFrame]:
+    """native=True: fechas y montos como celdas fecha/número de Excel (no texto)."""
+    _d = lambda rng, n, fmt: _dates(rng, n, fmt, native)
+    _a = lambda rng, n, lo, hi: _amounts(rng, n, lo, hi, native)
+    rng = np.random.default_rng(seed)
+    n = int(rows)
+    ids = np.arange(n).astype(str)
+    oc = np.char.add("OC", rng.integers(1, max(n, 2), n).astype(str))
+    ebs = pd.DataFrame({
+        "INVOICE ID": ids,
+        "PROVEEDOR": rng.choice(PROVEEDORES, n),
+        "DOCUMENTO": np.char.add("F-", np.char.zfill(ids, 7)),
+        "ORDEN": oc,
+        "FECHA DOCUMENTO": _d(rng, n, "%d/%m/%y"),
+        "FECHA CREACION": _d(rng, n, "%d/%m/%Y"),
+        "MONTO DOCUMENTO": _a(rng, n, -500, 5000),
+        "TERMINO PAGO": rng.choice(["NETO A 30 DIAS", "30", "2% A 45 DIAS DPP"], n),
+        "FECHA A PAGAR": _d(rng, n, "%Y-%m-%d"),
+        "PRIORIDAD": rng.choice(["7", "8", "12", "13", "22", "24", "25", ""], n),
+        "TIPO": rng.choice(["STANDARD", "CREDIT"], n),
+        "MONTO A PAGAR": _a(rng, n, -500, 5000),
+        "ESTATUS": "VALIDADO",
+    })
+    reim = pd.DataFrame({
+        "Proveedor": rng.choice(PROVEEDORES, n),
+        "Número Factura": np.char.add("R-", np.char.zfill(ids, 7)),
+        "Fecha Factura": _d(rng, n, "%d/%m/%Y"),
+        "Sucursal": rng.choice(["SUC 1", "SUC PPV", "SUC-PPV3"], n),
+        "Tienda": rng.choice(["CENDIS", "TIENDA 12"], n),
+        "Orden Compra": np.char.add("OC", rng.integers(1, max(n, 2), n).astype(str)),
+        "Tipo Documento": rng.choice(["FACTURA", "", "NOTA"], n),
+        "SubTotal": _a(rng, n, 10, 9000) if native else np.char.replace(_a(rng, n, 10, 9000), ".", ","),
+        "Total con Impuesto": _a(rng, n, 10, 9000),
+        "Término de Pago": rng.choice(["NETO A 30 DIAS", "2% A 45 DIAS DPP", "1.4/60 DPP", "CONTADO", "15"], n),
+        "Fecha Vencimiento": _d(rng, n, "%Y-%m-%d"),
+        "Fecha Recepción": _d(rng, n, "%d/%m/%Y"),
+        "Fecha Creación": _d(rng, n, "%d/%m/%Y"),
+    })
+    rsf = pd.DataFrame({
+        "Orden de Compra": np.char.add("OC", rng.integers(1, max(n, 2), n).astype(str)),
+        "Sucursal Proveedor": rng.choice(["SUC 1", "SUC PPV"], n),
+        "Proveedor": rng.choice(PROVEEDORES, n),
+        "Tienda": rng.choice(["CENDIS", "TIENDA 3"], n),
+        "Estatus": rng.choice(["Recepción sin factura", "Facturada"], n),
+        "Días Condición (RMS)": rng.choice(["30", "45", "60", ""], n),
+        "Recepción": _a(rng, n, 0, 9000),
+        "Fecha Recepción": _d(rng, n, "%d/%m/%Y"),
+    })
+    return {"ebs": ebs, "reim": reim, "rsf": rsf}
+
+
+def write_sources(out_dir: str, rows: int, fmt: str = "xlsx", seed: int = 7, native: bool = False) -> Dict[str, str]:
+    """Escribe las tres fuentes en out_dir (xlsx con xlsxwriter en modo constant_memory, o csv)."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, df in make_sources(rows, seed, native).items():
+        path = os.path.join(out_dir, f"{name}.{fmt}")
+        if fmt == "csv":
+            df.to_csv(path, index=False, encoding="utf-8")
+        else:
+            # constant_memory exige escribir fila a fila (to_excel escribe por columnas)
+            book = xlsxwriter.Workbook(path, {"constant_memory": True})
+            try:
+                StreamingSheetWriter(book).write("Sheet1", df)
+            finally:
+                book.close()
+        paths[name] = path
+    return paths
+
+
+# Maestros locales que reemplazan las URLs de Google Sheets en los YAML
+MASTER_FILES = {"prioridades": "prio.csv", "factoring": "fact.csv", "tipo_mercancia": "tipo.csv"}
+
+
+def write_masters(out_dir: str, seed: int = 7) -> Dict[str, str]:
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    frames = {
+        "prioridades": pd.DataFrame({"PROVEEDOR": PROVEEDORES[:300],
+                                     "PRIORIDAD": rng.choice(["7", "8", "12", "13", "22", "24", "25"], 300)}),
+        "factoring": pd.DataFrame({"PRIORIDAD": ["7", "8", "12", "13", "22", "24", "25"],
+                                   "FACTORING": ["SI", "NO", "SI", "NO", "SI", "NO", "SI"]}),
+        "tipo_mercancia": pd.DataFrame({"PROVEEDOR": PROVEEDORES[:250],
+                                        "TIPO": rng.choice(["DIRECTO", "ALMACEN", "SUMINISTROS", "PPV RMS"], 250)}),
+    }
+    paths = {}
+    for name, df in frames.items():
+        paths[name] = os.path.join(out_dir, MASTER_FILES[name])
+        df.to_csv(paths[name], index=False, encoding="utf-8")
+    return paths
+
+
+def local_country_config(country_yaml: str, data_dir: str, out_path: str, execution: Dict | None = None) -> str:
+    """Copia del YAML del país con los maestros apuntando a data_dir (y mercancia.execution opcional)."""
+    with open(country_yaml, encoding="utf-8") as f:
+        cfg = yaml.safe_load(f)
+
+    def patch(node):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if k in MASTER_FILES and isinstance(v, dict) and v.get("url"):
+                    v["url"] = os.path.join(data_dir, MASTER_FILES[k])
+                    v.pop("cache", None)
+                patch(v)
+
+    patch(cfg)
+    if execution:
+        cfg["mercancia"]["execution"] = {**(cfg["mercancia"].get("execution") or {}), **execution}
+    with open(out_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True, sort_keys=False)
+    return out_path
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Genera fuentes sintéticas EBS/REIM/RSF")
+    ap.add_argument("--rows", type=int, default=300_000)
+    ap.add_argument("--out", default="./bench_data")
+    ap.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    ap.add_argument("--native", action="store_true", help="fechas/montos como celdas tipadas de Excel")
+    a = ap.parse_args()
+    for k, p in {**write_sources(a.out, a.rows, a.format, native=a.native), **write_masters(a.out)}.items():
+        print(k, p)
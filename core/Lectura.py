@@ -1,22 +1,332 @@
 from __future__ import annotations
+import codecs
+import csv
+import importlib.util
+import io
+import warnings
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Mapping, Tuple
 import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+from pandas.io.parsers import TextParser
 import yaml
 
+from .dtypes import is_native_cell
+from .sampling import reservoir_sample
+from .utils import header_key
+
+# Motores de lectura xlsx (inputs.<src>.engine):
+#   auto      -> calamine si está instalado (python-calamine), si no stream
+#   calamine  -> pd.read_excel(engine="calamine") (parser en Rust)
+#   stream    -> openpyxl read_only, filas por lotes (memoria acotada por lote)
+#   openpyxl  -> pd.read_excel por defecto (comportamiento histórico)
+XLSX_ENGINES = ("auto", "calamine", "stream", "openpyxl")
+DEFAULT_BATCH_ROWS = 50_000
+# Lector CSV/TXT (inputs.<src>.csv_engine):
+#   auto    -> arrow si pyarrow está instalado, si no pandas
+#   arrow   -> pyarrow.csv multihilo (memory_map: true para mapear el archivo)
+#   pandas  -> pd.read_csv (comportamiento histórico)
+# Las líneas con campos de menos se completan con NaN y las con campos de más se descartan
+# y se cuentan en df.attrs["bad_lines"]; arrow relee con pandas si encuentra alguna.
+CSV_ENGINES = ("auto", "arrow", "pandas")
+
 def load_yaml(p: str | Path) -> Dict[str, Any]:
     with open(p, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-def read_source(path: Path, opts: Dict[str, Any]) -> pd.DataFrame:
-    if path.suffix.lower() in (".csv", ".txt"):
-        return pd.read_csv(
+def calamine_available() -> bool:
+    return importlib.util.find_spec("python_calamine") is not None
+
+def resolve_xlsx_engine(opts: Dict[str, Any] | None) -> str:
+    engine = str((opts or {}).get("engine") or "auto").lower()
+    if engine not in XLSX_ENGINES:
+        raise ValueError(f"inputs.engine inválido: {engine!r} (opciones: {', '.join(XLSX_ENGINES)})")
+    if engine == "auto":
+        return "calamine" if calamine_available() else "stream"
+    if engine == "calamine" and not calamine_available():
+        raise ValueError("inputs.engine = calamine pero python-calamine no está instalado.")
+    return engine
+
+def resolve_csv_engine(opts: Mapping[str, Any] | None) -> str:
+    engine = str((opts or {}).get("csv_engine") or "auto").lower()
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"inputs.csv_engine inválido: {engine!r} (opciones: {', '.join(CSV_ENGINES)})")
+    arrow = importlib.util.find_spec("pyarrow") is not None
+    if engine == "auto":
+        return "arrow" if arrow else "pandas"
+    if engine == "arrow" and not arrow:
+        raise ValueError("inputs.csv_engine = arrow pero pyarrow no está instalado.")
+    return engine
+
+def _is_xlsx(path: Path) -> bool:
+    return path.suffix.lower() in (".xlsx", ".xlsm")
+
+def _cell(v):
+    # Misma conversión que el lector openpyxl de pandas: vacío -> "", float entero -> int
+    if v is None:
+        return ""
+    if isinstance(v, float):
+        iv = int(v)
+        return iv if iv == v else v
+    return v
+
+def _rows_to_frame(header: List[Any], rows: List[List[Any]]) -> pd.DataFrame:
+    """Arma el lote con el mismo TextParser que usa pd.read_excel (NA, dtype=str, encabezados repetidos)."""
+    return TextParser([header] + rows, header=0, dtype=str, skip_blank_lines=False).read()
+
+def _iter_xlsx_rows(path: Path, sheet: int | str = 0, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[Tuple[List[Any], List[List[Any]]]]:
+    """(encabezado, filas) por lotes con los valores de celda de openpyxl read_only (ver _cell)."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = None
+        for r in rows:
+            header = [_cell(v) for v in r]
+            while header and header[-1] == "":
+                header.pop()
+            if header:
+                break
+        if not header:
+            return
+        width = len(header)
+        batch: List[List[Any]] = []
+        blanks: List[List[Any]] = []   # filas vacías pendientes (solo se emiten si siguen datos)
+        emitted = False
+        for r in rows:
+            row = [_cell(v) for v in r[:width]]
+            if len(row) < width:
+                row.extend([""] * (width - len(row)))
+            if all(v == "" for v in row):
+                blanks.append(row)
+                continue
+            if blanks:
+                batch.extend(blanks)
+                blanks = []
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield header, batch
+                emitted = True
+                batch = []
+        if batch or not emitted:
+            yield header, batch
+    finally:
+        wb.close()
+
+def iter_xlsx_batches(path: Path, sheet: int | str = 0, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Lee una hoja xlsx con openpyxl en modo read_only y entrega DataFrames de hasta
+    `batch_rows` filas (todas con las mismas columnas, dtype=str). Las filas vacías al
+    final de la hoja se descartan, como en pd.read_excel.
+    """
+    for header, rows in _iter_xlsx_rows(path, sheet, batch_rows):
+        yield _rows_to_frame(header, rows)
+
+def iter_source_batches(path: Path, opts: Dict[str, Any], batch_rows: int | None = None) -> Iterator[pd.DataFrame]:
+    """
+    Entrega la fuente por lotes (dtype=str). Con el motor stream (xlsx) o CSV la memoria
+    queda acotada al lote; con calamine/openpyxl se entrega un único lote.
+    """
+    batch_rows = int(batch_rows or opts.get("batch_rows") or DEFAULT_BATCH_ROWS)
+    path = Path(path)
+    if _is_xlsx(path) and resolve_xlsx_engine(opts) == "stream":
+        yield from iter_xlsx_batches(path, opts.get("sheet", 0), batch_rows)
+    elif path.suffix.lower() in (".csv", ".txt"):
+        yield from pd.read_csv(
             path, sep=opts.get("sep", ","), decimal=opts.get("decimal", "."),
-            encoding=opts.get("encoding"), dtype=str, on_bad_lines="skip",
+            encoding=opts.get("encoding"), dtype=str, on_bad_lines="skip", chunksize=batch_rows,
         )
-    if path.suffix.lower() in (".xlsx", ".xls"):
+    else:
+        yield read_source(path, opts)
+
+def _mangle(names: List[str]) -> List[str]:
+    """Encabezados como los deja pd.read_csv: vacíos -> 'Unnamed: i', repetidos -> 'X.1', 'X.2'."""
+    out: List[str] = []
+    seen: Dict[str, int] = {}
+    for i, n in enumerate(names):
+        n = n if n != "" else f"Unnamed: {i}"
+        base = n
+        while n in seen:
+            seen[base] += 1
+            n = f"{base}.{seen[base]}"
+        seen.setdefault(n, 0)
+        out.append(n)
+    return out
+
+def _read_csv_arrow(src: Path | bytes, opts: Mapping[str, Any]) -> pd.DataFrame:
+    """
+    CSV con pyarrow.csv (multihilo), todo como texto y los mismos faltantes que pd.read_csv
+    (dtype=str). Retorna None si hay líneas mal formadas: Arrow solo puede descartarlas y
+    pd.read_csv completa con NaN las que traen campos de menos, así que se relee con pandas.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    sep = opts.get("sep", ",")
+    enc = codecs.lookup(opts.get("encoding") or "utf-8").name
+    arrow_enc = "utf8" if enc in ("utf-8", "utf-8-sig") else enc   # Arrow ya descarta el BOM
+    if isinstance(src, bytes):
+        source, head = pa.BufferReader(src), src[:1 << 16]
+    else:
+        source = pa.memory_map(str(src)) if opts.get("memory_map") else str(src)
+        with open(src, "rb") as f:
+            head = f.read(1 << 16)
+    # Encabezado con csv (comillas incluidas) para pedir todas las columnas como texto
+    text = head.decode(enc, errors="replace").lstrip("\ufeff")
+    header = next(csv.reader(io.StringIO(text), delimiter=sep), [])
+    if not header:
+        return pd.DataFrame()
+    names = _mangle(header)
+
+    bad = [0]
+    def on_bad(row) -> str:
+        bad[0] += 1
+        return "skip"   # basta con una para releer con pandas; se sigue para no abortar en Arrow
+
+    table = pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True, encoding=arrow_enc, skip_rows=1, column_names=names),
+        parse_options=pacsv.ParseOptions(delimiter=sep, invalid_row_handler=on_bad),
+        convert_options=pacsv.ConvertOptions(column_types={n: pa.string() for n in names},
+                                             null_values=sorted(STR_NA_VALUES), strings_can_be_null=True,
+                                             quoted_strings_can_be_null=True),
+    )
+    if bad[0]:
+        return None
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    df.attrs["bad_lines"] = 0
+    return df
+
+def _read_csv_pandas(src: Path | bytes, opts: Mapping[str, Any]) -> pd.DataFrame:
+    """pd.read_csv(dtype=str); las líneas con campos de más se descartan y se cuentan."""
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        df = pd.read_csv(
+            io.BytesIO(src) if isinstance(src, bytes) else src, sep=opts.get("sep", ","),
+            decimal=opts.get("decimal", "."), encoding=opts.get("encoding"), dtype=str, on_bad_lines="warn",
+            memory_map=bool(opts.get("memory_map")) and not isinstance(src, bytes),
+        )
+    df.attrs["bad_lines"] = sum(str(w.message).count("Skipping line") for w in caught
+                                if issubclass(w.category, pd.errors.ParserWarning))
+    return df
+
+def read_csv_source(src: Path | bytes, opts: Mapping[str, Any]) -> pd.DataFrame:
+    """
+    CSV/TXT como texto (dtype=str) con el motor de inputs.<src>.csv_engine; df.attrs["bad_lines"]
+    = líneas descartadas (se avisa con un warning). El motor arrow cae a pandas si `decimal` no
+    es "." o si hay líneas mal formadas, para que el resultado sea siempre el de pd.read_csv.
+    """
+    df = None
+    if resolve_csv_engine(opts) == "arrow" and str(opts.get("decimal", ".")) == ".":
+        df = _read_csv_arrow(src, opts)
+    if df is None:
+        df = _read_csv_pandas(src, opts)
+    if df.attrs.get("bad_lines"):
+        name = "<bytes>" if isinstance(src, bytes) else Path(src).name
+        warnings.warn(f"{name}: {df.attrs['bad_lines']} líneas con campos de más descartadas", UserWarning, stacklevel=2)
+    return df
+
+def read_source(path: Path, opts: Dict[str, Any]) -> pd.DataFrame:
+    if path.suffix.lower() in (".csv", ".txt"):
+        return read_csv_source(path, opts)
+    if _is_xlsx(path):
+        engine = resolve_xlsx_engine(opts)
+        if engine == "stream":
+            parts = list(iter_xlsx_batches(path, opts.get("sheet", 0), int(opts.get("batch_rows") or DEFAULT_BATCH_ROWS)))
+            return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+        return pd.read_excel(path, sheet_name=opts.get("sheet", 0), dtype=str,
+                             engine="calamine" if engine == "calamine" else None)
+    if path.suffix.lower() == ".xls":
         return pd.read_excel(path, sheet_name=opts.get("sheet", 0), dtype=str)
     return pd.read_csv(path, dtype=str)
 
-def read_csv_resilient(src: str) -> pd.DataFrame:
-    return pd.read_csv(src, dtype=str, encoding="utf-8-sig")
+def read_source_sample(path: Path, opts: Dict[str, Any], rows: int, seed: int = 0, strata: str | None = None,
+                       full_scan: bool = False) -> pd.DataFrame:
+    """
+    Muestra acotada de la fuente (dtype=str, mismas columnas que read_source) para la vista previa.
+      - CSV: reservoir sobre los lotes de read_csv (toda la fuente, memoria acotada), estratificado
+        por la columna `strata` si existe.
+      - xlsx/xls: las primeras `rows` filas con el límite del lector (stream corta la lectura,
+        read_excel usa nrows). Con full_scan el xlsx stream se recorre completo con reservoir.
+    """
+    path = Path(path)
+    rows = max(int(rows), 1)
+    is_csv = path.suffix.lower() in (".csv", ".txt")
+    if is_csv or (full_scan and _is_xlsx(path) and resolve_xlsx_engine(opts) == "stream"):
+        return reservoir_sample(iter_source_batches(path, opts), rows, seed=seed, strata=strata)
+    if _is_xlsx(path) and resolve_xlsx_engine(opts) == "stream":
+        it = _iter_xlsx_rows(path, opts.get("sheet", 0), rows)
+        try:
+            header, batch = next(it, (None, []))
+        finally:
+            it.close()
+        return _rows_to_frame(header, batch[:rows]) if header else pd.DataFrame()
+    if _is_xlsx(path) or path.suffix.lower() == ".xls":
+        engine = resolve_xlsx_engine(opts) if _is_xlsx(path) else None
+        return pd.read_excel(path, sheet_name=opts.get("sheet", 0), dtype=str, nrows=rows,
+                             engine="calamine" if engine == "calamine" else None)
+    return pd.read_csv(path, dtype=str, nrows=rows)
+
+def _native_positions(header: List[Any], native: Mapping[str, str]) -> Dict[int, str]:
+    return {i: native[k] for i, h in enumerate(header) if (k := header_key(h)) in native}
+
+def _overlay(values: List[Any], kind: str) -> pd.Series | None:
+    """Serie object con el valor nativo donde la celda ya venía tipada (None en el resto)."""
+    out = pd.Series([v if is_native_cell(v, kind) else None for v in values], dtype=object)
+    return out if out.notna().any() else None
+
+def read_source_typed(path: Path, opts: Dict[str, Any], native: Mapping[str, str]) -> Tuple[pd.DataFrame, Dict[int, pd.Series]]:
+    """
+    Ingesta tipada: (crudo, nativos).
+      - crudo: idéntico a read_source (dtype=str); es lo que va a las hojas "(Original)".
+      - nativos: {posición de columna: Serie object} para las columnas cuyo encabezado está
+        en `native` (header_key -> "datetime" | "number"), con la fecha/número tal como vino
+        de Excel en las celdas ya tipadas y None en las de texto. apply_native los superpone.
+    CSV no trae tipos: nativos queda vacío.
+    """
+    path = Path(path)
+    if _is_xlsx(path) and resolve_xlsx_engine(opts) == "stream":
+        parts, values, pos = [], {}, {}
+        for header, rows in _iter_xlsx_rows(path, opts.get("sheet", 0), int(opts.get("batch_rows") or DEFAULT_BATCH_ROWS)):
+            pos = _native_positions(header, native)
+            parts.append(_rows_to_frame(header, rows))
+            for i in pos:
+                values.setdefault(i, []).extend(r[i] for r in rows)
+        df = parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    elif _is_xlsx(path) or path.suffix.lower() == ".xls":
+        engine = resolve_xlsx_engine(opts) if _is_xlsx(path) else None
+        obj = pd.read_excel(path, sheet_name=opts.get("sheet", 0), dtype=object,
+                            engine="calamine" if engine == "calamine" else None)
+        # Mismo texto que dtype=str: str() de cada celda y faltantes como NaN (astype(str) solo daría "nan")
+        df = pd.DataFrame({i: (s := obj.iloc[:, i]).astype(str).where(s.notna()) for i in range(obj.shape[1])})
+        df.columns = obj.columns
+        pos = _native_positions(list(obj.columns), native)
+        values = {i: obj.iloc[:, i].tolist() for i in pos}
+    else:
+        return read_source(path, opts), {}
+    overlay = {}
+    for i, kind in pos.items():
+        ser = _overlay(values.get(i, []), kind)
+        if ser is not None:
+            overlay[i] = ser
+    return df, overlay
+
+def apply_native(df: pd.DataFrame, overlay: Mapping[int, pd.Series] | None) -> pd.DataFrame:
+    """Copia superficial del crudo con las celdas nativas (read_source_typed) en lugar de su texto."""
+    if not overlay:
+        return df
+    out = df.copy(deep=False)
+    for i, ser in overlay.items():
+        col = df.iloc[:, i]
+        mixed = ser.set_axis(col.index)
+        out.isetitem(i, mixed.where(mixed.notna(), col.astype(object)))
+    return out
+
+def read_csv_resilient(src: str | bytes) -> pd.DataFrame:
+    """Maestro CSV (ruta local o cuerpo ya descargado); una URL se lee con pandas."""
+    if isinstance(src, str) and src.lower().startswith(("http://", "https://")):
+        return pd.read_csv(src, dtype=str, encoding="utf-8-sig")
+    return read_csv_source(src, {"encoding": "utf-8-sig"})
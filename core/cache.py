@@ -0,0 +1,129 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple
+import pandas as pd
+
+from .Lectura import read_csv_resilient
+
+# Opciones de inputs.<src> que no cambian cómo se parsea el archivo (no entran en la llave)
+_NON_READ_OPTS = {"file_pattern", "dedupe", "workers"}
+
+
+def file_digest(path: str | Path) -> str:
+    """Hash (sha1) del contenido de un archivo, leído por bloques."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MemoCache:
+    """
+    Cache en memoria thread-safe (LRU con TTL opcional). Cada llave se carga una sola vez
+    aunque varios hilos la pidan a la vez: el resto espera el resultado del primero.
+    """
+
+    def __init__(self, max_items: int = 32, ttl_s: float | None = None):
+        self.max_items = int(max_items)
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+
+    def _get(self, key: Hashable) -> Tuple[bool, Any]:
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+        if self.ttl_s is not None and time.monotonic() - item[0] > self.ttl_s:
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, item[1]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(valor, hit)."""
+        with self._lock:
+            hit, value = self._get(key)
+            if hit:
+                return value, True
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                hit, value = self._get(key)
+            if hit:
+                return value, True
+            try:
+                value = loader()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            with self._lock:
+                self._data[key] = (time.monotonic(), value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_items:
+                    self._data.popitem(last=False)
+                self._loading.pop(key, None)
+        return value, False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCaches:
+    """
+    Caches compartidos entre corridas del mismo proceso (servicio local):
+      masters: URL del maestro -> DataFrame descargado (con TTL)
+      inputs:  contenido del archivo + opciones de lectura -> crudo parseado
+    Los DataFrames cacheados no se modifican: cada uso recibe una copia superficial.
+    """
+
+    def __init__(self, master_ttl_s: float | None = 3600, max_masters: int = 64, max_inputs: int = 12):
+        self.masters = MemoCache(max_masters, master_ttl_s)
+        self.inputs = MemoCache(max_inputs)
+        self._digests = MemoCache(256)
+
+    def job(self) -> "JobCaches":
+        return JobCaches(self)
+
+    def file_digest(self, path: Path) -> str:
+        """Hash del contenido, memorizado por (ruta, mtime, tamaño) para no releer archivos sin cambios."""
+        st = os.stat(path)
+        return self._digests.get_or_load((str(Path(path).resolve()), st.st_mtime_ns, st.st_size), lambda: file_digest(path))[0]
+
+
+class JobCaches:
+    """Vista de SharedCaches para una corrida: mismas entradas, contadores de hits propios."""
+
+    def __init__(self, shared: SharedCaches):
+        self.shared = shared
+        self.stats = {"masters_hit": 0, "masters_miss": 0, "inputs_hit": 0, "inputs_miss": 0}
+
+    def _count(self, kind: str, hit: bool) -> None:
+        self.stats[f"{kind}_{'hit' if hit else 'miss'}"] += 1
+
+    def fetch_master(self, url: str, loader: Callable[[str], pd.DataFrame] | None = None) -> pd.DataFrame:
+        """Maestro por URL; `loader` lo descarga si no está en cache (p. ej. MasterFetcher.read_csv)."""
+        df, hit = self.shared.masters.get_or_load(url, lambda: (loader or read_csv_resilient)(url))
+        self._count("masters", hit)
+        return df.copy(deep=False)
+
+    def read_input(self, path: Path, opts: Dict[str, Any], reader: Callable[[], Any], variant: str = "") -> Any:
+        """Crudo parseado (o tupla cuyo primer elemento es el crudo, ver read_source_typed)."""
+        key = (self.shared.file_digest(path), path.suffix.lower(), variant,
+               tuple(sorted((str(k), repr(v)) for k, v in (opts or {}).items() if k not in _NON_READ_OPTS)))
+        value, hit = self.shared.inputs.get_or_load(key, reader)
+        self._count("inputs", hit)
+        if isinstance(value, tuple):
+            return (value[0].copy(deep=False),) + value[1:]
+        return value.copy(deep=False)
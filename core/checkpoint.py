@@ -0,0 +1,161 @@
+from __future__ import annotations
+import functools
+import hashlib
+import json
+import marshal
+import os
+import pickle
+import shutil
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+from types import CodeType
+from typing import Any, Dict, Iterable
+import pandas as pd
+
+from .rawstore import load_frame, spill_frame
+
+# Subir si cambia el formato de los checkpoints en disco
+CHECKPOINT_VERSION = 1
+# Formato de los DataFrames (mercancia.checkpoints.format):
+#   auto   -> Arrow IPC si pyarrow está instalado (columnas con tipos mezclados quedan en pickle)
+#   arrow  -> igual que auto (sin pyarrow se usa pickle)
+#   pickle -> siempre pickle
+CHECKPOINT_FORMATS = ("auto", "arrow", "pickle")
+DEFAULT_CHECKPOINT_CFG = {"enabled": False, "dir": "./.cache/checkpoints", "keep": 4,
+                          "format": "auto", "master_ttl_s": 3600}
+_PKG_DIRS = ("core", "pipeline", "lookups")
+
+
+@functools.lru_cache(maxsize=1)
+def code_fingerprint() -> str:
+    """Hash del código del pipeline: un cambio en cualquier módulo invalida los checkpoints."""
+    root = Path(__file__).resolve().parent.parent
+    h = hashlib.sha256(f"ckpt-v{CHECKPOINT_VERSION}".encode())
+    for d in _PKG_DIRS:
+        for p in sorted((root / d).glob("*.py")):
+            h.update(p.name.encode())
+            h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def _canon(o: Any) -> Any:
+    """Forma JSON estable de una porción de configuración (MappingProxy, tuplas, código, fechas)."""
+    if isinstance(o, Mapping):
+        return {str(k): _canon(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_canon(v) for v in o]
+    if isinstance(o, CodeType):
+        return marshal.dumps(o).hex()
+    if isinstance(o, bytes):
+        return o.hex()
+    if o is None or isinstance(o, (bool, int, float, str)):
+        return o
+    return str(o)
+
+
+def stage_key(prev: str, stage: str, *parts: Any) -> str:
+    """Llave de una etapa: llave de la etapa anterior + nombre + porción de config/datos de la que depende."""
+    h = hashlib.sha256()
+    for piece in (code_fingerprint(), prev, stage):
+        h.update(piece.encode())
+        h.update(b"\0")
+    h.update(json.dumps(_canon(parts), sort_keys=True, ensure_ascii=False).encode())
+    return h.hexdigest()[:32]
+
+
+class CheckpointStore:
+    """
+    Salidas de cada etapa del runner guardadas en disco bajo <dir>/<etapa>/<llave>/.
+
+    Los DataFrames (sueltos o en dicts de DataFrames) van a un archivo por frame en formato
+    columnar (ver core.rawstore.spill_frame); el resto de los objetos a un pickle. Cada
+    checkpoint se escribe en un directorio temporal y se publica con un rename, así una
+    corrida concurrente nunca ve uno a medio escribir. Por etapa se conservan los `keep`
+    más recientes.
+    """
+
+    def __init__(self, cfg: Dict[str, Any] | None = None):
+        self.cfg = {**DEFAULT_CHECKPOINT_CFG, **(cfg or {})}
+        fmt = str(self.cfg.get("format") or "auto").lower()
+        if fmt not in CHECKPOINT_FORMATS:
+            raise ValueError(f"checkpoints.format inválido: {fmt!r} (opciones: {', '.join(CHECKPOINT_FORMATS)})")
+        self.arrow = fmt != "pickle"
+        self.root = Path(self.cfg.get("dir") or DEFAULT_CHECKPOINT_CFG["dir"])
+        self.keep = max(int(self.cfg.get("keep") or 1), 1)
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.root / stage / key
+
+    def has(self, stage: str, key: str) -> bool:
+        return (self._path(stage, key) / "manifest.pkl").exists()
+
+    def save(self, stage: str, key: str, outputs: Dict[str, Any]) -> None:
+        final = self._path(stage, key)
+        if final.exists():
+            return
+        final.parent.mkdir(parents=True, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=f".{key}.", dir=final.parent)
+        try:
+            manifest: Dict[str, Any] = {"version": CHECKPOINT_VERSION, "stage": stage, "key": key, "values": {}}
+            n = 0
+            for name, value in outputs.items():
+                if isinstance(value, pd.DataFrame):
+                    manifest["values"][name] = ("frame", self._spill(tmp, n, value))
+                    n += 1
+                elif isinstance(value, dict) and value and all(isinstance(v, pd.DataFrame) for v in value.values()):
+                    items = {}
+                    for k, df in value.items():
+                        items[k] = self._spill(tmp, n, df)
+                        n += 1
+                    manifest["values"][name] = ("frames", items)
+                else:
+                    manifest["values"][name] = ("object", value)
+            with open(os.path.join(tmp, "manifest.pkl"), "wb") as f:
+                pickle.dump(manifest, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, final)
+        except OSError:
+            # Otra corrida publicó la misma llave primero (o no hay espacio): se descarta la copia
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._prune(final.parent)
+
+    def _spill(self, tmp: str, n: int, df: pd.DataFrame) -> Dict[str, Any]:
+        item = spill_frame(os.path.join(tmp, f"f{n}"), df, arrow=self.arrow)
+        item["path"] = os.path.basename(item["path"])   # relativo: el directorio se renombra al publicar
+        return item
+
+    def load(self, stage: str, key: str, names: Iterable[str] | None = None) -> Dict[str, Any]:
+        """Salidas guardadas de la etapa (solo `names` si se indica)."""
+        base = self._path(stage, key)
+        with open(base / "manifest.pkl", "rb") as f:
+            manifest = pickle.load(f)
+        if manifest.get("version") != CHECKPOINT_VERSION:
+            raise FileNotFoundError(f"checkpoint {stage}/{key} de otra versión")
+        wanted = set(names) if names is not None else None
+        out: Dict[str, Any] = {}
+        for name, (kind, value) in manifest["values"].items():
+            if wanted is not None and name not in wanted:
+                continue
+            if kind == "frame":
+                out[name] = load_frame({**value, "path": str(base / value["path"])})
+            elif kind == "frames":
+                out[name] = {k: load_frame({**it, "path": str(base / it["path"])}) for k, it in value.items()}
+            else:
+                out[name] = value
+        return out
+
+    def _prune(self, stage_dir: Path) -> None:
+        entries = [p for p in stage_dir.iterdir() if p.is_dir() and not p.name.startswith(".")]
+        if len(entries) <= self.keep:
+            return
+        entries.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for p in entries[self.keep:]:
+            shutil.rmtree(p, ignore_errors=True)
+
+    def touch(self, stage: str, key: str) -> None:
+        """Marca un checkpoint como usado (la poda conserva los más recientes)."""
+        try:
+            os.utime(self._path(stage, key))
+        except OSError:
+            pass
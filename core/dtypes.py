@@ -1,19 +1,108 @@
 from __future__ import annotations
+import datetime as _dt
+import importlib.util
+import numpy as np
 import pandas as pd
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple
+from .numeric_format import NumericFormatTable, detect_numeric_format, parse_numeric
 from .utils import ISO_PATTERN
 
+# Almacenamiento de texto de la corrida (mercancia.execution.string_storage):
+#   auto -> pyarrow si está instalado; pyarrow -> kernels de Arrow compute; python -> objetos str
+STRING_STORAGES = ("auto", "pyarrow", "python")
+
+def resolve_string_storage(mode: str | None) -> str:
+    """'pyarrow' | 'python'. Si se pide pyarrow y no está instalado se cae a python."""
+    mode = str(mode or "auto").lower()
+    if mode not in STRING_STORAGES:
+        raise ValueError(f"execution.string_storage inválido: {mode!r} (opciones: {', '.join(STRING_STORAGES)})")
+    has_arrow = importlib.util.find_spec("pyarrow") is not None
+    return "pyarrow" if (mode != "python" and has_arrow) else "python"
+
+def as_string_storage(df: pd.DataFrame, storage: str) -> pd.DataFrame:
+    """
+    Columnas de texto de un crudo (dtype=str / object) al almacenamiento indicado, con NaN
+    como faltante (misma semántica que dtype=str). Con `.astype("string")` + la opción
+    mode.string_storage el resto del pipeline queda en el mismo almacenamiento.
+    """
+    try:
+        target = pd.StringDtype(storage, na_value=np.nan)
+    except TypeError:
+        return df  # pandas < 2.3: sin string con NaN; se deja como vino
+    cols = [c for c, dt in df.dtypes.items()
+            if (dt == object or isinstance(dt, pd.StringDtype)) and dt != target]
+    if not cols:
+        return df
+    df = df.copy(deep=False)
+    for c in cols:
+        df[c] = df[c].astype(target)
+    return df
+
 def _strip_weird(s: pd.Series) -> pd.Series:
     return (s.astype("string")
              .str.replace("\u00A0", " ", regex=False)
              .str.replace("[\u200B\u200C\u200D\uFEFF]", "", regex=True)
              .str.strip())
 
+# Tipos de celda que la ingesta tipada (core.Lectura.read_source_typed) deja sin pasar a texto
+NATIVE_KINDS = ("datetime", "number")
+_NATIVE_INFER = {"datetime": ("datetime", "datetime64", "date"),
+                 "number": ("integer", "floating", "mixed-integer-float", "decimal")}
+
+def is_native_cell(v: Any, kind: str) -> bool:
+    """True si la celda ya viene tipada como `kind` (datetime / número, sin contar bool)."""
+    if kind == "datetime":
+        return isinstance(v, (_dt.datetime, _dt.date))
+    return isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, (bool, np.bool_))
+
+def native_split(series: pd.Series, kind: str) -> Tuple[pd.Series | None, pd.Series | None]:
+    """
+    Separa las celdas que ya vienen tipadas (datetime / número nativo de Excel) de las de texto.
+    Retorna (nativos, texto):
+      - nativos: datetime64 / float64 con NaT/NaN en las celdas de texto (None si no hay nativos)
+      - texto: la columna con solo las celdas de texto (None si no queda nada por parsear)
+    Columnas de texto (str/string) se devuelven tal cual como (None, series) sin recorrerlas.
+    """
+    dt = series.dtype
+    if kind == "datetime" and pd.api.types.is_datetime64_any_dtype(dt):
+        return series, None
+    if kind == "number" and pd.api.types.is_numeric_dtype(dt) and not pd.api.types.is_bool_dtype(dt):
+        return series, None
+    if dt != object:
+        return None, series
+    inferred = pd.api.types.infer_dtype(series, skipna=True)
+    if inferred in ("string", "empty"):
+        return None, series
+    if inferred in _NATIVE_INFER[kind]:
+        mask = series.notna()
+    else:
+        mask = series.map(lambda v: is_native_cell(v, kind)).astype(bool)
+        if not mask.any():
+            return None, series
+    conv = (lambda x: pd.to_datetime(x, errors="coerce")) if kind == "datetime" else (lambda x: pd.to_numeric(x, errors="coerce"))
+    native = conv(series.where(mask))
+    rest = ~mask & series.notna()
+    return native, (series.where(rest) if rest.any() else None)
+
+def keep_native(series: pd.Series, kind: str, parse: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """Aplica `parse` solo a las celdas de texto; las nativas pasan directo (ver native_split)."""
+    native, text = native_split(series, kind)
+    if native is None:
+        return parse(series)
+    if text is None:
+        return native
+    parsed = parse(text)
+    return native.where(native.notna(), parsed)
+
 def to_datetime_smart(series: pd.Series) -> pd.Series:
     """
     Si es ISO (YYYY-MM-DD [HH:MM:SS]) parsea con dayfirst=False;
     resto con dayfirst=True; y fallback a serial Excel.
+    Celdas que ya son fechas (ingesta tipada) no se vuelven a parsear.
     """
+    return keep_native(series, "datetime", _to_datetime_smart_text)
+
+def _to_datetime_smart_text(series: pd.Series) -> pd.Series:
     s = _strip_weird(series)
     is_iso = s.str.match(ISO_PATTERN, na=False)
 
@@ -27,18 +116,12 @@ def to_datetime_smart(series: pd.Series) -> pd.Series:
         out = out.mask(need, pd.to_datetime(num, errors="coerce", unit="D", origin="1899-12-30"))
     return out
 
-def smart_to_numeric(series: pd.Series) -> pd.Series:
-    s = pd.to_numeric(series, errors="coerce")
-    need = s.isna() & series.notna()
-    if need.any():
-        s_alt = (
-            series.astype("string")
-            .str.replace(".", "", regex=False)
-            .str.replace(",", ".", regex=False)
-        )
-        s2 = pd.to_numeric(s_alt, errors="coerce")
-        s = s.mask(need, s2)
-    return s
+def smart_to_numeric(series: pd.Series, fmt: str | None = None) -> pd.Series:
+    """
+    Montos en texto -> float en una sola pasada. Sin `fmt` el formato (plain / dot / comma,
+    ver core.numeric_format) se detecta con una muestra de la columna.
+    """
+    return keep_native(series, "number", lambda s: parse_numeric(s, fmt or detect_numeric_format(s)))
 
 def apply_text_normalize(df: pd.DataFrame, norm_cfg: Dict[str, List[str]]) -> pd.DataFrame:
     strip_cols = (norm_cfg or {}).get("strip", [])
@@ -58,11 +141,14 @@ def apply_text_normalize(df: pd.DataFrame, norm_cfg: Dict[str, List[str]]) -> pd
 def apply_value_maps(df: pd.DataFrame, maps: Dict[str, Dict[str, str]]) -> pd.DataFrame:
     for col, mapping in (maps or {}).items():
         if col in df.columns:
-            df[col] = df[col].replace(mapping)
+            df[col] = df[col].replace(dict(mapping))
     return df
 
 def to_datetime_robust(series: pd.Series) -> pd.Series:
     """Convierte a datetime manejando NBSP/espacios y serial Excel como fallback."""
+    return keep_native(series, "datetime", _to_datetime_robust_text)
+
+def _to_datetime_robust_text(series: pd.Series) -> pd.Series:
     s = series.astype("string")
     # limpia caracteres invisibles y espacios alrededor
     s = s.str.replace("\u00A0", " ", regex=False).str.strip()
@@ -80,7 +166,9 @@ def to_datetime_robust(series: pd.Series) -> pd.Series:
     return dt
 
 
-def cast_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+def cast_dtypes(df: pd.DataFrame, dtypes: Dict[str, str], numbers: NumericFormatTable | None = None,
+                source: str | None = None) -> pd.DataFrame:
+    """Tipado por schema. Con `numbers` y `source` los números usan el formato de fuente/columna."""
     for col, dtype in dtypes.items():
         if col not in df.columns:
             df[col] = pd.NA
@@ -91,7 +179,10 @@ def cast_dtypes(df: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
                 df[col] = df[col].astype("string")
             else:
                 if "float" in dtype or "int" in dtype:
-                    df[col] = smart_to_numeric(df[col])
+                    if numbers is not None and source:
+                        df[col] = keep_native(df[col], "number", lambda s, c=col: numbers.parse(source, c, s))
+                    else:
+                        df[col] = smart_to_numeric(df[col])
                 else:
                     df[col] = df[col].astype(dtype, errors="ignore")
         except Exception:
@@ -113,6 +204,9 @@ def apply_filters(df: pd.DataFrame, expressions: List[str]) -> pd.DataFrame:
 def to_dt(s: pd.Series) -> pd.Series:
     if s is None:
         return pd.Series(pd.NaT, index=[])
+    return keep_native(s, "datetime", _to_dt_text)
+
+def _to_dt_text(s: pd.Series) -> pd.Series:
     # primer intento: dayfirst (dd/mm/aa, dd-mes-aa)
     dt = pd.to_datetime(s, errors="coerce", dayfirst=True)
     # segundo intento: ISO (yyyy-mm-dd HH:MM:SS)
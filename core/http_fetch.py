@@ -0,0 +1,90 @@
+from __future__ import annotations
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Mapping
+import pandas as pd
+
+from .Lectura import read_csv_resilient
+
+# lookups.http: timeout por request, reintentos con backoff exponencial y tamaño del pool
+DEFAULT_HTTP = {"timeout_s": 30.0, "retries": 3, "backoff_s": 0.5, "pool_size": 4}
+# Respuestas que se reintentan (además de errores de conexión y timeouts)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class FetchError(RuntimeError):
+    """El maestro no se pudo descargar tras agotar los reintentos."""
+
+
+def is_url(src: str) -> bool:
+    return str(src).lower().startswith(("http://", "https://"))
+
+
+class MasterFetcher:
+    """
+    Descarga de maestros CSV (Google Sheets publicados) con una sesión HTTP compartida por
+    todos los lookups de la corrida: conexiones reutilizadas (pool de urllib3 si está
+    instalado; si no, urllib sin pool), timeout por request y reintentos con backoff.
+    Las rutas locales se leen con read_csv_resilient. Es thread-safe.
+    """
+
+    def __init__(self, cfg: Mapping[str, Any] | None = None):
+        c = {**DEFAULT_HTTP, **{k: v for k, v in (cfg or {}).items() if v is not None}}
+        self.timeout_s = float(c["timeout_s"])
+        self.retries = max(int(c["retries"]), 0)
+        self.backoff_s = float(c["backoff_s"])
+        self.pool_size = max(int(c["pool_size"]), 1)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"requests": 0, "retries": 0}
+
+    def _manager(self):
+        with self._lock:
+            if self._pool is None:
+                try:
+                    import urllib3
+                except ImportError:
+                    self._pool = False
+                else:
+                    self._pool = urllib3.PoolManager(num_pools=self.pool_size, maxsize=self.pool_size, block=False)
+            return self._pool or None
+
+    def _get_once(self, url: str) -> bytes:
+        pool = self._manager()
+        if pool is not None:
+            import urllib3
+            r = pool.request("GET", url, timeout=urllib3.Timeout(total=self.timeout_s), retries=False, redirect=True)
+            if r.status >= 400:
+                raise urllib.error.HTTPError(url, r.status, r.reason or "", r.headers, None)
+            return r.data
+        with urllib.request.urlopen(url, timeout=self.timeout_s) as r:
+            return r.read()
+
+    def get(self, url: str) -> bytes:
+        """Cuerpo de la respuesta; reintenta errores de conexión, timeouts y RETRY_STATUS."""
+        for attempt in range(self.retries + 1):
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["retries"] += attempt > 0
+            try:
+                return self._get_once(url)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS or attempt == self.retries:
+                    raise FetchError(f"{url}: HTTP {e.code}") from e
+            except Exception as e:
+                if attempt == self.retries:
+                    raise FetchError(f"{url}: {e}") from e
+            time.sleep(self.backoff_s * (2 ** attempt))
+        raise FetchError(url)  # no se llega: el último intento retorna o lanza
+
+    def read_csv(self, src: str) -> pd.DataFrame:
+        """Maestro como DataFrame (dtype=str, mismo parseo que read_csv_resilient)."""
+        return read_csv_resilient(self.get(src) if is_url(src) else src)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool:
+                self._pool.clear()
+            self._pool = None
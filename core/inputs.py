@@ -0,0 +1,168 @@
+from __future__ import annotations
+import glob
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+
+from .utils import header_key
+
+# Columna que el crudo combinado agrega con el archivo de cada fila (hojas "(Original)")
+SOURCE_FILE_COLUMN = "archivo_origen"
+# inputs.<src>.dedupe: llaves (estándar o encabezado crudo) y qué archivo gana ante la misma llave
+DEFAULT_DEDUPE = {"keys": [], "keep": "last"}
+DEDUPE_KEEP = ("first", "last")
+
+InputRef = Union[str, Path, Sequence[Union[str, Path]]]
+
+
+def _expand(ref: str | Path, pattern: str | None) -> List[Path]:
+    p = Path(ref)
+    if p.is_dir():
+        hits = sorted(p.glob(pattern or "*"))
+    elif p.exists() or not glob.has_magic(str(ref)):
+        # Un archivo que existe es literal aunque su nombre tenga [ ] * ? ("EBS [semana 10].xlsx")
+        return [p]
+    else:
+        hits = sorted(Path(h) for h in glob.glob(str(ref)))
+    # Archivos de bloqueo de Excel (~$libro.xlsx) no son fuentes
+    return [h for h in hits if h.is_file() and not h.name.startswith("~$")]
+
+
+def resolve_input_files(ref: InputRef, pattern: str | None = None) -> List[Path]:
+    """
+    Archivos de una fuente: una ruta, una lista de rutas, un glob ("EBS_*.xlsx"; solo si no
+    existe un archivo con ese nombre literal) o una carpeta (se toman los archivos que cumplen
+    inputs.<src>.file_pattern). Rutas separadas por ";" en un solo texto cuentan como lista
+    (selección múltiple de la GUI). Orden estable: el de la lista y, dentro de cada
+    glob/carpeta, por nombre.
+    """
+    if isinstance(ref, (str, Path)):
+        items = [s.strip() for s in str(ref).split(";") if s.strip()] if isinstance(ref, str) else [ref]
+    else:
+        items = list(ref)
+    files: List[Path] = []
+    for item in items:
+        found = _expand(item, pattern)
+        if not found:
+            raise FileNotFoundError(f"Sin archivos de entrada para {item!s}" + (f" ({pattern})" if pattern else ""))
+        files.extend(f for f in found if f not in files)
+    if not files:
+        raise FileNotFoundError("Fuente sin archivos de entrada")
+    return files
+
+
+def _canonical_headers(frames: Sequence[pd.DataFrame], headers: Mapping[str, str]) -> List[List[str]]:
+    """
+    Encabezados de cada archivo alineados por column_maps: los que mapean a la misma columna
+    estándar toman el nombre con que aparecen en el primer archivo; el resto queda igual.
+    """
+    first: Dict[str, str] = {}
+    out = []
+    for df in frames:
+        cols = [str(c) for c in df.columns]
+        renamed = []
+        for c in cols:
+            std = headers.get(header_key(c))
+            name = first.setdefault(std, c) if std is not None else c
+            # Dos encabezados del mismo archivo al mismo estándar: el segundo conserva su nombre
+            renamed.append(c if name != c and name in cols else name)
+        out.append(renamed)
+    return out
+
+
+def _dedupe_keep(df: pd.DataFrame, file_idx: np.ndarray, keys: Sequence[str], headers: Mapping[str, str],
+                 keep: str) -> np.ndarray:
+    """Máscara de filas que quedan: ante la misma llave en varios archivos gana el primero/último."""
+    std_to_col = {}
+    for c in df.columns:
+        std_to_col.setdefault(headers.get(header_key(c)), c)
+    cols = []
+    for k in keys:
+        col = k if k in df.columns else std_to_col.get(k)
+        if col is None:
+            raise ValueError(f"inputs.dedupe: la llave {k!r} no está en los archivos")
+        cols.append(col)
+    kdf = pd.DataFrame({i: df[c].astype("string").str.strip().replace("", pd.NA) for i, c in enumerate(cols)})
+    valid = kdf.notna().all(axis=1).to_numpy()
+    kdf["__archivo"] = file_idx
+    winner = kdf.groupby(list(range(len(cols))), dropna=True, sort=False)["__archivo"].transform(
+        "max" if keep == "last" else "min")
+    # Dentro de un mismo archivo las llaves repetidas se conservan (líneas de una misma factura)
+    return ~valid | (winner.to_numpy(dtype="float64", na_value=np.nan) == file_idx)
+
+
+def combine_source_files(
+    parts: Sequence[Tuple[Path, pd.DataFrame, Dict[int, pd.Series]]],
+    headers: Mapping[str, str],
+    dedupe: Mapping[str, Any] | None = None,
+) -> Tuple[pd.DataFrame, Dict[int, pd.Series]]:
+    """
+    Une los archivos de una fuente (ya leídos: ruta, crudo, nativos de read_source_typed) en
+    un crudo: encabezados alineados por column_maps, columnas faltantes vacías, columna
+    SOURCE_FILE_COLUMN con el nombre del archivo y, si dedupe.keys, filas repetidas entre
+    archivos descartadas. Con un solo archivo retorna el crudo tal cual.
+    attrs: bad_lines (suma), input_files, duplicate_rows.
+    """
+    if len(parts) == 1:
+        return parts[0][1], parts[0][2]
+    frames = [df for _, df, _ in parts]
+    names = _canonical_headers(frames, headers)
+    if any(len(set(n)) != len(n) for n in names):
+        raise ValueError("Encabezados repetidos en un archivo: no se pueden alinear los archivos de la fuente")
+    union = list(dict.fromkeys(c for n in names for c in n))
+    pos = {c: j for j, c in enumerate(union)}
+    text = next((df.dtypes.iloc[0] for df in frames if df.shape[1]), "string")
+    dtypes = {}
+    for df, n in zip(frames, names):
+        for c, dt in zip(n, df.dtypes):
+            dtypes.setdefault(c, dt)
+
+    aligned = []
+    for (path, df, _), n in zip(parts, names):
+        d = df.set_axis(n, axis=1)
+        missing = {c: pd.Series(pd.NA, index=d.index, dtype=dtypes[c]) for c in union if c not in d.columns}
+        if missing:
+            d = pd.concat([d, pd.DataFrame(missing)], axis=1)
+        origin = pd.Series(path.name, index=d.index, dtype=text, name=SOURCE_FILE_COLUMN)
+        aligned.append(pd.concat([d[union], origin], axis=1))
+    df = pd.concat(aligned, ignore_index=True)
+    lengths = [len(d) for d in frames]
+    file_idx = np.repeat(np.arange(len(frames)), lengths)
+
+    # Nativos: posición en el archivo -> posición en el combinado; vacíos donde el archivo no los trae
+    overlay: Dict[int, pd.Series] = {}
+    native_cols = {pos[n[i]] for (_, _, ov), n in zip(parts, names) for i in ov}
+    for j in sorted(native_cols):
+        pieces = []
+        for (_, d, ov), n in zip(parts, names):
+            i = next((i for i in ov if n[i] == union[j]), None)
+            pieces.append(ov[i].reset_index(drop=True) if i is not None else pd.Series([None] * len(d), dtype=object))
+        overlay[j] = pd.concat(pieces, ignore_index=True)
+
+    cfg = {**DEFAULT_DEDUPE, **dict(dedupe or {})}
+    dropped = 0
+    if cfg.get("keys"):
+        keep = str(cfg.get("keep") or "last").lower()
+        if keep not in DEDUPE_KEEP:
+            raise ValueError(f"inputs.dedupe.keep inválido: {keep!r} (opciones: {', '.join(DEDUPE_KEEP)})")
+        mask = _dedupe_keep(df, file_idx, list(cfg["keys"]), headers, keep)
+        dropped = int((~mask).sum())
+        if dropped:
+            rows = np.flatnonzero(mask)
+            df = df.take(rows).reset_index(drop=True)
+            overlay = {j: s.take(rows).reset_index(drop=True) for j, s in overlay.items()}
+
+    df.attrs = {
+        "bad_lines": sum(int(d.attrs.get("bad_lines") or 0) for d in frames),
+        "input_files": [p.name for p, _, _ in parts],
+        "duplicate_rows": dropped,
+    }
+    return df, overlay
+
+
+def read_workers(n_files: int, opts: Mapping[str, Any]) -> int:
+    """Hilos de lectura para los archivos de una fuente (inputs.<src>.workers, por defecto hasta 4)."""
+    w = opts.get("workers")
+    return max(1, min(n_files, int(w) if w else min(4, os.cpu_count() or 1)))
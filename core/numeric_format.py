@@ -0,0 +1,228 @@
+from __future__ import annotations
+import re
+from typing import Any, Dict, Tuple
+import numpy as np
+import pandas as pd
+
+from .persist import cache_path, read_table, with_cache_cfg, write_table
+
+# Formatos de número que reconoce el parser:
+#   plain -> lo que acepta pd.to_numeric tal cual (1234.5, -12, 1e3)
+#   dot   -> decimal "." y miles "," (1,234.56)
+#   comma -> decimal "," y miles "." (1.234,56)
+# dot/comma además aceptan símbolos de moneda, espacios y negativos contables ((1.234,56) / 1.234,56-).
+NUMERIC_FORMATS = ("plain", "dot", "comma")
+DEFAULT_NUMERIC_FORMATS_CFG = {
+    "cache": {"enabled": True, "path": "./.cache/numeric_formats.csv"},
+    "overrides": {},          # "fuente.columna" -> formato (tiene prioridad sobre lo detectado)
+    "sample_size": 1000,      # celdas no vacías que se miran para detectar el formato
+    "redetect_rate": 0.2,     # con más celdas sin parsear que esto, el formato recordado se vuelve a detectar
+}
+
+_NOISE = r"(?i)US\$|\$|€|£|\bBs\.?S?\.?|\b(?:USD|COP|VES|VEF|EUR)\b|" + "[\\s\u00a0\u200b\ufeff']"
+_RX_NOISE = re.compile(_NOISE)
+_RX_PLAIN = re.compile(r"^[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+_RX_NUMBERISH = re.compile(r"^\(?[+-]?[\d.,]*\d[\d.,]*-?\)?$")
+
+
+class NumericFormatError(ValueError):
+    pass
+
+
+def check_format(fmt: Any) -> str:
+    fmt = str(fmt or "").lower()
+    if fmt not in NUMERIC_FORMATS:
+        raise NumericFormatError(f"formato numérico inválido: {fmt!r} (opciones: {', '.join(NUMERIC_FORMATS)})")
+    return fmt
+
+
+def _vote(v: str) -> str | None:
+    """Separador decimal que sugiere una celda ("dot" / "comma"), o None si es ambigua."""
+    dots, commas = v.count("."), v.count(",")
+    if dots and commas:
+        return "dot" if v.rfind(".") > v.rfind(",") else "comma"
+    if not (dots or commas):
+        return None
+    sep, n = (".", dots) if dots else (",", commas)
+    if n > 1:                               # separador repetido: son miles
+        return "comma" if sep == "." else "dot"
+    tail = v.rsplit(sep, 1)[1].rstrip("-)")
+    if len(tail) == 3:                      # 1.234 / 1,234: puede ser miles o decimal
+        return None
+    return "dot" if sep == "." else "comma"
+
+
+def sample_cells(series: pd.Series, n: int) -> list:
+    """Hasta n celdas no vacías repartidas a lo largo de la columna (como texto)."""
+    s = series.dropna()
+    if len(s) > n:
+        s = s.iloc[np.linspace(0, len(s) - 1, n).astype(int)]
+    return [str(v) for v in s.tolist()]
+
+
+def _sample_votes(series: pd.Series, sample_size: int) -> Tuple[Dict[str, int], bool]:
+    """Votos por separador decimal de una muestra de la columna y si toda es numérica simple."""
+    cells = [c for c in (_RX_NOISE.sub("", v) for v in sample_cells(series, int(sample_size))) if c]
+    votes = {"dot": 0, "comma": 0}
+    plain = True
+    for c in cells:
+        if plain and not _RX_PLAIN.match(c):
+            plain = False
+        if _RX_NUMBERISH.match(c):
+            v = _vote(c)
+            if v:
+                votes[v] += 1
+    return votes, plain
+
+
+def decided_format(series: pd.Series, sample_size: int = 1000) -> str | None:
+    """
+    Formato que la muestra decide por mayoría de votos, o None si ninguna celda vota (p. ej.
+    solo "1.234" o enteros): en ese caso el formato no se puede saber con esta columna.
+    """
+    votes, plain = _sample_votes(series, sample_size)
+    if votes["comma"] == votes["dot"]:
+        return None
+    if votes["comma"] > votes["dot"]:
+        return "comma"
+    return "plain" if plain else "dot"
+
+
+def detect_numeric_format(series: pd.Series, sample_size: int = 1000) -> str:
+    """
+    Formato de una columna de montos en texto a partir de una muestra: cada celda vota por el
+    separador decimal (el último separador si hay dos; uno repetido es de miles; "x.yyy" no
+    vota). Gana la mayoría; sin votos o empate, "dot". Si además toda la muestra es numérica
+    simple para pd.to_numeric el formato es "plain".
+    """
+    votes, plain = _sample_votes(series, sample_size)
+    if votes["comma"] > votes["dot"]:
+        return "comma"
+    return "plain" if plain else "dot"
+
+
+def _to_float(s: pd.Series, fmt: str) -> pd.Series:
+    thousands, decimal = (",", ".") if fmt == "dot" else (".", ",")
+    s = s.str.replace(thousands, "", regex=False)
+    if decimal != ".":
+        s = s.str.replace(decimal, ".", regex=False)
+    return pd.to_numeric(s, errors="coerce").astype("float64")
+
+
+# Celdas cuyo separador decimal es sin duda el otro (un solo separador que no deja 3 dígitos,
+# o el otro separador es el último): con el formato de la columna cambiarían de escala
+_RX_DECIMAL_DOT = r"^[^.,]*\.(?:\d{1,2}|\d{4,})[-)]*$|,[^,]*\.[^,.]*$"
+_RX_DECIMAL_COMMA = r"^[^.,]*,(?:\d{1,2}|\d{4,})[-)]*$|\.[^.]*,[^.,]*$"
+
+
+def _parse_as(text: pd.Series, fmt: str) -> np.ndarray:
+    if fmt == "plain":
+        return pd.to_numeric(text, errors="coerce").astype("float64").to_numpy(copy=True)
+    out = _to_float(text, fmt).to_numpy(copy=True)
+    need = np.isnan(out) & text.notna().to_numpy()
+    if need.any():
+        t = text[need].str.replace(_NOISE, "", regex=True)
+        neg = t.str.match(r"^\(.*\)$|^[^-]+-$", na=False).to_numpy()
+        v = _to_float(t.str.replace(r"^\(|\)$|-$", "", regex=True), fmt).to_numpy()
+        out[need] = np.where(neg, -np.abs(v), v)
+    return out
+
+
+def parse_numeric(series: pd.Series, fmt: str) -> pd.Series:
+    """
+    Columna de texto -> float64 en una sola pasada vectorizada con el formato dado. Moneda,
+    espacios y negativos contables se limpian solo en las celdas que lo necesitan.
+    Por celda: las que por sí solas indican el otro separador decimal ("1234.56" en una
+    columna comma, "1234,5" en una dot) se leen con ese, y las que el formato no lee se
+    intentan con los otros (como el parseo celda a celda anterior).
+    """
+    text = series.astype("string")
+    out = _parse_as(text, fmt)
+    if fmt != "plain":
+        other = "comma" if fmt == "dot" else "dot"
+        sep = "," if fmt == "dot" else "."
+        has = text.str.contains(sep, regex=False, na=False).to_numpy()
+        if has.any():
+            t = text[has].str.replace(_NOISE, "", regex=True)
+            wrong = t.str.contains(_RX_DECIMAL_COMMA if fmt == "dot" else _RX_DECIMAL_DOT, regex=True, na=False).to_numpy()
+            if wrong.any():
+                idx = np.flatnonzero(has)[wrong]
+                out[idx] = _parse_as(text.iloc[idx], other)
+    need = np.isnan(out) & text.notna().to_numpy()
+    for alt in (f for f in ("plain", "dot", "comma") if f != fmt):
+        if not need.any():
+            break
+        out[need] = _parse_as(text[need], alt)
+        need = np.isnan(out) & text.notna().to_numpy()
+    return pd.Series(out, index=series.index, name=series.name)
+
+
+def _unparsed_rate(text: pd.Series, parsed: pd.Series) -> float:
+    filled = text.notna()
+    n = int(filled.sum())
+    return float((parsed.isna() & filled).sum()) / n if n else 0.0
+
+
+def format_key(source: str, column: str) -> str:
+    return f"{str(source).lower()}.{column}"
+
+
+class NumericFormatTable:
+    """
+    Formato numérico por fuente/columna persistente entre corridas (mercancia.numeric_formats).
+
+    parse() usa el override del YAML o el formato recordado de corridas anteriores y parsea
+    la columna en una sola pasada. El recordado solo se usa si la mayoría de una muestra de
+    esta corrida no indica otro y si no deja más de `redetect_rate` de celdas sin parsear;
+    si no, se toma el de la muestra y se recuerda. Una muestra sin votos no se recuerda.
+    """
+
+    def __init__(self, cfg: Dict[str, Any] | None = None):
+        self.cfg = with_cache_cfg(DEFAULT_NUMERIC_FORMATS_CFG, cfg)
+        self.overrides = {str(k).lower(): check_format(v) for k, v in (self.cfg.get("overrides") or {}).items()}
+        self.learned = load_format_table(cache_path(self.cfg))
+        self._dirty = False
+
+    def state(self) -> Tuple[Tuple[str, str], ...]:
+        """Formatos recordados al empezar la corrida (forman parte de la llave del checkpoint de normalize)."""
+        return tuple(sorted(self.learned.items()))
+
+    def parse(self, source: str, column: str, series: pd.Series) -> pd.Series:
+        key = format_key(source, column)
+        if key in self.overrides:
+            return parse_numeric(series, self.overrides[key])
+        if not series.notna().any():
+            return parse_numeric(series, "plain")   # columna vacía: nada que detectar ni recordar
+        # El recordado se contrasta con la mayoría de la muestra de esta corrida: una exportación
+        # que cambió de separador decimal se sigue parseando sin error, pero con otra escala
+        fresh = decided_format(series, int(self.cfg.get("sample_size") or 1000))
+        known = self.learned.get(key)
+        if known and fresh in (None, known):
+            out = parse_numeric(series, known)
+            if _unparsed_rate(series, out) <= float(self.cfg.get("redetect_rate") or 0):
+                return out
+        if fresh is None:
+            # Muestra sin votos: se parsea con el formato por defecto pero no se recuerda
+            return parse_numeric(series, detect_numeric_format(series, int(self.cfg.get("sample_size") or 1000)))
+        if fresh != known:
+            self.learned[key] = fresh
+            self._dirty = True
+        return parse_numeric(series, fresh)
+
+    def save(self) -> None:
+        if self._dirty:
+            save_format_table(cache_path(self.cfg), self.learned)
+            self._dirty = False
+
+
+def load_format_table(path: str | None) -> Dict[str, str]:
+    df = read_table(path)
+    if df is None:
+        return {}
+    return {format_key(s, c): f for s, c, f in zip(df.get("fuente", []), df.get("columna", []), df.get("formato", []))
+            if f in NUMERIC_FORMATS}
+
+
+def save_format_table(path: str | None, table: Dict[str, str]) -> None:
+    rows: list[Tuple[str, str, str]] = [(*k.split(".", 1), f) for k, f in sorted(table.items())]
+    write_table(path, pd.DataFrame(rows, columns=["fuente", "columna", "formato"]))
@@ -0,0 +1,75 @@
+from __future__ import annotations
+from typing import Iterable, Sequence
+import numpy as np
+import pandas as pd
+
+# Fuentes del consolidado en el orden en que se concatenan (categorías de la columna APP)
+SOURCE_CODES = ("EBS", "REIM", "RSF")
+
+
+def source_column(lengths: Sequence[int], sources: Sequence[str] = SOURCE_CODES) -> pd.Categorical:
+    """Columna APP categórica para fuentes concatenadas en orden (sin escribir ni comparar texto)."""
+    codes = np.repeat(np.arange(len(sources), dtype=np.int8), np.asarray(lengths, dtype=np.int64))
+    return pd.Categorical.from_codes(codes, categories=list(sources))
+
+
+def source_codes(s: pd.Series) -> tuple[np.ndarray, list]:
+    """(códigos enteros por fila, etiquetas en mayúscula) de una columna de fuente; -1 = sin fuente."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), [str(c).upper() for c in s.cat.categories]
+    codes, uniques = pd.factorize(s.astype("string").str.upper())
+    return codes, [str(u) for u in uniques]
+
+
+class SourcePartition:
+    """
+    Filas de cada fuente del consolidado (EBS/REIM/RSF) a partir de los códigos de la
+    columna APP categórica: se arma una vez por etapa y cada regla toma sus filas de aquí
+    en vez de volver a recorrer texto con .astype("string").str.upper().eq(...).
+
+    Las filas de una fuente son posiciones (iloc). Como el código viaja con la fila, el
+    índice se mantiene válido aunque la etapa anterior haya filtrado filas; si además el
+    consolidado sigue ordenado por fuente (concat en orden) las posiciones son rangos.
+    """
+
+    def __init__(self, codes: np.ndarray, categories: Iterable[str]):
+        self.codes = np.asarray(codes)
+        self.categories = list(categories)
+        self._code = {c: i for i, c in enumerate(self.categories)}
+        self._pos: dict = {}
+        self.sorted = bool(len(self.codes) < 2 or (np.diff(self.codes) >= 0).all())
+        if self.sorted:
+            self._bounds = np.searchsorted(self.codes, np.arange(-1, len(self.categories) + 1), side="left")
+
+    @classmethod
+    def of(cls, df: pd.DataFrame, column: str = "APP") -> "SourcePartition":
+        """Partición de df por `column` (APP). Sin categórica se factoriza el texto una vez."""
+        s = df[column] if column in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+        return cls(*source_codes(s))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def positions(self, *sources: str) -> np.ndarray:
+        """Posiciones (iloc, crecientes) de las filas de las fuentes dadas."""
+        key = tuple(sorted({str(s).upper() for s in sources}))
+        if key not in self._pos:
+            ks = [self._code[s] for s in key if s in self._code]
+            if self.sorted:
+                # código k ocupa [bounds[k+1], bounds[k+2]) (bounds[0] = filas sin fuente, código -1)
+                parts = [np.arange(self._bounds[k + 1], self._bounds[k + 2]) for k in sorted(ks)]
+                pos = np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+            else:
+                pos = np.flatnonzero(np.isin(self.codes, ks))
+            self._pos[key] = pos
+        return self._pos[key]
+
+    def mask(self, *sources: str) -> np.ndarray:
+        """Máscara booleana (por posición) de las filas de las fuentes dadas."""
+        out = np.zeros(len(self.codes), dtype=bool)
+        out[self.positions(*sources)] = True
+        return out
+
+    def series_mask(self, index: pd.Index, *sources: str) -> pd.Series:
+        """mask() como Serie alineada al índice del frame (para .loc y combinaciones con otras máscaras)."""
+        return pd.Series(self.mask(*sources), index=index)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import hashlib
+import re
+from collections import Counter
+from typing import Any, Dict
+import numpy as np
+import pandas as pd
+
+from .persist import cache_path, read_table, with_cache_cfg, write_table
+
+# Precedencia histórica del post de vencimientos REIM ("NETO A 30 DIAS", "2% A 30 DIAS DPP", "1.4/30 DPP"):
+#   1) número seguido de "día(s)"   2) número después de "/"   3) último número del texto
+_RX_DIAS = re.compile(r"(?i)(\d+)\s*d[ií]as?")
+_RX_SLASH = re.compile(r"/\s*(\d+)")
+_RX_NUM = re.compile(r"(\d+)")
+# Subir al cambiar parse_term_days: la tabla aprendida guarda la huella del parser que la llenó
+PARSER_VERSION = 1
+
+DEFAULT_PAYMENT_TERMS_CFG = {
+    "cache": {"enabled": True, "path": "./.cache/payment_terms.csv"},
+    "overrides": {},          # término -> días (tiene prioridad sobre el parser y el cache)
+    "report_path": None,      # CSV con los términos sin días reconocibles
+}
+REPORT_COLS = ["termino", "filas"]
+
+
+def term_key(term: Any) -> str:
+    """Llave del término: espacios colapsados y mayúsculas (el parser no distingue entre variantes)."""
+    return " ".join(str(term).split()).upper()
+
+
+def parse_term_days(term: Any) -> float | None:
+    """Días de plazo de un término de pago, o None si no tiene un número reconocible."""
+    if term is None or (not isinstance(term, str) and pd.isna(term)):
+        return None
+    s = str(term)
+    for rx in (_RX_DIAS, _RX_SLASH):
+        m = rx.search(s)
+        if m:
+            return float(m.group(1))
+    nums = _RX_NUM.findall(s)
+    return float(nums[-1]) if nums else None
+
+
+def payment_term_days(terms: pd.Series) -> pd.Series:
+    """Días por fila (float, NaN si no parsea) sin tabla persistente."""
+    return PaymentTermTable({"cache": {"enabled": False}}).days(terms)
+
+
+class PaymentTermTable:
+    """
+    Tabla término -> días persistente entre corridas (mercancia.payment_terms).
+
+    days() factoriza la columna, resuelve cada término distinto una sola vez (overrides del
+    YAML, luego la tabla aprendida, luego el parser) y devuelve los días por fila con un
+    gather por los códigos. Los términos parseados se agregan a la tabla; los que no tienen
+    días reconocibles se acumulan en report() con su cantidad de filas. La tabla de otra
+    versión del parser (parser_fingerprint) se descarta y se vuelve a aprender.
+    """
+
+    def __init__(self, cfg: Dict[str, Any] | None = None):
+        self.cfg = with_cache_cfg(DEFAULT_PAYMENT_TERMS_CFG, cfg)
+        self.overrides = {term_key(k): float(v) for k, v in (self.cfg.get("overrides") or {}).items()}
+        self.learned = load_term_table(cache_path(self.cfg))
+        self._unparsed: Counter = Counter()
+        self._dirty = False
+
+    def lookup(self, term: Any) -> float | None:
+        key = term_key(term)
+        if key in self.overrides:
+            return self.overrides[key]
+        if key in self.learned:
+            return self.learned[key]
+        days = parse_term_days(key)
+        if days is not None:
+            self.learned[key] = days
+            self._dirty = True
+        return days
+
+    def days(self, terms: pd.Series) -> pd.Series:
+        s = pd.Series(terms).astype("string")
+        codes, uniques = pd.factorize(s)
+        if len(uniques) == 0:
+            return pd.Series(np.nan, index=s.index, dtype="float64")
+        vals = np.array([np.nan if (d := self.lookup(u)) is None else d for u in uniques], dtype="float64")
+        out = np.where(codes >= 0, vals[np.maximum(codes, 0)], np.nan)
+        missing = np.isnan(vals)
+        if missing.any():
+            counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+            for u, c in zip(np.asarray(uniques, dtype=object)[missing], counts[missing]):
+                key = term_key(u)
+                if key:
+                    self._unparsed[key] += int(c)
+        return pd.Series(out, index=s.index, dtype="float64")
+
+    def report(self) -> pd.DataFrame:
+        """Términos sin días reconocibles (termino, filas), de más a menos filas."""
+        rows = sorted(self._unparsed.items(), key=lambda kv: (-kv[1], kv[0]))
+        return pd.DataFrame(rows, columns=REPORT_COLS)
+
+    def save(self) -> None:
+        """Persiste la tabla aprendida y, si se configuró report_path, el reporte."""
+        if self._dirty:
+            save_term_table(cache_path(self.cfg), self.learned)
+            self._dirty = False
+        path = self.cfg.get("report_path")
+        if path and self._unparsed:
+            self.report().to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def parser_fingerprint() -> str:
+    """Huella de PARSER_VERSION y las regex de parse_term_days."""
+    src = "\0".join([f"v{PARSER_VERSION}", *(rx.pattern for rx in (_RX_DIAS, _RX_SLASH, _RX_NUM))])
+    return hashlib.sha1(src.encode("utf-8")).hexdigest()[:12]
+
+
+def load_term_table(path: str | None) -> Dict[str, float]:
+    """Tabla aprendida; solo las filas que llenó el parser actual (ver parser_fingerprint)."""
+    df = read_table(path)
+    if df is None or "parser" not in df.columns:
+        return {}
+    df = df[df["parser"] == parser_fingerprint()]
+    days = pd.to_numeric(df.get("dias"), errors="coerce")
+    return {term_key(t): float(d) for t, d in zip(df.get("termino", []), days) if pd.notna(d)}
+
+
+def save_term_table(path: str | None, table: Dict[str, float]) -> None:
+    df = pd.DataFrame(sorted(table.items()), columns=["termino", "dias"])
+    df["parser"] = parser_fingerprint()
+    write_table(path, df)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import os
+import threading
+from typing import Any, Dict, Mapping
+import pandas as pd
+
+# Tablas CSV chicas que se recuerdan entre corridas (formatos numéricos, términos de pago,
+# matches aproximados, maestro de prioridades). Se escriben a un temporal y se renombran:
+# corridas concurrentes (servicio, varias instancias de la app) nunca leen un CSV a medias.
+
+
+def with_cache_cfg(defaults: Mapping[str, Any], cfg: Mapping[str, Any] | None) -> Dict[str, Any]:
+    """cfg sobre defaults, mezclando también la sub-sección cache."""
+    cfg = cfg or {}
+    return {**defaults, **cfg, "cache": {**(defaults.get("cache") or {}), **(cfg.get("cache") or {})}}
+
+
+def cache_path(cfg: Mapping[str, Any]) -> str | None:
+    """Ruta de cfg['cache'] o None si el cache está deshabilitado."""
+    cache = cfg.get("cache") or {}
+    return cache.get("path") if cache.get("enabled", True) else None
+
+
+def read_table(path: str | None) -> pd.DataFrame | None:
+    """CSV como texto (sin NA) o None si no existe o no se puede leer."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8")
+    except Exception:
+        return None
+
+
+def write_table(path: str | None, df: pd.DataFrame, encoding: str = "utf-8") -> None:
+    """Escribe df en path de forma atómica (temporal + os.replace); sin path no hace nada."""
+    if not path:
+        return
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    df.to_csv(tmp, index=False, encoding=encoding)
+    os.replace(tmp, path)
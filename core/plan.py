@@ -0,0 +1,300 @@
+from __future__ import annotations
+import ast
+import hashlib
+import importlib.util
+import marshal
+import os
+import pickle
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from types import CodeType, MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+import yaml
+
+from .utils import header_key, header_matcher
+
+# Subir si cambia la forma del plan (invalida los planes cacheados en disco)
+PLAN_VERSION = 2
+DEFAULT_CACHE_DIR = "./.cache/plans"
+SOURCES = ("ebs", "reim", "rsf")
+
+# Reglas por país que antes estaban como ramas VE/CO en el runner
+COUNTRY_RULES: Dict[str, Dict[str, Any]] = {
+    "VE": {
+        "rsf_due_from_dias_condicion": True,   # fecha_vencimiento RSF = fecha_recepcion + dias_condicion_rms
+        "fecha_documento": True,               # EBS/REIM -> fecha; RSF -> fecha_recepcion
+        "filter_caja": True,                   # export.filter_caja_values
+        "filter_grupo_pago": True,             # export.filter_grupo_pago_values
+        "drop_grupo_pago": False,
+        "extra_columns": ["fecha_documento", "Grupo de Pago", "Caja"],
+        "export_headers": {
+            "factura": "Numero de Factura",
+            "orden_compra": "Orden De Compra",
+            "proveedor": "Proveedor",
+            "fecha_documento": "Fecha del documento",
+            "monto": "Monto",
+            "APP": "APP",
+        },
+        "export_order": [
+            "APP", "Grupo de Pago", "Proveedor", "Numero de Factura",
+            "Orden De Compra", "Fecha del documento", "Monto", "Caja",
+        ],
+        "export_flags": {},
+    },
+    "CO": {
+        "rsf_due_from_dias_condicion": False,
+        "fecha_documento": False,
+        "filter_caja": False,
+        "filter_grupo_pago": False,
+        "drop_grupo_pago": True,               # CO no lleva 'Grupo de Pago' en el consolidado
+        "extra_columns": [],
+        "export_headers": None,
+        "export_order": None,
+        # RAW sin enriquecer y RSF filtrado a 'Recepción sin factura' en export
+        "export_flags": {"write_sources_raw": True, "enrich_raw_sources": False},
+    },
+}
+# Columnas estándar que el pipeline parsea como fecha/número además de las de schema.dtypes
+# (fechas en normalize_source; montos y días de condición en post): candidatas a ingesta tipada
+PARSED_COLUMNS = {
+    "fecha": "datetime", "fecha_creacion": "datetime", "fecha_vencimiento": "datetime",
+    "fecha_recepcion": "datetime", "monto_neto": "number", "monto_bruto": "number",
+    "dias_condicion_rms": "number",
+}
+DEFAULT_RULES = {**COUNTRY_RULES["CO"], "drop_grupo_pago": False, "export_flags": {}}
+
+
+class PlanError(ValueError):
+    """Configuración YAML inválida (se detecta al compilar el plan, antes de leer fuentes)."""
+
+
+def _freeze(o):
+    if isinstance(o, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in o.items()})
+    if isinstance(o, list):
+        return tuple(_freeze(v) for v in o)
+    return o
+
+
+def thaw(o):
+    """Copia mutable (dict/list) de una parte del plan."""
+    if isinstance(o, Mapping):
+        return {k: thaw(v) for k, v in o.items()}
+    if isinstance(o, tuple):
+        return [thaw(v) for v in o]
+    return o
+
+
+@dataclass(frozen=True)
+class SourcePlan:
+    name: str
+    read_opts: Mapping[str, Any]
+    headers: Mapping[str, str]          # header_key(encabezado) -> columna estándar
+    filters: Tuple[str, ...]
+    date_format: str | None
+    native: Mapping[str, str]           # header_key(encabezado) -> "datetime" | "number" (ingesta tipada)
+
+
+@dataclass(frozen=True)
+class PipelinePlan:
+    """Plan de ejecución inmutable compilado desde schema.yaml + YAML del país."""
+    key: str
+    pais: str | None
+    rules: Mapping[str, Any]
+    schema: Mapping[str, Any]           # schema["mercancia"]
+    cfg: Mapping[str, Any]              # país["mercancia"]
+    root: Mapping[str, Any]             # YAML del país completo
+    sources: Mapping[str, SourcePlan]
+    lookups: Mapping[str, Any]          # prioridades / factoring / tipo_mercancia / proveedor_key / fuzzy / http
+    post_compute: Tuple[CodeType, ...]
+    export: Mapping[str, Any]
+
+    @property
+    def dtypes(self) -> Mapping[str, str]:
+        return self.schema["dtypes"]
+
+
+def _check_filter(expr: str, src: str) -> None:
+    """
+    Sintaxis de un filtro de fuente con el mismo preprocesado que df.query (`col con espacios`,
+    @variables) o, como en core.dtypes.apply_filters, como df.<expr>. No se compila: df.query
+    lo evalúa en cada corrida.
+    """
+    from pandas.core.computation.expr import _preparse
+    try:
+        ast.parse(_preparse(expr), mode="eval")
+        return
+    except Exception:
+        pass
+    try:
+        compile(f"df.{expr}", f"<filters.{src}>", "eval")
+    except SyntaxError as e:
+        raise PlanError(f"filters.{src}: expresión inválida {expr!r}: {e.msg}") from None
+
+
+def _plan_key(schema_bytes: bytes, country_bytes: bytes) -> str:
+    h = hashlib.sha256()
+    h.update(f"plan-v{PLAN_VERSION}".encode())
+    # El plan guarda bytecode (marshal): solo sirve al mismo intérprete
+    h.update(repr(tuple(sys.version_info)).encode())
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(Path(__file__).read_bytes())
+    # Los matchers de encabezado del plan salen de core.utils.header_key
+    h.update((Path(__file__).parent / "utils.py").read_bytes())
+    h.update(schema_bytes)
+    h.update(b"\0")
+    h.update(country_bytes)
+    return h.hexdigest()[:32]
+
+
+def _build_payload(key: str, schema_all: Dict[str, Any], country_all: Dict[str, Any]) -> Dict[str, Any]:
+    """Parsea/valida los YAML y arma el plan como datos planos (serializable en disco)."""
+    schema = (schema_all or {}).get("mercancia")
+    if not isinstance(schema, dict) or not isinstance(schema.get("dtypes"), dict):
+        raise PlanError("schema.yaml: falta 'mercancia.dtypes'.")
+    cfg = (country_all or {}).get("mercancia")
+    if not isinstance(cfg, dict):
+        raise PlanError("YAML de país: falta la sección 'mercancia'.")
+
+    # Tipo de celda que se conserva en la ingesta tipada, por columna estándar
+    native_kinds = dict(PARSED_COLUMNS)
+    for std, dt in schema["dtypes"].items():
+        dt = str(dt)
+        if dt.startswith("datetime64"):
+            native_kinds[std] = "datetime"
+        elif "float" in dt or "int" in dt:
+            native_kinds[std] = "number"
+
+    pais = ((cfg.get("const") or {}).get("pais") or None)
+    pais = str(pais).upper() if pais else None
+    rules = COUNTRY_RULES.get(pais or "", DEFAULT_RULES)
+
+    # Fuentes: matchers de encabezado (insensibles a tildes/mayúsculas), filtros, formato de fecha
+    col_maps = cfg.get("column_maps") or {}
+    filters = cfg.get("filters") or {}
+    inputs = cfg.get("inputs") or {}
+    date_formats = cfg.get("date_formats") or {}
+    sources = {}
+    for src in SOURCES:
+        maps = col_maps.get(src)
+        if not isinstance(maps, dict) or not maps:
+            raise PlanError(f"YAML de país: 'column_maps.{src}' vacío o ausente.")
+        seen: Dict[str, Tuple[str, str]] = {}
+        for raw, std in maps.items():
+            k = header_key(raw)
+            if k in seen and seen[k][1] != std:
+                raise PlanError(f"column_maps.{src}: '{raw}' y '{seen[k][0]}' son el mismo encabezado pero mapean a '{std}' y '{seen[k][1]}'.")
+            seen.setdefault(k, (raw, std))
+        exprs = list(filters.get(src) or [])
+        for expr in exprs:
+            _check_filter(expr, src)
+        headers = header_matcher(maps)
+        sources[src] = {
+            "name": src,
+            "read_opts": dict(inputs.get(src) or {}),
+            "headers": headers,
+            "native": {k: native_kinds[std] for k, std in headers.items() if std in native_kinds},
+            "filters": exprs,
+            "date_format": date_formats.get(src),
+        }
+
+    # Post: se acepta bajo mercancia.post o raíz.post; cada paso se compila una vez
+    post_cfg = (cfg.get("post") or country_all.get("post") or {})
+    post_code = []
+    for i, stmt in enumerate(post_cfg.get("compute") or []):
+        try:
+            post_code.append(marshal.dumps(compile(stmt, f"<post.compute[{i}]>", "exec")))
+        except SyntaxError as e:
+            raise PlanError(f"post.compute[{i}]: error de sintaxis en línea {e.lineno}: {e.msg}") from None
+
+    # Lookups: CO los declara bajo mercancia.lookups; VE el mini maestro TIPO a nivel raíz
+    lk = cfg.get("lookups") or {}
+    lk_root = country_all.get("lookups") or {}
+    lookups = {
+        "prioridades": lk.get("prioridades") or {},
+        "factoring": lk.get("factoring") or {},
+        "tipo_mercancia": lk_root.get("tipo_mercancia") or {},
+        "proveedor_key": lk.get("proveedor_key") or lk_root.get("proveedor_key"),
+        "fuzzy": lk.get("fuzzy") or lk_root.get("fuzzy"),
+        "http": lk.get("http") or lk_root.get("http") or {},
+    }
+
+    # Export: mercancia.export o raíz.export, con overrides del país
+    export = dict(cfg.get("export") or country_all.get("export") or {})
+    if rules["export_headers"]:
+        export["headers"] = {**(export.get("headers") or {}), **rules["export_headers"]}
+    if rules["export_order"]:
+        export["order"] = list(rules["export_order"])
+    export["__pais"] = pais
+    export.update(rules["export_flags"])
+
+    return {
+        "version": PLAN_VERSION, "key": key, "pais": pais, "rules": rules,
+        "schema": schema, "cfg": cfg, "root": country_all, "sources": sources,
+        "lookups": lookups, "post_code": post_code, "export": export,
+    }
+
+
+def _plan_from_payload(p: Dict[str, Any]) -> PipelinePlan:
+    return PipelinePlan(
+        key=p["key"],
+        pais=p["pais"],
+        rules=_freeze(p["rules"]),
+        schema=_freeze(p["schema"]),
+        cfg=_freeze(p["cfg"]),
+        root=_freeze(p["root"]),
+        sources=MappingProxyType({
+            k: SourcePlan(name=v["name"], read_opts=_freeze(v["read_opts"]), headers=_freeze(v["headers"]),
+                          filters=tuple(v["filters"]), date_format=v["date_format"],
+                          native=_freeze(v["native"]))
+            for k, v in p["sources"].items()
+        }),
+        lookups=_freeze(p["lookups"]),
+        post_compute=tuple(marshal.loads(b) for b in p["post_code"]),
+        export=_freeze(p["export"]),
+    )
+
+
+_PLANS: Dict[str, PipelinePlan] = {}
+
+
+def compile_plan(schema_path: str | Path, country_path: str | Path, cache_dir: str | None = DEFAULT_CACHE_DIR) -> PipelinePlan:
+    """
+    Devuelve el plan para (schema, país). La llave es el hash del contenido de ambos YAML
+    (y de este módulo, core.utils e intérprete): se reutiliza en memoria y en disco (cache_dir) sin volver a
+    parsear ni validar. Un plan en disco que no se puede cargar se recompila.
+    """
+    schema_bytes = Path(schema_path).read_bytes()
+    country_bytes = Path(country_path).read_bytes()
+    key = _plan_key(schema_bytes, country_bytes)
+    if key in _PLANS:
+        return _PLANS[key]
+
+    path = os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+    plan = None
+    if path and os.path.exists(path):
+        # Cualquier error al leer el plan cacheado (pickle o bytecode) es un miss: se recompila
+        try:
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("version") == PLAN_VERSION:
+                plan = _plan_from_payload(payload)
+        except Exception:
+            plan = None
+
+    if plan is None:
+        payload = _build_payload(key, yaml.safe_load(schema_bytes), yaml.safe_load(country_bytes))
+        if path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+        plan = _plan_from_payload(payload)
+
+    _PLANS[key] = plan
+    return plan
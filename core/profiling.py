@@ -0,0 +1,150 @@
+from __future__ import annotations
+import re
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Mapping, Tuple
+import pandas as pd
+
+from .plan import PipelinePlan
+
+DEFAULT_INTERVAL_S = 0.005
+_POST_FILE = re.compile(r"<post\.compute\[(\d+)\]>")
+
+
+def profile_labels(plan: PipelinePlan, width: int = 60) -> Dict[str, str]:
+    """Rótulo de cada paso de post (nombre de archivo del código compilado -> índice + texto del YAML)."""
+    post_cfg = plan.cfg.get("post") or plan.root.get("post") or {}
+    labels = {}
+    for i, stmt in enumerate(post_cfg.get("compute") or ()):
+        code = [ln.strip() for ln in str(stmt).splitlines() if ln.strip() and not ln.strip().startswith("#")]
+        text = " ".join(" ".join(code).split())
+        labels[f"<post.compute[{i}]>"] = f"post.compute[{i}] {text[:width]}{'…' if len(text) > width else ''}"
+    return labels
+
+
+class SamplingProfiler:
+    """
+    Perfil por muestreo de la corrida: cada `interval_s` toma la pila de los hilos que la
+    corrida usa (el que inicia el perfil y los que se crean después, p. ej. la descarga de
+    maestros) y le suma el tiempo real transcurrido desde la muestra anterior, así las
+    llamadas a C que retienen el GIL no quedan subrepresentadas.
+
+    Marcos: "modulo.funcion" (pipeline.runners._stage_post, lookups.prioridad.apply_priority_lookup,
+    pandas...), cada paso de post con su rótulo de profile_labels y la raíz "[hilo]".
+    write_folded() deja el formato de pilas colapsadas (flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self, interval_s: float = DEFAULT_INTERVAL_S, labels: Mapping[str, str] | None = None):
+        self.interval_s = float(interval_s)
+        self.labels = dict(labels or {})
+        self.stacks: Counter = Counter()
+        self.total_s = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._before: set = set()
+
+    def __enter__(self) -> "SamplingProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        # Hilos que ya existían (salvo el que perfila) no son de la corrida: no se muestrean
+        self._before = {t.ident for t in threading.enumerate()} - {threading.get_ident()}
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _frame_label(self, frame) -> str:
+        code = frame.f_code
+        if _POST_FILE.fullmatch(code.co_filename):
+            return self.labels.get(code.co_filename, code.co_filename)
+        return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+
+    def _stack(self, frame, root: str) -> Tuple[str, ...]:
+        out: List[str] = []
+        while frame is not None:
+            out.append(self._frame_label(frame).replace(";", ","))
+            frame = frame.f_back
+        out.append(f"[{root}]")
+        return tuple(reversed(out))
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        last = perf_counter()
+        while not self._stop.wait(self.interval_s):
+            now = perf_counter()
+            w, last = now - last, now
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me or tid in self._before:
+                    continue
+                self.stacks[self._stack(frame, names.get(tid, str(tid)))] += w
+            self.total_s += w
+
+    def write_folded(self, path: str | Path) -> Path:
+        """Pilas colapsadas ("raiz;...;hoja <microsegundos>"), una por línea."""
+        path = Path(path)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, sec in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+                f.write(f"{';'.join(stack)} {max(int(sec * 1e6), 1)}\n")
+        return path
+
+    def cumulative(self) -> Tuple[Counter, Counter]:
+        """(acumulado, propio) por marco: acumulado = la función está en la pila, propio = es la hoja."""
+        cum: Counter = Counter()
+        own: Counter = Counter()
+        for stack, sec in self.stacks.items():
+            for name in set(stack[1:]):
+                cum[name] += sec
+            own[stack[-1]] += sec
+        return cum, own
+
+    def top(self, n: int = 25, skip_trunk: bool = True) -> pd.DataFrame:
+        """
+        Funciones por tiempo acumulado. Con skip_trunk se omiten los marcos presentes en casi
+        todas las muestras (main, run_mercancia, ...): no dicen dónde se va el tiempo.
+        """
+        cum, own = self.cumulative()
+        total = self.total_s or 1.0
+        items = [(k, v) for k, v in cum.most_common() if not (skip_trunk and v >= 0.98 * total)]
+        rows = [{"funcion": name, "acumulado_s": round(sec, 3), "propio_s": round(own.get(name, 0.0), 3),
+                 "pct": round(100 * sec / total, 1)} for name, sec in items[:n]]
+        return pd.DataFrame(rows, columns=["funcion", "acumulado_s", "propio_s", "pct"])
+
+
+def profile_path(out_path: str | None, default: str = "mercancia.xlsx") -> Path:
+    """Archivo del perfil junto a la salida: <salida sin extensión>.profile.folded."""
+    return Path(out_path or default).with_suffix(".profile.folded")
+
+
+def top_lines(prof: SamplingProfiler, n: int = 25) -> List[str]:
+    """Resumen en texto para la GUI / CLI: etapas, pasos de post y lookups por separado, luego el top."""
+    cum, _ = prof.cumulative()
+    lines = [f"Perfil: {prof.total_s:.1f}s muestreados"]
+    groups = (
+        ("Etapas", lambda k: k.startswith("pipeline.runners._stage_"), "pipeline.runners._stage_"),
+        ("Pasos de post", lambda k: k.startswith("post.compute["), ""),
+        ("Lookups", lambda k: k.startswith(("lookups.", "core.http_fetch.")), ""),
+    )
+    for title, match, prefix in groups:
+        found = sorted(((k, v) for k, v in cum.items() if match(k)), key=lambda kv: -kv[1])
+        if found:
+            lines.append(f"{title}:")
+            lines.extend(f"  {v:8.2f}s  {k[len(prefix):]}" for k, v in found[:n])
+    table = prof.top(n)
+    lines.append(f"Top {len(table)} funciones por tiempo acumulado:")
+    for r in table.itertuples(index=False):
+        lines.append(f"  {r.acumulado_s:8.2f}s {r.pct:5.1f}%  (propio {r.propio_s:.2f}s)  {r.funcion}")
+    return lines
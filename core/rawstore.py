@@ -0,0 +1,231 @@
+from __future__ import annotations
+import importlib.util
+import os
+import shutil
+import tempfile
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator
+import pandas as pd
+
+# Modos de retención de las fuentes crudas hasta el export (export.raw_store.mode):
+#   auto     -> arrow si pyarrow está instalado, si no compact
+#   arrow    -> tabla Arrow en memoria (buffers contiguos, sin un objeto Python por celda)
+#   spill    -> archivo Arrow IPC (Feather) en disco, reabierto con memory-map al exportar;
+#               sin pyarrow se usa pickle
+#   compact  -> columnas de baja cardinalidad como category (códigos + valores únicos)
+#   memory   -> DataFrame tal cual (comportamiento histórico)
+# arrow/spill verifican en put que la fuente vuelva igual (dtypes, valores y faltantes); si no
+# (p. ej. columnas object con tipos mezclados) esa fuente queda en compact / pickle.
+RAW_STORE_MODES = ("auto", "arrow", "spill", "compact", "memory")
+DEFAULT_RAW_STORE_CFG = {"mode": "auto", "spill_dir": None, "max_category_ratio": 0.5}
+
+
+def pyarrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class RawStore(Mapping):
+    """
+    Fuentes crudas (EBS/REIM/RSF) retenidas en forma compacta hasta el export.
+
+    Se comporta como un dict de solo lectura: cada acceso (store["EBS"], .get, .items)
+    materializa un DataFrame nuevo con las mismas columnas, valores y dtypes que se
+    guardaron. Quien lo consume debe soltar cada hoja después de usarla para que el pico
+    de memoria quede en una sola copia.
+    """
+
+    def __init__(self, cfg: Dict[str, Any] | None = None):
+        self.cfg = {**DEFAULT_RAW_STORE_CFG, **(cfg or {})}
+        mode = str(self.cfg.get("mode") or "auto").lower()
+        if mode not in RAW_STORE_MODES:
+            raise ValueError(f"export.raw_store.mode inválido: {mode!r} (opciones: {', '.join(RAW_STORE_MODES)})")
+        if mode == "auto":
+            mode = "arrow" if pyarrow_available() else "compact"
+        if mode == "arrow" and not pyarrow_available():
+            mode = "compact"
+        self.mode = mode
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._dir: str | None = None
+
+    # --- Mapping ---
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        return self._load(self._items[name])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    # --- escritura ---
+    def put(self, name: str, df: pd.DataFrame | None) -> None:
+        if df is None:
+            self._items[name] = {"kind": "none"}
+            return
+        meta = {"columns": list(df.columns), "dtypes": list(df.dtypes)}
+        if self.mode == "memory":
+            self._items[name] = {"kind": "frame", "df": df}
+            return
+        item = None
+        if self.mode == "arrow":
+            try:
+                item = {**meta, "kind": "arrow", "table": _to_arrow(df)}
+            except Exception:
+                item = None   # columnas object con tipos mezclados
+            if item is not None and not _round_trips(item, df):
+                item = None
+        elif self.mode == "spill":
+            item = {**meta, **self._spill(name, df)}
+            if item["kind"] == "ipc" and not _round_trips(item, df):
+                os.remove(item["path"])
+                item = {**meta, **self._spill(name, df, arrow=False)}
+        if item is None:
+            item = {**meta, "kind": "compact", "df": _compact(df, float(self.cfg.get("max_category_ratio", 0.5)))}
+        self._items[name] = item
+
+    def _spill(self, name: str, df: pd.DataFrame, arrow: bool = True) -> Dict[str, Any]:
+        if self._dir is None:
+            base = self.cfg.get("spill_dir")
+            if base:
+                os.makedirs(base, exist_ok=True)
+            self._dir = tempfile.mkdtemp(prefix="raw_", dir=base or None)
+        return spill_frame(os.path.join(self._dir, f"{len(self._items)}_{''.join(c for c in name if c.isalnum())}"), df, arrow)
+
+    # --- lectura ---
+    def _load(self, item: Dict[str, Any]) -> pd.DataFrame | None:
+        kind = item["kind"]
+        if kind == "none":
+            return None
+        if kind == "frame":
+            return item["df"]
+        return load_frame(item)
+
+    def arrow_table(self, name: str, detach: bool = False):
+        """
+        Fuente como tabla Arrow con sus encabezados crudos. Retenida en Arrow (modo arrow o
+        spill IPC) se reutilizan los buffers sin copiar; en otro modo se convierte el DataFrame.
+        detach: la tabla de un spill IPC se copia a memoria (sigue válida tras close()).
+        """
+        import pyarrow as pa
+        item = self._items[name]
+        kind = item["kind"]
+        if kind == "none":
+            return None
+        if kind in ("arrow", "ipc"):
+            table = item["table"] if kind == "arrow" else _open_ipc(item["path"])
+            if kind == "ipc" and detach:
+                table = _copy_table(table)
+            # La metadata pandas habla de las columnas posicionales c0..cn: se descarta
+            return table.rename_columns([str(c) for c in item["columns"]]).replace_schema_metadata(None)
+        df = self._load(item)
+        df = df.set_axis([str(c) for c in df.columns], axis=1)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def close(self) -> None:
+        """Libera lo retenido y borra los archivos de spill."""
+        self._items.clear()
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def spill_frame(path: str, df: pd.DataFrame, arrow: bool = True) -> Dict[str, Any]:
+    """
+    Escribe df en `path` + extensión: Arrow IPC sin compresión (se reabre con memory-map) si
+    pyarrow está instalado y las columnas lo permiten, si no pickle. Retorna el item para load_frame.
+    """
+    meta = {"columns": list(df.columns), "dtypes": list(df.dtypes),
+            "index": None if df.index.equals(pd.RangeIndex(len(df))) else df.index}
+    if arrow and pyarrow_available():
+        try:
+            import pyarrow.feather as feather
+            feather.write_feather(_to_arrow(df), path + ".arrow", compression="uncompressed")
+            return {**meta, "kind": "ipc", "path": path + ".arrow"}
+        except Exception:
+            pass   # columnas object con tipos mezclados: quedan en pickle
+    df.to_pickle(path + ".pkl")
+    return {**meta, "kind": "pickle", "path": path + ".pkl"}
+
+
+def load_frame(item: Dict[str, Any]) -> pd.DataFrame:
+    """DataFrame con las mismas columnas, dtypes e índice que se guardaron (ver spill_frame / RawStore.put)."""
+    kind = item["kind"]
+    if kind == "pickle":
+        return pd.read_pickle(item["path"])
+    if kind == "compact":
+        df = item["df"].copy()
+    else:
+        table = item["table"] if kind == "arrow" else _open_ipc(item["path"])
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    df.columns = pd.Index(item["columns"])
+    for i, dt in enumerate(item["dtypes"]):
+        if df.dtypes.iloc[i] != dt:
+            df.isetitem(i, df.iloc[:, i].astype(dt))
+    if item.get("index") is not None:
+        df.index = item["index"]
+    return df
+
+
+def _round_trips(item: Dict[str, Any], df: pd.DataFrame) -> bool:
+    """Si load_frame(item) devuelve df: mismas columnas, dtypes, faltantes y valores (con su tipo en columnas object)."""
+    try:
+        back = load_frame(item)
+    except Exception:
+        return False
+    if list(back.columns) != list(df.columns) or list(back.dtypes) != list(df.dtypes) or not back.index.equals(df.index):
+        return False
+    for i in range(df.shape[1]):
+        a, b = df.iloc[:, i], back.iloc[:, i]
+        na = a.isna().to_numpy()
+        if not (na == b.isna().to_numpy()).all():
+            return False
+        if pd.api.types.is_object_dtype(a.dtype):
+            # Mismo tipo por celda (None no es pd.NA, 1 no es "1"); los faltantes no se comparan por valor
+            if any(x is not y and (type(x) is not type(y) or (not n and x != y))
+                   for x, y, n in zip(a.to_numpy(), b.to_numpy(), na)):
+                return False
+        elif not (a[~na].to_numpy() == b[~na].to_numpy()).all():
+            return False
+    return True
+
+
+def _compact(df: pd.DataFrame, max_ratio: float) -> pd.DataFrame:
+    """Columnas de texto con pocos valores distintos -> category; el resto queda igual."""
+    out = {}
+    n = max(len(df), 1)
+    for i in range(df.shape[1]):
+        s = df.iloc[:, i]
+        if (pd.api.types.is_object_dtype(s.dtype) or pd.api.types.is_string_dtype(s.dtype)) and s.nunique(dropna=True) / n <= max_ratio:
+            s = s.astype("category")
+        out[i] = s.reset_index(drop=True)
+    res = pd.DataFrame(out)
+    res.index = df.index
+    return res
+
+
+def _to_arrow(df: pd.DataFrame):
+    """Tabla Arrow con columnas posicionales (los encabezados crudos se guardan aparte)."""
+    import pyarrow as pa
+    d = df.copy(deep=False)
+    d.columns = [f"c{i}" for i in range(d.shape[1])]
+    return pa.Table.from_pandas(d, preserve_index=False)
+
+
+def _copy_table(table):
+    """Tabla con buffers propios en memoria (no mapeados desde un archivo)."""
+    import pyarrow as pa
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as w:
+        w.write_table(table)
+    return pa.ipc.open_stream(sink.getvalue()).read_all()
+
+
+def _open_ipc(path: str):
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from collections import Counter
+from typing import Iterable
+import numpy as np
+import pandas as pd
+
+from .utils import header_key
+
+_POS, _KEY, _STRATUM = "__pos", "__key", "__estrato"
+
+
+def _bottom_k(df: pd.DataFrame, k: int | pd.Series, stratified: bool) -> pd.DataFrame:
+    """Las k filas de menor llave aleatoria (por estrato si aplica): muestra uniforme sin reemplazo."""
+    if not stratified:
+        return df.nsmallest(int(k), _KEY)
+    rank = df.groupby(_STRATUM, sort=False)[_KEY].rank(method="first")
+    return df[rank <= k]
+
+
+def reservoir_sample(chunks: Iterable[pd.DataFrame], n: int, seed: int = 0, strata: str | None = None) -> pd.DataFrame:
+    """
+    Muestra de hasta ~n filas de una fuente que llega por lotes, en una sola pasada y con
+    memoria acotada (reservoir por llaves aleatorias: se conservan las n de menor llave).
+
+    Con `strata` (encabezado crudo, se compara con header_key) la muestra se reparte entre
+    los valores de esa columna en proporción a sus filas, con al menos una fila por valor;
+    mientras se lee se guarda un reservoir de n filas por valor. Las filas quedan en el
+    orden en que aparecían en la fuente.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(int(n), 1)
+    kept: pd.DataFrame | None = None
+    counts: Counter = Counter()
+    col = None
+    pos = 0
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        if col is None and strata:
+            col = next((c for c in chunk.columns if header_key(c) == header_key(strata)), False)
+        extra = {_POS: np.arange(pos, pos + len(chunk)), _KEY: rng.random(len(chunk))}
+        if col:
+            extra[_STRATUM] = chunk[col].fillna("").astype(str).to_numpy()
+            counts.update(extra[_STRATUM].tolist())
+        pos += len(chunk)
+        part = pd.concat([chunk, pd.DataFrame(extra)], axis=1)
+        kept = part if kept is None else pd.concat([kept, part], ignore_index=True)
+        kept = _bottom_k(kept, n, bool(col))
+    if kept is None:
+        return pd.DataFrame()
+    if col:
+        total = sum(counts.values())
+        quota = {s: max(1, round(n * c / total)) for s, c in counts.items()}
+        kept = _bottom_k(kept, kept[_STRATUM].map(quota), True)
+    kept = kept.sort_values(_POS)
+    return kept.drop(columns=[c for c in (_POS, _KEY, _STRATUM) if c in kept.columns]).reset_index(drop=True)
@@ -0,0 +1,20 @@
+from __future__ import annotations
+from time import perf_counter
+from typing import List, Tuple
+import pandas as pd
+
+
+class StageClock:
+    """Cronómetro por etapas del runner: lap(nombre) registra el tiempo desde la marca anterior."""
+
+    def __init__(self):
+        self._t = perf_counter()
+        self.laps: List[Tuple[str, float]] = []
+
+    def lap(self, name: str) -> None:
+        now = perf_counter()
+        self.laps.append((name, now - self._t))
+        self._t = now
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(self.laps, columns=["etapa", "segundos"])
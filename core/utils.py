@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 ISO_PATTERN = re.compile(r"^\s*\d{4}-\d{2}-\d{2}(?:\s+\d{2}:\d{2}:\d{2})?\s*$")
 
@@ -6,3 +7,26 @@ def sanitize_sheet_name(name: str) -> str:
     bad = '[]:*?/\\'
     for ch in bad: name = name.replace(ch, ' ')
     return name[:31]
+
+def header_key(name) -> str:
+    """Llave de encabezado insensible a tildes, mayúsculas y espacios repetidos/NBSP."""
+    s = unicodedata.normalize("NFKD", str(name))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return " ".join(s.upper().split())
+
+def header_matcher(column_map: dict) -> dict:
+    """{header_key(encabezado crudo): columna estándar} a partir de un column_map del YAML (gana el primero)."""
+    out = {}
+    for raw, std in (column_map or {}).items():
+        out.setdefault(header_key(raw), std)
+    return out
+
+def match_headers(columns, matcher: dict) -> dict:
+    """Rename {encabezado crudo: estándar}; si varios encabezados dan el mismo estándar se usa el primero."""
+    rename, seen = {}, set()
+    for c in columns:
+        std = matcher.get(header_key(c))
+        if std is not None and std not in seen:
+            rename[c] = std
+            seen.add(std)
+    return rename
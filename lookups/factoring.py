@@ -1,7 +1,9 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Callable, Dict
+import numpy as np
 import pandas as pd
 from core.Lectura import read_csv_resilient
+from .proveedores import ProveedorIndex
 
 
 def _dedupe_factoring(df: pd.DataFrame, fx_cfg: Dict) -> pd.DataFrame:
@@ -32,7 +34,7 @@ def _dedupe_factoring(df: pd.DataFrame, fx_cfg: Dict) -> pd.DataFrame:
     return d[["PRIORIDAD_NUM", "FACTORING"]]
 
 
-def load_factoring_from_config(fx_cfg: Dict) -> pd.DataFrame | None:
+def load_factoring_from_config(fx_cfg: Dict, fetch: Callable[[str], pd.DataFrame] | None = None) -> pd.DataFrame | None:
     """
     Carga maestro de factoring desde Google Sheet publicado como CSV.
     Espera:
@@ -52,18 +54,19 @@ def load_factoring_from_config(fx_cfg: Dict) -> pd.DataFrame | None:
     if not url:
         return None
 
-    df = read_csv_resilient(url)
+    df = (fetch or read_csv_resilient)(url)
     if df is None or df.empty:
         return None
 
     return _dedupe_factoring(df, fx_cfg)
 
 
-def apply_factoring_lookup(df: pd.DataFrame, fx_cfg: Dict, master_fx: pd.DataFrame) -> pd.DataFrame:
+def apply_factoring_lookup(df: pd.DataFrame, fx_cfg: Dict, master_fx: pd.DataFrame, index: ProveedorIndex | None = None) -> pd.DataFrame:
     """
     Une por PRIORIDAD (numérica) y escribe la columna 'factoring' (o la definida en YAML).
     Respeta match_policy:
       on_column, write_to, overwrite_existing, trace_field, trace_value.
+    Si se pasa el índice de proveedores de la corrida, registra la tasa de match por fuente.
     """
     if master_fx is None or master_fx.empty:
         return df
@@ -79,21 +82,26 @@ def apply_factoring_lookup(df: pd.DataFrame, fx_cfg: Dict, master_fx: pd.DataFra
 
     # Preparar columna prioridad numérica (lado izquierdo)
     pr_left = pd.to_numeric(df.get(on_col), errors="coerce")
-    left = pd.DataFrame({"__idx": df.index, "PRIORIDAD_NUM": pr_left})
 
-    # Hacer merge con el maestro deduplicado
-    joined = left.merge(master_fx, on="PRIORIDAD_NUM", how="left")
+    # Gather por código: posición de cada PRIORIDAD en el maestro deduplicado (llave única)
+    codes = pd.Index(master_fx["PRIORIDAD_NUM"]).get_indexer(pr_left)
+    fx_vals = master_fx["FACTORING"].to_numpy(dtype=object)
+    found = pd.Series(np.where(codes >= 0, fx_vals[codes], np.nan), index=df.index, dtype=object)
 
     if overwrite:
-        df[out_col] = joined["FACTORING"].values
+        df[out_col] = found.values
     else:
         if out_col not in df.columns:
             df[out_col] = pd.NA
         blank = df[out_col].isna() | (df[out_col].astype("string").str.len() == 0)
-        df.loc[blank, out_col] = joined.loc[blank, "FACTORING"].values
+        df.loc[blank, out_col] = found.loc[blank].values
 
+    has_match = found.notna()
     if trace_field:
-        has_match = joined["FACTORING"].notna()
         df.loc[has_match, trace_field] = trace_value
 
+    if index is not None:
+        app_col = "APP" if "APP" in df.columns else ("origen" if "origen" in df.columns else None)
+        index.record("factoring", df[app_col] if app_col else "?", has_match)
+
     return df
@@ -0,0 +1,111 @@
+from __future__ import annotations
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from core.persist import read_table, write_table
+
+
+def fuzzy_key(values: pd.Series) -> pd.Series:
+    """Llave para comparación aproximada: mayúsculas, sin tildes, solo letras y dígitos."""
+    s = pd.Series(values).astype("string").str.upper()
+    s = s.str.normalize("NFKD").str.replace("[\u0300-\u036f]", "", regex=True)
+    return s.str.replace(r"[^0-9A-Z]", "", regex=True).fillna("")
+
+
+_RX_DIGITS = re.compile(r"\d+")
+
+
+def digit_runs(key: str) -> Tuple[str, ...]:
+    """Números de una llave fuzzy ("PROVEEDOR300CA" -> ("300",)): RIF/NIT, sucursal, etc."""
+    return tuple(_RX_DIGITS.findall(key))
+
+
+def _grams(key: str, n: int) -> List[str]:
+    if not key:
+        return []
+    k = f"^{key}$"
+    if len(k) <= n:
+        return [k]
+    return list({k[i:i + n] for i in range(len(k) - n + 1)})
+
+
+class NgramIndex:
+    """
+    Índice invertido de n-gramas de caracteres sobre las llaves de un maestro.
+    Se arma una vez; cada consulta suma postings con bincount y puntúa con Dice:
+      score = 2 * |G(q) ∩ G(c)| / (|G(q)| + |G(c)|)
+    Solo son candidatos los que tienen exactamente los mismos números que la consulta: un
+    dígito de diferencia es otro proveedor ("PROVEEDOR 300 C.A." no es "PROVEEDOR 30 C.A.",
+    aunque Dice dé 0.889).
+    """
+
+    def __init__(self, keys: Sequence[str], n: int = 3):
+        self.n = int(n)
+        self.keys = list(keys)
+        self.key_set = set(self.keys)
+        postings: Dict[str, List[int]] = {}
+        sizes = np.zeros(len(self.keys), dtype=np.int64)
+        digits: Dict[Tuple[str, ...], int] = {}
+        digit_ids = np.zeros(len(self.keys), dtype=np.int64)
+        for pos, fk in enumerate(fuzzy_key(pd.Series(self.keys, dtype="string"))):
+            digit_ids[pos] = digits.setdefault(digit_runs(fk), len(digits))
+            g = _grams(fk, self.n)
+            sizes[pos] = len(g)
+            for gram in g:
+                postings.setdefault(gram, []).append(pos)
+        self.postings = {g: np.asarray(p, dtype=np.int64) for g, p in postings.items()}
+        self.sizes = sizes
+        self._digits = digits
+        self._digit_ids = digit_ids
+        self.signature = hashlib.sha1("\n".join(sorted(self.keys)).encode("utf-8")).hexdigest()[:12]
+
+    def query(self, names: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Mejor candidato por nombre: (posiciones, scores); posición -1 si no comparte n-gramas."""
+        fks = fuzzy_key(names)
+        pos = np.full(len(fks), -1, dtype=np.int64)
+        scores = np.zeros(len(fks), dtype=float)
+        for i, fk in enumerate(fks):
+            g = _grams(fk, self.n)
+            lists = [self.postings[x] for x in g if x in self.postings]
+            if not lists:
+                continue
+            did = self._digits.get(digit_runs(fk))
+            if did is None:
+                continue
+            hits = np.bincount(np.concatenate(lists), minlength=len(self.keys))
+            score = np.where(self._digit_ids == did, 2.0 * hits / (len(g) + self.sizes), 0.0)
+            best = int(score.argmax())
+            if score[best] > 0:
+                pos[i] = best
+                scores[i] = float(score[best])
+        return pos, scores
+
+    def same_digits(self, name: str, key: str) -> bool:
+        """Si `name` y la llave `key` del maestro tienen los mismos números (ver query)."""
+        def runs(v: str) -> Tuple[str, ...]:
+            return digit_runs(re.sub(r"[^0-9A-Z]", "", unicodedata.normalize("NFKD", v.upper())))
+        return runs(name) == runs(key)
+
+
+def load_fuzzy_cache(path: str | None) -> Dict[Tuple[str, str], Tuple[str | None, float, str]]:
+    """Lee el cache de matches aproximados: (lookup, nombre) -> (match | None, score, firma_maestro)."""
+    df = read_table(path)
+    if df is None:
+        return {}
+    out = {}
+    for r in df.itertuples(index=False):
+        out[(r.lookup, r.nombre)] = (r.match or None, float(r.score or 0), r.maestro)
+    return out
+
+
+def save_fuzzy_cache(path: str | None, cache: Dict[Tuple[str, str], Tuple[str | None, float, str]]) -> None:
+    if not path:
+        return
+    rows = [
+        {"lookup": lk, "nombre": nm, "match": m or "", "score": f"{sc:.4f}", "maestro": sig}
+        for (lk, nm), (m, sc, sig) in cache.items()
+    ]
+    write_table(path, pd.DataFrame(rows, columns=["lookup", "nombre", "match", "score", "maestro"]))
@@ -0,0 +1,38 @@
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping
+import pandas as pd
+
+from .factoring import load_factoring_from_config
+from .prioridad import load_priorities_from_config
+from .tipo import load_tipo_map_from_config
+
+# Maestros remotos de la corrida: nombre en plan.lookups -> loader(cfg, fetch=...)
+LOADERS: Dict[str, Callable[..., Any]] = {
+    "prioridades": load_priorities_from_config,
+    "factoring": load_factoring_from_config,
+    "tipo_mercancia": load_tipo_map_from_config,
+}
+
+
+class MasterPrefetch:
+    """
+    Carga en hilos los maestros habilitados (prioridades, factoring, TIPO) apenas se conoce
+    la config, en paralelo con la lectura de las fuentes. La etapa de lookups pide cada uno
+    con result(): espera si la descarga sigue en curso y relanza su error si falló.
+    """
+
+    def __init__(self, lookups: Mapping[str, Any], fetch: Callable[[str], pd.DataFrame] | None = None):
+        self._futures: Dict[str, Future] = {}
+        enabled = [name for name in LOADERS if (lookups.get(name) or {}).get("enabled")]
+        if not enabled:
+            return
+        pool = ThreadPoolExecutor(max_workers=len(enabled), thread_name_prefix="maestros")
+        for name in enabled:
+            self._futures[name] = pool.submit(LOADERS[name], lookups[name], fetch=fetch)
+        pool.shutdown(wait=False)
+
+    def result(self, name: str):
+        fut = self._futures.get(name)
+        return fut.result() if fut is not None else None
+
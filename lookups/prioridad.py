@@ -2,10 +2,13 @@ from __future__ import annotations
 import os
 from datetime import datetime, timedelta, timezone
 import pandas as pd
-from typing import Any, Dict
+from typing import Any, Callable, Dict
 from core.Lectura import read_csv_resilient
+from core.partition import SourcePartition
+from core.persist import write_table
+from .proveedores import ProveedorIndex
 
-def load_priorities_from_config(pr_cfg: dict) -> pd.DataFrame | None:
+def load_priorities_from_config(pr_cfg: dict, fetch: Callable[[str], pd.DataFrame] | None = None) -> pd.DataFrame | None:
     if not pr_cfg or not pr_cfg.get("enabled"): return None
     url = (pr_cfg or {}).get("url")
     if not url: return None
@@ -21,20 +24,21 @@ def load_priorities_from_config(pr_cfg: dict) -> pd.DataFrame | None:
             try: return read_csv_resilient(cache_path)
             except Exception: pass
 
-    df = read_csv_resilient(url)
+    df = (fetch or read_csv_resilient)(url)
     if use_cache and cache_path:
-        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-        df.to_csv(cache_path, index=False)
+        write_table(cache_path, df)
     return df
 
-def _prov_key_nospaces(series: pd.Series) -> pd.Series:
-    s = series.astype("string").str.replace("\u00A0"," ", regex=False)
-    return s.str.replace(r"\s+","", regex=True)
-
-def apply_priority_lookup(df: pd.DataFrame, pr_cfg: dict, master: pd.DataFrame) -> pd.DataFrame:
-    if master is None or master.empty: return df
+def register_priorities(index: ProveedorIndex, master: pd.DataFrame) -> None:
+    """Registra el maestro PROVEEDOR -> PRIORIDAD en el índice compartido (primera coincidencia)."""
     if "PROVEEDOR" not in master.columns or "PRIORIDAD" not in master.columns:
         raise ValueError("El maestro de prioridades debe tener columnas PROVEEDOR y PRIORIDAD.")
+    index.register("prioridad", master["PROVEEDOR"], master["PRIORIDAD"], keep="first")
+
+def apply_priority_lookup(df: pd.DataFrame, pr_cfg: dict, master: pd.DataFrame, index: ProveedorIndex | None = None) -> pd.DataFrame:
+    if master is None or master.empty: return df
+    if index is None: index = ProveedorIndex()
+    if not index.has("prioridad"): register_priorities(index, master)
 
     df = df.copy()
     mp = (pr_cfg or {}).get("match_policy", {})
@@ -47,28 +51,23 @@ def apply_priority_lookup(df: pd.DataFrame, pr_cfg: dict, master: pd.DataFrame)
     default_pr = mp.get("default_priority")
 
     app_col = "APP" if "APP" in df.columns else ("origen" if "origen" in df.columns else None)
-    mask_src = df[app_col].astype("string").str.upper().isin({s.upper() for s in apply_srcs}) if app_col else False
+    mask_src = SourcePartition.of(df, app_col).series_mask(df.index, *apply_srcs) if app_col else False
     cur = df.get(out_col); 
     if cur is None: df[out_col] = pd.NA; cur = df[out_col]
     need = mask_src & (overwrite | (cur.isna() | (cur.astype("string").str.len()==0)))
     if not need.any(): return df
 
-    m = master.copy()
-    m["__PROV_KEY_NS"] = _prov_key_nospaces(m["PROVEEDOR"])
-    m = m.drop_duplicates(["__PROV_KEY_NS"], keep="first")
-
-    left = df.loc[need, [on_col]].copy()
-    left["__PROV_KEY_NS"] = _prov_key_nospaces(left[on_col])
-
-    joined = left[["__PROV_KEY_NS"]].merge(m[["__PROV_KEY_NS","PRIORIDAD"]], on="__PROV_KEY_NS", how="left")
+    # Gather por código de proveedor (índice compartido de la corrida)
+    found, fuzzy = index.lookup("prioridad", df.loc[need, on_col], source=df.loc[need, app_col] if app_col else "?")
 
     df.loc[need, out_col] = df.loc[need, out_col].astype("string").where(
-        df.loc[need, out_col].astype("string").str.len()>0, joined["PRIORIDAD"].values
+        df.loc[need, out_col].astype("string").str.len()>0, found
     )
 
     if trace_f:
-        has = joined["PRIORIDAD"].notna()
+        has = found.notna().reindex(df.index, fill_value=False)
         df.loc[need & has, trace_f] = trace_val
+        df.loc[need & fuzzy.reindex(df.index, fill_value=False), trace_f] = index.fuzzy_cfg.get("trace_value", "MAESTRO_SHEET_FUZZY")
         if default_pr is not None:
             no = ~has
             df.loc[need & no, out_col] = df.loc[need & no, out_col].where(
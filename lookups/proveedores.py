@@ -0,0 +1,233 @@
+from __future__ import annotations
+from typing import Dict, Tuple
+import numpy as np
+import pandas as pd
+from core.partition import source_codes
+from core.persist import cache_path
+from .fuzzy import NgramIndex, load_fuzzy_cache, save_fuzzy_cache
+
+
+# Llave canónica por defecto: equivalente a la regla histórica de prioridades
+# (NBSP -> espacio y se eliminan todos los espacios; sensible a tildes/mayúsculas).
+DEFAULT_KEY_CFG = {
+    "nbsp": True,           # NBSP / espacios invisibles -> espacio
+    "whitespace": "remove", # remove | collapse | strip
+    "accents": False,       # True: ignora tildes (Á -> A)
+    "case": False,          # True: ignora mayúsculas/minúsculas
+    "punctuation": False,   # True: elimina puntuación (".", ",", "-", ...)
+}
+
+# Match aproximado (opcional) sobre los nombres que no encontraron match exacto
+DEFAULT_FUZZY_CFG = {
+    "enabled": False,
+    "apply_to": ["prioridad", "tipo"],
+    "threshold": 0.85,
+    "ngram": 3,
+    "trace_value": "MAESTRO_SHEET_FUZZY",
+    "cache": {"enabled": True, "path": "./.cache/fuzzy_proveedores.csv"},
+}
+
+
+class ProveedorIndex:
+    """
+    Índice único de proveedores por corrida.
+
+    - Normaliza nombres a una llave canónica configurable (lookups.proveedor_key).
+    - Asigna a cada llave un código entero (hash vía pandas.Index).
+    - Cada maestro registrado (prioridad, tipo, ...) queda como un arreglo alineado
+      a esos códigos, de modo que cada lookup es un gather vectorizado.
+    - Acumula estadísticas de match por lookup y fuente.
+    - Opcional (lookups.fuzzy): los nombres sin match exacto se resuelven contra un
+      índice de n-gramas del maestro; los matches aceptados quedan en un cache en disco.
+
+    La normalización de texto se hace solo sobre los valores distintos de cada
+    columna (factorize), no fila por fila.
+    """
+
+    def __init__(self, key_cfg: Dict | None = None):
+        self.key_cfg = {**DEFAULT_KEY_CFG, **(key_cfg or {})}
+        self.keys = pd.Index([], dtype=object)
+        self._values: Dict[str, np.ndarray] = {}
+        self._stats: Dict[Tuple[str, str], list] = {}
+        self.fuzzy_cfg = dict(DEFAULT_FUZZY_CFG)
+        self._ngram: Dict[str, NgramIndex] = {}
+        self._fuzzy_cache: Dict[Tuple[str, str], Tuple[str | None, float, str]] = {}
+
+    def enable_fuzzy(self, fuzzy_cfg: Dict | None) -> None:
+        """Activa el match aproximado según lookups.fuzzy y carga el cache persistente."""
+        self.fuzzy_cfg = {**DEFAULT_FUZZY_CFG, **(fuzzy_cfg or {})}
+        if self.fuzzy_cfg.get("enabled"):
+            self._fuzzy_cache = load_fuzzy_cache(self._fuzzy_cache_path())
+
+    def _fuzzy_cache_path(self) -> str | None:
+        return cache_path(self.fuzzy_cfg)
+
+    def save_fuzzy_cache(self) -> None:
+        if self.fuzzy_cfg.get("enabled") and self._fuzzy_cache:
+            save_fuzzy_cache(self._fuzzy_cache_path(), self._fuzzy_cache)
+
+    # --- llaves y códigos ---
+    def canonical(self, values: pd.Series) -> pd.Series:
+        """Llave canónica para cada valor (NA / vacío -> NA)."""
+        s = pd.Series(values).astype("string")
+        kc = self.key_cfg
+        if kc.get("nbsp", True):
+            s = (s.str.replace("\u00A0", " ", regex=False)
+                  .str.replace("[\u200B\u200C\u200D\uFEFF]", "", regex=True))
+        if kc.get("accents"):
+            s = s.str.normalize("NFKD").str.replace("[\u0300-\u036f]", "", regex=True)
+        if kc.get("case"):
+            s = s.str.upper()
+        if kc.get("punctuation"):
+            s = s.str.replace(r"[^\w\s]", "", regex=True)
+        ws = (kc.get("whitespace") or "remove").lower()
+        if ws == "remove":
+            s = s.str.replace(r"\s+", "", regex=True)
+        elif ws == "collapse":
+            s = s.str.replace(r"\s+", " ", regex=True).str.strip()
+        else:
+            s = s.str.strip()
+        return s.mask(s.str.len().eq(0).fillna(False))
+
+    def encode(self, proveedores: pd.Series) -> np.ndarray:
+        """Códigos enteros (posición en self.keys) para cada fila; -1 = sin llave conocida."""
+        codes, uniques = pd.factorize(pd.Series(proveedores), use_na_sentinel=True)
+        if len(uniques) == 0:
+            return np.full(len(codes), -1, dtype=np.int64)
+        canon = self.canonical(pd.Series(uniques))
+        ucodes = self.keys.get_indexer(canon.astype(object).where(canon.notna(), None))
+        ucodes = np.where(canon.notna().to_numpy(), ucodes, -1)
+        return np.where(codes >= 0, ucodes[codes], -1)
+
+    # --- maestros ---
+    def register(self, name: str, proveedores: pd.Series, values: pd.Series, keep: str = "first") -> None:
+        """Registra un maestro PROVEEDOR -> valor. keep: 'first' | 'last' ante llaves repetidas."""
+        canon = self.canonical(pd.Series(proveedores).reset_index(drop=True))
+        vals = pd.Series(values).reset_index(drop=True).astype("string")
+        m = pd.DataFrame({"k": canon, "v": vals}).dropna(subset=["k"])
+        m = m.drop_duplicates(["k"], keep="last" if keep == "last" else "first")
+
+        new = pd.Index(m["k"].astype(object).unique()).difference(self.keys, sort=False)
+        if len(new):
+            self.keys = self.keys.append(new)
+            # extender maestros ya registrados (las llaves nuevas no tienen valor en ellos)
+            for k, arr in self._values.items():
+                self._values[k] = np.concatenate([arr, np.full(len(new), None, dtype=object)])
+
+        arr = np.full(len(self.keys), None, dtype=object)
+        arr[self.keys.get_indexer(m["k"].astype(object))] = m["v"].astype(object).where(m["v"].notna(), None).to_numpy()
+        self._values[name] = arr
+        self._ngram.pop(name, None)
+
+    def register_map(self, name: str, mapping: pd.Series, keep: str = "first") -> None:
+        """Registra un maestro dado como Series (index=PROVEEDOR, values=valor)."""
+        self.register(name, pd.Series(mapping.index), pd.Series(mapping.values), keep=keep)
+
+    def has(self, name: str) -> bool:
+        return name in self._values
+
+    def gather(self, name: str, proveedores: pd.Series, source: str | pd.Series | None = None) -> pd.Series:
+        """
+        Valor del maestro `name` para cada fila (NA si no hay match), alineado al índice de entrada.
+        Si se indica `source` (etiqueta o Series por fila) se registran estadísticas de match.
+        """
+        return self.lookup(name, proveedores, source)[0]
+
+    def lookup(self, name: str, proveedores: pd.Series, source: str | pd.Series | None = None) -> Tuple[pd.Series, pd.Series]:
+        """Como gather(), pero devuelve además la máscara de filas resueltas por match aproximado."""
+        proveedores = pd.Series(proveedores)
+        arr = self._values.get(name)
+        out = np.full(len(proveedores), None, dtype=object)
+        is_fuzzy = np.zeros(len(proveedores), dtype=bool)
+        if arr is not None and len(proveedores):
+            codes = self.encode(proveedores)
+            ok = codes >= 0
+            out[ok] = arr[codes[ok]]
+            if self._fuzzy_applies(name):
+                miss = np.flatnonzero(pd.isna(out) & proveedores.notna().to_numpy())
+                if len(miss):
+                    fcodes = self._fuzzy_codes(name, proveedores.iloc[miss])
+                    hit = fcodes >= 0
+                    out[miss[hit]] = arr[fcodes[hit]]
+                    is_fuzzy[miss[hit]] = True
+        res = pd.Series(out, index=proveedores.index, dtype="string")
+        fz = pd.Series(is_fuzzy, index=proveedores.index)
+        if source is not None:
+            self.record(name, source, res.notna(), fz)
+        return res, fz
+
+    # --- match aproximado ---
+    def _fuzzy_applies(self, name: str) -> bool:
+        fc = self.fuzzy_cfg
+        return bool(fc.get("enabled")) and name in set(fc.get("apply_to") or [])
+
+    def _fuzzy_codes(self, name: str, proveedores: pd.Series) -> np.ndarray:
+        """Códigos (posición en self.keys) resueltos por n-gramas; se puntúa una vez por nombre distinto."""
+        arr = self._values[name]
+        ng = self._ngram.get(name)
+        if ng is None:
+            ng = NgramIndex(self.keys[np.flatnonzero(pd.notna(arr))].astype(str), n=self.fuzzy_cfg.get("ngram", 3))
+            self._ngram[name] = ng
+        threshold = float(self.fuzzy_cfg.get("threshold", 0.85))
+
+        codes, uniques = pd.factorize(proveedores)
+        canon = self.canonical(pd.Series(uniques)).fillna("").astype(str).to_numpy()
+        matched = np.full(len(canon), None, dtype=object)
+
+        pending = []
+        for i, c in enumerate(canon):
+            if not c:
+                continue
+            hit = self._fuzzy_cache.get((name, c))
+            if hit is not None:
+                m, _, sig = hit
+                # Matches de un cache anterior a la regla de números iguales se vuelven a puntuar
+                if m is not None and m in ng.key_set and ng.same_digits(c, m):
+                    matched[i] = m
+                    continue
+                if m is None and sig == ng.signature:
+                    continue
+            pending.append(i)
+
+        if pending:
+            pos, scores = ng.query(pd.Series(canon[pending], dtype="string"))
+            for i, p, sc in zip(pending, pos, scores):
+                m = ng.keys[p] if (p >= 0 and sc >= threshold) else None
+                matched[i] = m
+                self._fuzzy_cache[(name, canon[i])] = (m, float(sc), ng.signature)
+
+        ucodes = self.keys.get_indexer(pd.Index(matched, dtype=object))
+        ucodes = np.where(pd.notna(matched), ucodes, -1)
+        return np.where(codes >= 0, ucodes[codes], -1)
+
+    # --- estadísticas ---
+    def record(self, name: str, source: str | pd.Series, matched: pd.Series, fuzzy: pd.Series | None = None) -> None:
+        """Acumula filas consultadas / con match (/ aproximadas) para `name`, por fuente (etiqueta o Series por fila)."""
+        fuzzy = fuzzy if fuzzy is not None else pd.Series(False, index=matched.index)
+        if isinstance(source, pd.Series):
+            # Conteo por código de fuente (APP categórica del consolidado: sin recorrer texto)
+            codes, labels = source_codes(source)
+            labels = labels + ["?"]
+            codes = np.where(codes >= 0, codes, len(labels) - 1)
+            n = len(labels)
+            total = np.bincount(codes, minlength=n)
+            hits = np.bincount(codes, weights=matched.to_numpy(dtype=bool), minlength=n)
+            fz = np.bincount(codes, weights=fuzzy.to_numpy(dtype=bool), minlength=n)
+            for i in sorted(np.flatnonzero(total), key=lambda i: labels[i]):
+                self._add_stat(name, labels[i], int(total[i]), int(hits[i]), int(fz[i]))
+        else:
+            self._add_stat(name, str(source).upper(), len(matched), int(matched.sum()), int(fuzzy.sum()))
+
+    def _add_stat(self, name: str, src: str, total: int, hits: int, fuzzy: int = 0) -> None:
+        acc = self._stats.setdefault((name, src), [0, 0, 0])
+        acc[0] += total
+        acc[1] += hits
+        acc[2] += fuzzy
+
+    def match_stats(self) -> pd.DataFrame:
+        """Tabla lookup/fuente con filas consultadas, matches (de ellos, aproximados) y tasa de match."""
+        rows = [
+            {"lookup": n, "fuente": s, "filas": t, "con_match": h, "aproximados": f, "tasa": (h / t) if t else float("nan")}
+            for (n, s), (t, h, f) in self._stats.items()
+        ]
+        return pd.DataFrame(rows, columns=["lookup", "fuente", "filas", "con_match", "aproximados", "tasa"])
@@ -1,11 +1,13 @@
 from __future__ import annotations
-from typing import Dict
+from typing import Callable, Dict
 import pandas as pd
 
 from core.Lectura import read_csv_resilient
+from core.partition import SourcePartition
+from .proveedores import ProveedorIndex
 
 
-def load_tipo_map_from_config(tp_cfg: Dict) -> pd.Series | None:
+def load_tipo_map_from_config(tp_cfg: Dict, fetch: Callable[[str], pd.DataFrame] | None = None) -> pd.Series | None:
     """
     Lee el mini maestro PROVEEDOR->TIPO desde un Google Sheet publicado como CSV,
     según la configuración YAML (lookups.tipo_mercancia).
@@ -30,7 +32,7 @@ def load_tipo_map_from_config(tp_cfg: Dict) -> pd.Series | None:
     if not url:
         return None
 
-    df = read_csv_resilient(url)
+    df = (fetch or read_csv_resilient)(url)
     if df is None or df.empty:
         return None
 
@@ -63,10 +65,18 @@ def load_tipo_map_from_config(tp_cfg: Dict) -> pd.Series | None:
     return tipo_map
 
 
-def apply_tipo_lookup(df: pd.DataFrame, tp_cfg: Dict, tipo_map: pd.Series | None) -> pd.DataFrame:
+def register_tipo(index: ProveedorIndex, tipo_map: pd.Series | None, tp_cfg: Dict | None = None) -> None:
+    """Registra el mini maestro PROVEEDOR->TIPO en el índice compartido de la corrida."""
+    if tipo_map is None or getattr(tipo_map, "empty", True):
+        return
+    policy = (tp_cfg or {}).get("duplicate_policy", "last_row")
+    index.register_map("tipo", tipo_map, keep="first" if policy == "first_row" else "last")
+
+
+def apply_tipo_lookup(df: pd.DataFrame, tp_cfg: Dict, tipo_map: pd.Series | None, index: ProveedorIndex | None = None) -> pd.DataFrame:
     """
     Escribe una columna (por defecto 'tipo_mercancia') a partir del mini maestro (tipo_map).
-    Respeta match_policy si viene en el YAML.
+    Respeta match_policy si viene en el YAML. Solo escribe filas con match.
 
     Por defecto:
       apply_to_sources = ["EBS","REIM","RSF"]
@@ -78,6 +88,10 @@ def apply_tipo_lookup(df: pd.DataFrame, tp_cfg: Dict, tipo_map: pd.Series | None
     """
     if tipo_map is None or getattr(tipo_map, "empty", True):
         return df
+    if index is None:
+        index = ProveedorIndex()
+    if not index.has("tipo"):
+        register_tipo(index, tipo_map, tp_cfg)
 
     df = df.copy()
 
@@ -92,7 +106,7 @@ def apply_tipo_lookup(df: pd.DataFrame, tp_cfg: Dict, tipo_map: pd.Series | None
     # Determinar columna de fuente (APP u origen)
     app_col = "APP" if "APP" in df.columns else ("origen" if "origen" in df.columns else None)
     if app_col:
-        mask_src = df[app_col].astype("string").str.upper().isin({s.upper() for s in apply_srcs})
+        mask_src = SourcePartition.of(df, app_col).series_mask(df.index, *apply_srcs)
     else:
         # Si no hay APP/origen, aplica a todas
         mask_src = pd.Series(True, index=df.index)
@@ -110,23 +124,13 @@ def apply_tipo_lookup(df: pd.DataFrame, tp_cfg: Dict, tipo_map: pd.Series | None
     if not mask_need.any():
         return df
 
-    # Limpieza ligera del proveedor antes de mapear (NBSP + strip)
-    prov = (
-        df.loc[mask_need, on_col]
-        .astype("string")
-        .str.replace("\u00A0", " ", regex=False)
-        .str.strip()
-    )
-    lk = prov.map(tipo_map)
-
-    if overwrite:
-        df.loc[mask_need & lk.notna(), out_col] = lk[lk.notna()].astype("string")
-    else:
-        blank = df.loc[mask_need, out_col].isna() | (df.loc[mask_need, out_col].astype("string").str.len() == 0)
-        idx   = blank[blank].index
-        df.loc[idx, out_col] = lk.loc[idx]
+    # Gather por código de proveedor (llave canónica del índice)
+    lk, fuzzy = index.lookup("tipo", df.loc[mask_need, on_col], source=df.loc[mask_need, app_col] if app_col else "?")
+    hit = lk.notna().reindex(df.index, fill_value=False)
 
+    df.loc[hit, out_col] = lk[lk.notna()]
     if trace_field:
-        df.loc[mask_need & lk.notna(), trace_field] = trace_value
+        df.loc[hit, trace_field] = trace_value
+        df.loc[fuzzy.reindex(df.index, fill_value=False), trace_field] = index.fuzzy_cfg.get("trace_value", "MAESTRO_SHEET_FUZZY")
 
     return df
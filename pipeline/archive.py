@@ -0,0 +1,230 @@
+"""
+Archivo histórico de consolidaciones (mercancia.archive).
+
+Cada corrida (no vista previa) guarda su consolidado en un dataset Parquet particionado
+estilo hive por país y lunes de ejecución, con el manifiesto de la corrida al lado:
+
+  <dir>/pais=VE/exec_mon=2025-03-10/part-0.parquet
+  <dir>/pais=VE/exec_mon=2025-03-10/_manifest.json
+
+Volver a correr la misma semana reemplaza su partición (la última corrida es la vigente).
+Todas las particiones comparten el esquema ARCHIVE_COLUMNS (columnas que un país no usa
+quedan nulas), así las consultas ven un solo esquema sin leer todos los footers.
+
+Las consultas filtran por partición (país, rango de lunes) antes de abrir archivos y leen
+solo las columnas pedidas.
+
+Uso:  python -m pipeline.archive query --pais VE --proveedor "ACME" --desde 2025-01-01 --hasta 2025-03-31 --caja Jueves
+      python -m pipeline.archive runs [--pais CO]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+import pandas as pd
+
+from core.rawstore import pyarrow_available
+
+DEFAULT_ARCHIVE_CFG = {"enabled": False, "dir": "./archive"}
+PART_FILE = "part-0.parquet"
+MANIFEST_FILE = "_manifest.json"   # prefijo "_": el lector de datasets lo ignora
+# Columnas archivadas (orden estándar del schema + extras de VE) y su tipo Arrow
+ARCHIVE_COLUMNS: Dict[str, str] = {
+    "APP": "string", "factura": "string", "orden_compra": "string", "proveedor": "string",
+    "tipo_mercancia": "string", "monto": "float64", "fecha_creacion": "timestamp",
+    "fecha_vencimiento": "timestamp", "dia_de_pago": "timestamp", "dia_de_pago_dow": "string",
+    "prioridad": "string", "tipo_documento": "string", "factoring": "string", "en_alcance": "bool",
+    "fecha_documento": "timestamp", "Grupo de Pago": "string", "Caja": "string",
+}
+# Columnas por defecto del resultado de una consulta
+QUERY_COLUMNS = ("pais", "exec_mon", "APP", "proveedor", "factura", "monto", "fecha_vencimiento", "Caja", "Grupo de Pago")
+
+
+class ArchiveError(RuntimeError):
+    """Archivo histórico no disponible (pyarrow no instalado) o consulta inválida."""
+
+
+def _require_pyarrow() -> None:
+    if not pyarrow_available():
+        raise ArchiveError("El archivo histórico (Parquet) requiere pyarrow instalado.")
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    types = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("ns"), "bool": pa.bool_()}
+    return pa.schema([(c, types[t]) for c, t in ARCHIVE_COLUMNS.items()])
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("pais", pa.string()), ("exec_mon", pa.date32())]), flavor="hive")
+
+
+def _to_table(df: pd.DataFrame):
+    """Consolidado con el esquema del archivo (columnas faltantes nulas, el resto casteado)."""
+    import pyarrow as pa
+    schema = _arrow_schema()
+    arrays = []
+    for field in schema:
+        if field.name in df.columns:
+            col = df[field.name]
+            if field.type == pa.string():
+                col = col.astype("string")
+            elif pa.types.is_timestamp(field.type):
+                col = pd.to_datetime(col, errors="coerce")
+            arrays.append(pa.array(col, from_pandas=True).cast(field.type))
+        else:
+            arrays.append(pa.nulls(len(df), field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class RunArchive:
+    """Dataset Parquet de consolidados bajo `dir` (ver docstring del módulo)."""
+
+    def __init__(self, cfg: Mapping[str, Any] | None = None):
+        self.cfg = {**DEFAULT_ARCHIVE_CFG, **dict(cfg or {})}
+        self.root = Path(self.cfg.get("dir") or DEFAULT_ARCHIVE_CFG["dir"])
+
+    def partition(self, pais: str, exec_mon: pd.Timestamp) -> Path:
+        return self.root / f"pais={pais}" / f"exec_mon={pd.Timestamp(exec_mon).date().isoformat()}"
+
+    def append(self, df: pd.DataFrame, pais: str | None, exec_mon: pd.Timestamp, manifest: Dict[str, Any]) -> Path:
+        """Guarda el consolidado de la corrida y su manifiesto; reemplaza la partición si ya existía."""
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        final = self.partition(pais or "NA", exec_mon)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=f".{final.name}.", dir=final.parent)
+        try:
+            pq.write_table(_to_table(df), os.path.join(tmp, PART_FILE), compression="zstd")
+            with open(os.path.join(tmp, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump({"pais": pais, "exec_mon": final.name.split("=", 1)[1], "filas": len(df), **manifest},
+                          f, ensure_ascii=False, indent=2, default=str)
+            # Publicar con renames: una consulta concurrente ve la partición vieja o la nueva completa
+            old = None
+            if final.exists():
+                old = tempfile.mkdtemp(prefix=f".{final.name}.old.", dir=final.parent)
+                os.replace(final, os.path.join(old, "p"))
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        return final
+
+    def runs(self, pais: str | None = None) -> pd.DataFrame:
+        """Manifiestos de las corridas archivadas (una fila por país y semana)."""
+        rows = []
+        for p in sorted(self.root.glob(f"pais={pais or '*'}/exec_mon=*/{MANIFEST_FILE}")):
+            with open(p, encoding="utf-8") as f:
+                m = json.load(f)
+            rows.append({k: v for k, v in m.items() if not isinstance(v, (dict, list))})
+        return pd.DataFrame(rows)
+
+    def query(
+        self,
+        pais: str | Sequence[str] | None = None,
+        proveedor: str | None = None,
+        desde: str | pd.Timestamp | None = None,
+        hasta: str | pd.Timestamp | None = None,
+        caja: str | Sequence[str] | None = None,
+        grupo_pago: str | Sequence[str] | None = None,
+        columns: Iterable[str] | None = QUERY_COLUMNS,
+    ) -> pd.DataFrame:
+        """
+        Filas archivadas que cumplen todos los filtros dados:
+          pais / desde / hasta   -> poda de particiones (desde/hasta sobre el lunes de ejecución)
+          proveedor              -> contiene el texto (sin distinguir mayúsculas)
+          caja / grupo_pago      -> valor exacto (o lista de valores)
+        Solo se leen `columns` (None = todas).
+        """
+        _require_pyarrow()
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        if not self.root.exists():
+            return pd.DataFrame(columns=list(columns or ("pais", "exec_mon", *ARCHIVE_COLUMNS)))
+        part = _partitioning()
+        schema = _arrow_schema()
+        for field in part.schema:
+            schema = schema.append(field)
+        dataset = ds.dataset(self.root, format="parquet", partitioning=part, schema=schema)
+        cond = []
+        if pais:
+            cond.append(ds.field("pais").isin(_as_list(pais, str.upper)))
+        if desde is not None:
+            cond.append(ds.field("exec_mon") >= pd.Timestamp(desde).date())
+        if hasta is not None:
+            cond.append(ds.field("exec_mon") <= pd.Timestamp(hasta).date())
+        if proveedor:
+            cond.append(pc.match_substring(ds.field("proveedor"), str(proveedor).strip(), ignore_case=True))
+        if caja:
+            cond.append(ds.field("Caja").isin(_as_list(caja)))
+        if grupo_pago:
+            cond.append(ds.field("Grupo de Pago").isin(_as_list(grupo_pago)))
+        flt = None
+        for c in cond:
+            flt = c if flt is None else (flt & c)
+        cols = list(columns) if columns is not None else None
+        if cols is not None:
+            unknown = [c for c in cols if c not in dataset.schema.names]
+            if unknown:
+                raise ArchiveError(f"Columnas inexistentes en el archivo: {', '.join(unknown)}")
+        return dataset.to_table(columns=cols, filter=flt).to_pandas()
+
+
+def _as_list(v: str | Sequence[str], fn=None) -> List[str]:
+    items = [v] if isinstance(v, str) else list(v)
+    return [fn(str(x)) if fn else str(x) for x in items]
+
+
+def summarize(df: pd.DataFrame) -> pd.DataFrame:
+    """Filas y monto total por país, semana y Caja (lo que suele pedir tesorería)."""
+    keys = [c for c in ("pais", "exec_mon", "Caja") if c in df.columns]
+    if df.empty or "monto" not in df.columns or not keys:
+        return pd.DataFrame()
+    return (df.groupby(keys, dropna=False, observed=True)["monto"]
+              .agg(filas="size", monto="sum").reset_index())
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Consultas sobre el archivo histórico de consolidaciones")
+    ap.add_argument("--dir", default=DEFAULT_ARCHIVE_CFG["dir"], help="raíz del archivo (mercancia.archive.dir)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    r = sub.add_parser("runs", help="corridas archivadas")
+    r.add_argument("--pais", default=None)
+    q = sub.add_parser("query", help="filas que cumplen los filtros + totales por semana y Caja")
+    q.add_argument("--pais", nargs="+", default=None)
+    q.add_argument("--proveedor", default=None, help="texto contenido en el proveedor (sin distinguir mayúsculas)")
+    q.add_argument("--desde", default=None, help="yyyy-mm-dd (lunes de ejecución)")
+    q.add_argument("--hasta", default=None, help="yyyy-mm-dd (lunes de ejecución)")
+    q.add_argument("--caja", nargs="+", default=None)
+    q.add_argument("--grupo-pago", nargs="+", default=None)
+    q.add_argument("--columns", nargs="+", default=None)
+    q.add_argument("--out", default=None, help="guardar las filas en CSV")
+    a = ap.parse_args()
+
+    archive = RunArchive({"dir": a.dir})
+    if a.cmd == "runs":
+        print(archive.runs(a.pais.upper() if a.pais else None).to_string(index=False))
+        return
+    df = archive.query(a.pais, a.proveedor, a.desde, a.hasta, a.caja, a.grupo_pago,
+                       columns=a.columns or QUERY_COLUMNS)
+    print(f"{len(df):,} filas")
+    tot = summarize(df)
+    if not tot.empty:
+        print(tot.to_string(index=False))
+        print(f"Total monto: {df['monto'].sum():,.2f}")
+    if a.out:
+        df.to_csv(a.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 from __future__ import annotations
 import pandas as pd
 from core.dtypes import to_dt
+from lookups.proveedores import ProveedorIndex
+from lookups.tipo import register_tipo
 
 def _first_existing(df: pd.DataFrame, candidates: list[str]) -> str | None:
     for name in candidates:
@@ -8,7 +10,7 @@ def _first_existing(df: pd.DataFrame, candidates: list[str]) -> str | None:
             return name
     return None
 
-def enrich_raw_sources(raws: dict[str, pd.DataFrame], exec_mon: pd.Timestamp, tipo_map: pd.Series | None = None) -> dict[str, pd.DataFrame]:
+def enrich_raw_sources(raws: dict[str, pd.DataFrame], exec_mon: pd.Timestamp, tipo_map: pd.Series | None = None, index: ProveedorIndex | None = None) -> dict[str, pd.DataFrame]:
     """
     Agrega columnas solicitadas en hojas originales:
       EBS:  Saldo, Caja, Grupo de Pago (desde PRIORIDAD)
@@ -60,7 +62,8 @@ def enrich_raw_sources(raws: dict[str, pd.DataFrame], exec_mon: pd.Timestamp, ti
                     tienda_col=tienda_col,
                     sucursal_col=suc_col or "Sucursal",
                     proveedor_col=prov_col or "Proveedor",
-                    tipo_map=tipo_map   # <<< mini maestro PROVEEDOR->TIPO
+                    tipo_map=tipo_map,  # <<< mini maestro PROVEEDOR->TIPO
+                    index=index
                 )
             else:
                 d["Grupo de Pago"] = "NO DEFINIDO"
@@ -98,7 +101,8 @@ def enrich_raw_sources(raws: dict[str, pd.DataFrame], exec_mon: pd.Timestamp, ti
                     tienda_col=tienda_col,
                     sucursal_col=suc_col or "Sucursal",
                     proveedor_col=prov_col or "Proveedor",
-                    tipo_map=tipo_map   # <<< mini maestro PROVEEDOR->TIPO
+                    tipo_map=tipo_map,  # <<< mini maestro PROVEEDOR->TIPO
+                    index=index
                 )
             else:
                 d["Grupo de Pago"] = "NO DEFINIDO"
@@ -143,13 +147,17 @@ def grupo_pago_from_tienda_sucursal_o_proveedor(df: pd.DataFrame,
                                                 tienda_col: str,
                                                 sucursal_col: str,
                                                 proveedor_col: str,
-                                                tipo_map: pd.Series | None) -> pd.Series:
+                                                tipo_map: pd.Series | None,
+                                                index: ProveedorIndex | None = None,
+                                                source: str | None = None) -> pd.Series:
     """
     Regla:
       - Si Tienda != 'CENDIS' -> 'DIRECTO'
       - Else si Sucursal termina en PPV/PPV1/PPV2/PPV3 -> 'PPV RMS'
       - Else si PROVEEDOR está en mini maestro -> usar TIPO del maestro
       - Si no, 'NO DEFINIDO'
+    El match de PROVEEDOR usa la llave canónica del índice compartido (si no se pasa, se arma uno local).
+    'source' (EBS/REIM/RSF) solo etiqueta las estadísticas de match.
     """
     tienda = df.get(tienda_col)
     suc    = df.get(sucursal_col)
@@ -160,7 +168,7 @@ def grupo_pago_from_tienda_sucursal_o_proveedor(df: pd.DataFrame,
 
     st_tienda = tienda.astype("string").str.strip()
     st_suc    = suc.astype("string").str.strip() if suc is not None else pd.Series(pd.NA, index=df.index, dtype="string")
-    st_prov   = prov.astype("string").str.replace("\u00A0"," ", regex=False).str.strip() if prov is not None else pd.Series(pd.NA, index=df.index, dtype="string")
+    st_prov   = prov if prov is not None else pd.Series(pd.NA, index=df.index, dtype="string")
 
     out = pd.Series("NO DEFINIDO", index=df.index, dtype="string")
 
@@ -175,12 +183,15 @@ def grupo_pago_from_tienda_sucursal_o_proveedor(df: pd.DataFrame,
     out.loc[mask_cendis & mask_ppv] = "PPV RMS"
 
     # 3) Fallback por PROVEEDOR en mini maestro (solo los que siguen bajo CENDIS y no PPV*)
-    mask_needs_lookup = mask_cendis & (~mask_ppv)
-    if tipo_map is not None and not tipo_map.empty:
-        # index del map es proveedor literal con strip; hacemos match literal
-        out.loc[mask_needs_lookup] = out.loc[mask_needs_lookup]  # no-op para mantener índice
-        lk = st_prov.map(tipo_map)
-        out.loc[mask_needs_lookup & lk.notna()] = lk[mask_needs_lookup & lk.notna()].astype("string")
+    mask_needs_lookup = (mask_cendis & (~mask_ppv)).fillna(False)
+    if tipo_map is not None and not tipo_map.empty and mask_needs_lookup.any():
+        if index is None:
+            index = ProveedorIndex()
+        if not index.has("tipo"):
+            register_tipo(index, tipo_map)
+        lk = index.gather("tipo", st_prov[mask_needs_lookup], source=source)
+        lk = lk[lk.notna()]
+        out.loc[lk.index] = lk
 
     return out
 
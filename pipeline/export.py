@@ -1,7 +1,13 @@
 from __future__ import annotations
+from functools import partial
+from typing import Callable, Mapping
 import pandas as pd
 from core.utils import sanitize_sheet_name
 from .enrich import enrich_raw_sources
+from .xlsx_parallel import ParallelWorkbook
+from .xlsx_stream import DEFAULT_CHUNK_ROWS, EXCEL_MAX_ROWS, StreamingSheetWriter, split_ranges
+
+GP_FORMULA_HEADER = "Grupo de Pago (XL)"
 
 
 def apply_headers_and_order(df: pd.DataFrame, export_cfg: dict) -> pd.DataFrame:
@@ -20,7 +26,7 @@ def write_excel_with_raw(
     out_path: str,
     consolidated_df: pd.DataFrame,
     export_cfg: dict,
-    raw_sources: dict[str, pd.DataFrame] | None = None,
+    raw_sources: Mapping[str, pd.DataFrame] | None = None,
     exec_mon: pd.Timestamp | None = None,
     tipo_map: pd.Series | None = None,
 ):
@@ -43,11 +49,8 @@ def write_excel_with_raw(
     )
     # Enriquecer RAW solo si la configuración lo permite (VE sí; CO no)
     enrich_flag = bool((export_cfg or {}).get("enrich_raw_sources", True))
-    enriched = (
-        enrich_raw_sources(raw_sources, exec_mon, tipo_map=tipo_map)
-        if (write_raw and exec_mon is not None and enrich_flag)
-        else (raw_sources or {})
-    )
+    do_enrich = write_raw and exec_mon is not None and enrich_flag
+    prov_index = (export_cfg or {}).get("__proveedor_index")
 
     used: set[str] = set()
 
@@ -71,96 +74,144 @@ def write_excel_with_raw(
     add_gp_formula = (export_cfg or {}).get("add_grupo_pago_formula_xl")
     if add_gp_formula is None:
         add_gp_formula = write_raw and ("__tipo_map" in (export_cfg or {}))
-    engine = "xlsxwriter" if (write_raw and add_gp_formula) else "openpyxl"
-
-    with pd.ExcelWriter(out_path, engine=engine) as xw:
-        df_cons.to_excel(xw, index=False, sheet_name=s_cons)
+    # Escritor: pandas (to_excel, hoja completa en memoria) | stream (xlsxwriter constant_memory)
+    #           | parallel (cada hoja en un proceso aparte, el zip se arma al final)
+    writer_cfg = (export_cfg or {}).get("writer") or {}
+    mode = str(writer_cfg.get("mode") or "pandas").lower()
+    parallel = mode == "parallel"
+    stream = mode == "stream"
+    max_rows = int(writer_cfg.get("max_rows") or EXCEL_MAX_ROWS)
+    engine = "xlsxwriter" if (stream or (write_raw and add_gp_formula)) else "openpyxl"
+    s_aux = uniq("AUX") if (write_raw and add_gp_formula) else None
+    # Hojas de reporte: al final, después de las del libro histórico (Consolidado, crudos, AUX)
+    rec_report = (export_cfg or {}).get("__reconciliation")
+    s_rec = uniq(sheets.get("reconciliation", "Conciliacion")) if rec_report is not None else None
+    quarantine = (export_cfg or {}).get("__quarantine")
+    s_quar = uniq(sheets.get("quarantine", "Cuarentena")) if (quarantine is not None and not quarantine.empty) else None
+    terms = (export_cfg or {}).get("__payment_terms")
+    s_terms = uniq(sheets.get("payment_terms", "Terminos sin dias")) if (terms is not None and not terms.empty) else None
+
+    chunk_rows = int(writer_cfg.get("chunk_rows") or DEFAULT_CHUNK_ROWS)
+    if parallel:
+        book = ParallelWorkbook(out_path, writer_cfg.get("workers"), chunk_rows)
+    elif stream:
+        import xlsxwriter
+        book = xlsxwriter.Workbook(out_path, {"constant_memory": True})
+        sw = StreamingSheetWriter(book, chunk_rows)
+    else:
+        book = pd.ExcelWriter(out_path, engine=engine)
+
+    def put(sheet: str, df: pd.DataFrame, formula=None) -> None:
+        """Escribe df en `sheet`; si excede el límite de filas de Excel sigue en hojas sufijadas (uniq)."""
+        ncols = df.shape[1]
+        for k, (a, b) in enumerate(split_ranges(len(df), max_rows)):
+            name = sheet if k == 0 else uniq(sheet)
+            if parallel:
+                book.add(name, df.iloc[a:b], extra=(GP_FORMULA_HEADER, formula) if formula else None)
+                continue
+            if stream:
+                sw.write(name, df, a, b, extra=(GP_FORMULA_HEADER, formula) if formula else None)
+                continue
+            df.iloc[a:b].to_excel(book, index=False, sheet_name=name)
+            if formula:
+                ws = book.sheets[name]
+                ws.write(0, ncols, GP_FORMULA_HEADER)
+                for i in range(b - a):
+                    ws.write_formula(i + 1, ncols, formula(i + 2))
+
+    try:
+        put(s_cons, df_cons)
         if write_raw:
-            to_write = dict(enriched)
-            # Colombia: filtrar RSF a 'Recepción sin factura'
-            if (export_cfg or {}).get("__pais") == "CO" and to_write.get("RSF") is not None:
-                df = to_write["RSF"].copy()
-                col_est = None
-                for c in ["Estatus", "ESTATUS"]:
-                    if c in df.columns:
-                        col_est = c; break
-                if col_est:
-                    s = df[col_est].astype("string")
-                    # normalizar mínimamente tildes comunes
-                    for a, b in [("Ó","O"),("Á","A"),("É","E"),("Í","I"),("Ú","U"),("Ñ","N")]:
-                        s = s.str.replace(a, b, regex=False)
-                    mask = s.str.upper().eq("RECEPCION SIN FACTURA")
-                    to_write["RSF"] = df.loc[mask].copy()
-            if "EBS" in to_write and to_write["EBS"] is not None:
-                to_write["EBS"].to_excel(xw, index=False, sheet_name=s_ebs)
-            if "REIM" in to_write and to_write["REIM"] is not None:
-                to_write["REIM"].to_excel(xw, index=False, sheet_name=s_reim)
-            if "RSF" in to_write and to_write["RSF"] is not None:
-                to_write["RSF"].to_excel(xw, index=False, sheet_name=s_rsf)
-
-        if write_raw and add_gp_formula and engine == "xlsxwriter":
+            # Una hoja cruda a la vez: se materializa, enriquece, escribe y se suelta
+            for key, sheet in (("EBS", s_ebs), ("REIM", s_reim), ("RSF", s_rsf)):
+                df = raw_sources.get(key)
+                if df is None:
+                    continue
+                if do_enrich:
+                    df = enrich_raw_sources({key: df}, exec_mon, tipo_map=tipo_map, index=prov_index)[key]
+                # Colombia: filtrar RSF a 'Recepción sin factura'
+                if key == "RSF" and (export_cfg or {}).get("__pais") == "CO":
+                    df = _filter_recepcion_sin_factura(df)
+                formula = _grupo_pago_formula(df, s_aux) if (s_aux is not None and key in ("REIM", "RSF")) else None
+                put(sheet, df, formula)
+                del df
+
+        if s_aux is not None:
             # Create AUX sheet from mini-master if present
-            s_aux = uniq("AUX")
             try:
                 tm = (export_cfg or {}).get("__tipo_map")
                 if tm is not None and not getattr(tm, "empty", True):
                     aux_df = pd.DataFrame({"Proveedor": tm.index.astype("string"), "TIPO": tm.astype("string").values})
-                    aux_df.to_excel(xw, index=False, sheet_name=s_aux)
+                    put(s_aux, aux_df)
             except Exception:
                 pass
 
-            def col_to_letter(cidx: int) -> str:
-                s = ""
-                c = cidx
-                while True:
-                    c, r = divmod(c, 26)
-                    s = chr(65 + r) + s
-                    if c == 0:
-                        break
-                    c -= 1
-                return s
-
-            def add_formula(sheet_name: str, df: pd.DataFrame):
-                if df is None or df.empty:
-                    return
-                ws = xw.sheets.get(sheet_name)
-                if ws is None:
-                    return
-                cols = list(df.columns)
-                if "Tienda" not in cols:
-                    return
-                suc_name = (
-                    "Sucursal Proveedor" if "Sucursal Proveedor" in cols else ("Sucursal" if "Sucursal" in cols else None)
-                )
-                if suc_name is None:
-                    return
-                tienda_idx = cols.index("Tienda")
-                suc_idx = cols.index(suc_name)
-                prov_idx = cols.index("Proveedor") if "Proveedor" in cols else None
-                nrows = len(df)
-                gp_col_idx = len(cols)
-                ws.write(0, gp_col_idx, "Grupo de Pago (XL)")
-                t_col = col_to_letter(tienda_idx)
-                s_col = col_to_letter(suc_idx)
-                aux_range = f"'{s_aux}'!$A:$B"
-                for i in range(nrows):
-                    row = i + 2
-                    t_cell = f"${t_col}{row}"
-                    s_cell = f"${s_col}{row}"
-                    if prov_idx is not None:
-                        p_col = col_to_letter(prov_idx)
-                        p_cell = f"${p_col}{row}"
-                        vlookup = (
-                            f"IFERROR(VLOOKUP({s_cell},{aux_range},2,FALSE),IFERROR(VLOOKUP({p_cell},{aux_range},2,FALSE),\"NO DEFINIDO\"))"
-                        )
-                    else:
-                        vlookup = f"IFERROR(VLOOKUP({s_cell},{aux_range},2,FALSE),\"NO DEFINIDO\")"
-                    formula = (
-                        f"=IF({t_cell}<>\"CENDIS\",\"DIRECTO\",IF(OR(RIGHT({s_cell},3)=\"PPV\",RIGHT({s_cell},4)=\"PPV1\",RIGHT({s_cell},4)=\"PPV2\",RIGHT({s_cell},4)=\"PPV3\"),\"PPV RMS\",{vlookup}))"
-                    )
-                    ws.write_formula(i + 1, gp_col_idx, formula)
-
-            if s_reim in xw.sheets:
-                add_formula(s_reim, enriched.get("REIM"))
-            if s_rsf in xw.sheets:
-                add_formula(s_rsf, enriched.get("RSF"))
+        if s_rec is not None:
+            put(s_rec, rec_report)
+        if s_quar is not None:
+            put(s_quar, quarantine)
+        if s_terms is not None:
+            put(s_terms, terms)
+    finally:
+        book.close()
+
+
+def _col_to_letter(cidx: int) -> str:
+    s = ""
+    c = cidx
+    while True:
+        c, r = divmod(c, 26)
+        s = chr(65 + r) + s
+        if c == 0:
+            break
+        c -= 1
+    return s
+
+
+def _grupo_pago_formula(df: pd.DataFrame, aux_sheet: str) -> Callable[[int], str] | None:
+    """Fórmula 'Grupo de Pago (XL)' por fila de Excel (Tienda/Sucursal + VLOOKUP al AUX); None si no aplica."""
+    if df is None or df.empty:
+        return None
+    cols = list(df.columns)
+    if "Tienda" not in cols:
+        return None
+    suc_name = (
+        "Sucursal Proveedor" if "Sucursal Proveedor" in cols else ("Sucursal" if "Sucursal" in cols else None)
+    )
+    if suc_name is None:
+        return None
+    t_col = _col_to_letter(cols.index("Tienda"))
+    s_col = _col_to_letter(cols.index(suc_name))
+    p_col = _col_to_letter(cols.index("Proveedor")) if "Proveedor" in cols else None
+    aux_range = f"'{aux_sheet}'!$A:$B"
+    # partial de una función de módulo (no un closure): se puede mandar a los workers del export paralelo
+    return partial(_grupo_pago_formula_row, t_col, s_col, p_col, aux_range)
+
+
+def _grupo_pago_formula_row(t_col: str, s_col: str, p_col: str | None, aux_range: str, row: int) -> str:
+    t_cell = f"${t_col}{row}"
+    s_cell = f"${s_col}{row}"
+    if p_col is not None:
+        p_cell = f"${p_col}{row}"
+        vlookup = (
+            f"IFERROR(VLOOKUP({s_cell},{aux_range},2,FALSE),IFERROR(VLOOKUP({p_cell},{aux_range},2,FALSE),\"NO DEFINIDO\"))"
+        )
+    else:
+        vlookup = f"IFERROR(VLOOKUP({s_cell},{aux_range},2,FALSE),\"NO DEFINIDO\")"
+    return (
+        f"=IF({t_cell}<>\"CENDIS\",\"DIRECTO\",IF(OR(RIGHT({s_cell},3)=\"PPV\",RIGHT({s_cell},4)=\"PPV1\",RIGHT({s_cell},4)=\"PPV2\",RIGHT({s_cell},4)=\"PPV3\"),\"PPV RMS\",{vlookup}))"
+    )
+
+def _filter_recepcion_sin_factura(df: pd.DataFrame) -> pd.DataFrame:
+    col_est = None
+    for c in ["Estatus", "ESTATUS"]:
+        if c in df.columns:
+            col_est = c; break
+    if not col_est:
+        return df
+    s = df[col_est].astype("string")
+    # normalizar mínimamente tildes comunes
+    for a, b in [("Ó","O"),("Á","A"),("É","E"),("Í","I"),("Ú","U"),("Ñ","N")]:
+        s = s.str.replace(a, b, regex=False)
+    mask = s.str.upper().eq("RECEPCION SIN FACTURA")
+    return df.loc[mask].copy()
@@ -1,10 +1,21 @@
 from __future__ import annotations
 import pandas as pd
-from typing import Any, Dict
-from core.dtypes import to_datetime_smart, apply_text_normalize, apply_value_maps, cast_dtypes, apply_filters
+from typing import Any, Dict, Mapping
+from core.utils import header_matcher, match_headers
+from core.numeric_format import NumericFormatTable
+from core.dtypes import keep_native, to_datetime_smart, apply_text_normalize, apply_value_maps, cast_dtypes, apply_filters
 
-def normalize_source(df_raw: pd.DataFrame, src: str, cfg: Dict[str, Any], schema: Dict[str, Any]) -> pd.DataFrame:
-    maps        = cfg["column_maps"][src]
+def normalize_source(df_raw: pd.DataFrame, src: str, cfg: Dict[str, Any], schema: Dict[str, Any],
+                     headers: Mapping[str, str] | None = None, numbers: NumericFormatTable | None = None) -> pd.DataFrame:
+    """
+    Renombra a columnas estándar y aplica constantes, fechas, normalizaciones, tipado y filtros.
+    `headers` es el matcher compilado del plan; si no se pasa se arma desde column_maps.
+    El match de encabezados es insensible a tildes/mayúsculas/espacios.
+    `numbers` es la tabla de formatos numéricos por fuente/columna de la corrida (sin ella
+    el formato se detecta y no se recuerda).
+    """
+    numbers     = numbers if numbers is not None else NumericFormatTable({"cache": {"enabled": False}})
+    headers     = headers if headers is not None else header_matcher(cfg["column_maps"][src])
     consts      = (cfg.get("const") or {})
     date_formats= cfg.get("date_formats", {})
     text_norm   = cfg.get("text_normalize", {})
@@ -12,7 +23,7 @@ def normalize_source(df_raw: pd.DataFrame, src: str, cfg: Dict[str, Any], schema
     filters     = (cfg.get("filters", {}) or {}).get(src, [])
     dtypes      = schema["dtypes"]
 
-    rename_dict = {k: v for k, v in maps.items() if k in df_raw.columns}
+    rename_dict = match_headers(df_raw.columns, headers)
     df = df_raw.rename(columns=rename_dict).copy()
 
     for k, v in consts.items(): df[k] = v
@@ -20,15 +31,21 @@ def normalize_source(df_raw: pd.DataFrame, src: str, cfg: Dict[str, Any], schema
 
     if "fecha" in df.columns:
         fmt = date_formats.get(src)
-        df["fecha"] = pd.to_datetime(df["fecha"], format=fmt, errors="coerce") if fmt else pd.to_datetime(df["fecha"], errors="coerce", dayfirst=True)
+        parse = (lambda s: pd.to_datetime(s, format=fmt, errors="coerce")) if fmt else (lambda s: pd.to_datetime(s, errors="coerce", dayfirst=True))
+        df["fecha"] = keep_native(df["fecha"], "datetime", parse)
 
     for c in ("fecha_creacion","fecha_vencimiento","fecha_recepcion"):
         if c in df.columns:
             df[c] = to_datetime_smart(df[c])
 
+    # Montos/días: una pasada con el formato (decimal, miles, moneda) de esta fuente/columna
+    for c in ("monto_neto","monto_bruto","dias_condicion_rms"):
+        if c in df.columns:
+            df[c] = keep_native(df[c], "number", lambda s, c=c: numbers.parse(src, c, s))
+
     # tipado + normalizaciones
     df = apply_text_normalize(df, text_norm)
     df = apply_value_maps(df, value_maps)
-    df = cast_dtypes(df, dtypes)
+    df = cast_dtypes(df, dtypes, numbers=numbers, source=src)
     df = apply_filters(df, filters)
     return df
@@ -1,12 +1,83 @@
 from __future__ import annotations
-from typing import Any, Dict
+import dis
+from types import CodeType
+from typing import Any, Dict, Sequence, Set
 import pandas as pd
 from core.dtypes import to_dt
+from core.payment_terms import payment_term_days
 
 def apply_post(df: pd.DataFrame, post_cfg: Dict[str, Any], context: Dict[str, Any] | None = None) -> pd.DataFrame:
     if not post_cfg: return df
-    env = {"pd": pd, "to_dt": to_dt}
+    # term_days: días de un término de pago por fila (el runner pasa la versión con tabla persistente)
+    env = {"pd": pd, "to_dt": to_dt, "term_days": payment_term_days}
     if context: env.update(context)
     for stmt in post_cfg.get("compute", []):
         exec(stmt, env, {"df": df})
     return df
+
+
+# Operaciones que se sabe que son fila a fila: cada fila del resultado depende solo de la
+# misma fila de entrada. filter_point solo adelanta un filtro sobre pasos que usan únicamente
+# estos nombres (globales) y atributos/métodos; cualquier otro (ffill, quantile, nlargest,
+# apply, len, range, ...) deja el filtro al final. term_days no está: su reporte de términos
+# sin días cuenta las filas que recibe.
+ROW_WISE_NAMES = frozenset({
+    "df", "pd", "to_dt", "exec_mon", "float", "int", "str", "bool", "abs", "round", "isinstance",
+})
+ROW_WISE_ATTRS = frozenset({
+    # DataFrame / Series
+    "get", "loc", "index", "columns", "astype", "eq", "ne", "lt", "le", "gt", "ge", "isin", "isna", "notna",
+    "isnull", "notnull", "fillna", "where", "mask", "abs", "round", "clip", "between", "combine_first", "map",
+    "add", "sub", "mul", "div", "values",
+    # pandas
+    "to_numeric", "to_datetime", "to_timedelta", "Timedelta", "Timestamp", "DateOffset", "Series", "NA", "NaT",
+    # .str / .dt
+    "str", "dt", "strip", "lstrip", "rstrip", "upper", "lower", "title", "replace", "contains", "startswith",
+    "endswith", "extract", "slice", "zfill", "len", "normalize", "floor", "ceil", "weekday", "dayofweek", "day",
+    "month", "year", "date", "days",
+})
+# fillna(method=...) mira la fila anterior/siguiente
+_FILL_METHODS = frozenset({"ffill", "bfill", "pad", "backfill"})
+
+
+def _row_wise(code: CodeType) -> bool:
+    """Si un paso compilado usa solo operaciones de ROW_WISE_NAMES / ROW_WISE_ATTRS (y sus variables locales)."""
+    stored, names, attrs = set(), set(), set()
+    for ins in dis.get_instructions(code):
+        op = ins.opname
+        if op in ("STORE_NAME", "DELETE_NAME"):
+            stored.add(ins.argval)
+        elif op in ("LOAD_NAME", "LOAD_GLOBAL"):
+            names.add(ins.argval)
+        elif op in ("LOAD_ATTR", "LOAD_METHOD", "STORE_ATTR", "DELETE_ATTR"):
+            attrs.add(ins.argval)
+        elif op.startswith("IMPORT") or op == "BUILD_SLICE":
+            return False
+        elif op == "LOAD_CONST" and isinstance(ins.argval, CodeType) and not _row_wise(ins.argval):
+            return False
+        elif op == "LOAD_CONST" and isinstance(ins.argval, str) and ins.argval in _FILL_METHODS:
+            return False
+    return (names - stored) <= ROW_WISE_NAMES and attrs <= ROW_WISE_ATTRS
+
+
+def code_refs(code: CodeType) -> Set[str]:
+    """Nombres y constantes de texto de un paso compilado (incluye lambdas y comprensiones)."""
+    out = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, str):
+            out.add(c)
+        elif isinstance(c, CodeType):
+            out |= code_refs(c)
+    return out
+
+
+def filter_point(compute: Sequence[CodeType], column: str) -> int:
+    """
+    Primer i tal que, tras compute[:i], `column` ya no cambia y compute[i:] es fila a fila
+    (ver ROW_WISE_ATTRS): filtrar filas por `column` en ese punto da el mismo resultado que
+    filtrar al final. Ante la duda retorna len(compute) (filtrar al final).
+    """
+    i = len(compute)
+    while i > 0 and column not in code_refs(compute[i - 1]) and _row_wise(compute[i - 1]):
+        i -= 1
+    return i
@@ -0,0 +1,119 @@
+"""
+Vista previa para iterar la configuración del país (column_maps, filtros, post) sin una
+corrida completa: cada fuente se lee como una muestra acotada y el pipeline corre entero
+sobre ella, sin checkpoints y sin escribir el libro. Uso:
+  python -m pipeline.preview --country venezuela --ebs ebs.xlsx --reim reim.xlsx --rsf rsf.csv [--rows 2000] [--profile]
+  (cada fuente acepta varios archivos o globs: --ebs EBS_UO1.xlsx EBS_UO2.xlsx | --reim "REIM_2025-*.xlsx")
+"""
+from __future__ import annotations
+import argparse
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List, Tuple
+import pandas as pd
+
+from core.inputs import InputRef
+from core.plan import PipelinePlan, compile_plan, thaw
+from core.profiling import SamplingProfiler, profile_labels, profile_path, top_lines
+from pipeline.runners import run_mercancia
+
+DEFAULT_PREVIEW_CFG = {
+    "rows": 2000,          # filas por fuente
+    "seed": 7,             # semilla del reservoir (CSV / full_scan)
+    "full_scan": False,    # xlsx stream: recorrer todo el archivo con reservoir en vez de las primeras filas
+    "strata": {},          # fuente -> encabezado crudo para estratificar la muestra
+    "head": 20,            # filas del consolidado que se muestran
+}
+DEFAULT_CONFIGS = {"colombia": "./schema/colombia.yaml", "venezuela": "./schema/venezuela.yaml"}
+
+
+def preview_config(plan: PipelinePlan, rows: int | None = None) -> Dict[str, Any]:
+    """mercancia.preview del país sobre los valores por defecto (rows del llamador si se indica)."""
+    cfg = {**DEFAULT_PREVIEW_CFG, **thaw(plan.cfg.get("preview") or {})}
+    if rows:
+        cfg["rows"] = int(rows)
+    if int(cfg["rows"]) < 1:
+        raise ValueError(f"preview.rows debe ser >= 1 (valor: {cfg['rows']!r})")
+    return cfg
+
+
+def preview_mercancia(
+    schema_path: str,
+    country_path: str,
+    ebs_path: InputRef,
+    reim_path: InputRef,
+    rsf_path: InputRef,
+    exec_date: pd.Timestamp | None = None,
+    rows: int | None = None,
+    plan: PipelinePlan | None = None,
+) -> Tuple[pd.DataFrame, dict]:
+    """
+    Corre el pipeline sobre una muestra de cada fuente. Retorna (consolidado, export_cfg);
+    export_cfg["__preview"] trae la configuración de la muestra y los segundos totales.
+    """
+    if plan is None:
+        plan = compile_plan(schema_path, country_path)
+    cfg = preview_config(plan, rows)
+    t0 = time.perf_counter()
+    df, raws, export_cfg = run_mercancia(schema_path, country_path, ebs_path, reim_path, rsf_path,
+                                         exec_date=exec_date, plan=plan, checkpoints=False, sample=cfg)
+    raws.close()
+    export_cfg["__preview"] = {**cfg, "segundos": time.perf_counter() - t0}
+    return df, export_cfg
+
+
+def preview_lines(df: pd.DataFrame, export_cfg: dict, head: int | None = None) -> List[str]:
+    """Resumen de la vista previa en texto: filas por etapa, lookups, validación y cabeza del consolidado."""
+    pv = export_cfg.get("__preview") or {}
+    head = int(head or pv.get("head") or DEFAULT_PREVIEW_CFG["head"])
+    lines = [f"Vista previa: hasta {int(pv.get('rows', 0)):,} filas por fuente, {pv.get('segundos', 0):.1f}s (sin exportar)"]
+
+    rows = export_cfg.get("__stage_rows")
+    if rows is not None and not rows.empty:
+        lines.append("Filas por etapa: " + " → ".join(f"{r.etapa} {int(r.filas):,}" for r in rows.itertuples(index=False)))
+
+    stats = export_cfg.get("__lookup_stats")
+    if stats is not None and not stats.empty:
+        for r in stats.itertuples(index=False):
+            fz = f", {r.aproximados:,} aproximados" if r.aproximados else ""
+            lines.append(f"Lookup {r.lookup} [{r.fuente}]: {r.con_match:,}/{r.filas:,} con match ({r.tasa:.1%}{fz})")
+
+    val = export_cfg.get("__validation")
+    if val is not None and not val.empty:
+        for r in val[val["estado"] != "OK"].itertuples(index=False):
+            lines.append(f"Validación {r.fuente} [{r.chequeo}] {r.columna}: {r.valor}")
+
+    lines.append(f"Consolidado: {len(df):,} filas; primeras {min(head, len(df))}:")
+    shown = df.head(head).rename(columns=dict(export_cfg.get("headers") or {}))
+    lines.extend(shown.to_string(index=False, max_colwidth=24).splitlines() if len(shown) else ["(vacío)"])
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Vista previa del consolidado de Mercancía sobre una muestra")
+    ap.add_argument("--country", default="colombia", choices=sorted(DEFAULT_CONFIGS))
+    ap.add_argument("--schema", default="./schema/schema.yaml")
+    ap.add_argument("--config", default=None, help="YAML del país (por defecto el del país elegido)")
+    ap.add_argument("--ebs", nargs="+", required=True, help="uno o más archivos / globs / carpeta")
+    ap.add_argument("--reim", nargs="+", required=True)
+    ap.add_argument("--rsf", nargs="+", required=True)
+    ap.add_argument("--rows", type=int, default=None, help="filas por fuente (por defecto preview.rows)")
+    ap.add_argument("--head", type=int, default=None)
+    ap.add_argument("--exec-date", default=None, help="yyyy-mm-dd (por defecto hoy)")
+    ap.add_argument("--profile", nargs="?", const=str(profile_path("preview")), default=None, metavar="ARCHIVO",
+                    help="perfil por muestreo de la corrida en pilas colapsadas (flame graph) + top de funciones")
+    a = ap.parse_args()
+
+    exec_date = pd.Timestamp(a.exec_date) if a.exec_date else None
+    config = a.config or DEFAULT_CONFIGS[a.country]
+    prof = SamplingProfiler(labels=profile_labels(compile_plan(a.schema, config))) if a.profile else None
+    with (nullcontext() if prof is None else prof):
+        df, export_cfg = preview_mercancia(a.schema, config, a.ebs, a.reim, a.rsf, exec_date=exec_date, rows=a.rows)
+    print("\n".join(preview_lines(df, export_cfg, head=a.head)))
+    if prof is not None:
+        print("\n".join(top_lines(prof)))
+        print(f"Flame graph: {prof.write_folded(a.profile)}")
+
+
+if __name__ == "__main__":
+    main()
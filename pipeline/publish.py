@@ -0,0 +1,178 @@
+"""
+Publicación del consolidado y de los crudos por Arrow Flight local (export.publish).
+
+Tras cada corrida el consolidado (con los dtypes del schema.yaml: la metadata pandas de la
+tabla Arrow los restaura en to_pandas) y, si publish.raw, las fuentes crudas quedan
+disponibles en un servidor Flight del proceso, sin archivo intermedio. Los crudos retenidos
+en Arrow (export.raw_store) se publican sin copiar sus buffers.
+
+Tickets (la última corrida de cada país y, además, por lunes de ejecución):
+  <PAIS>/consolidado          <PAIS>/<yyyy-mm-dd>/consolidado
+  <PAIS>/raw/EBS | REIM | RSF <PAIS>/<yyyy-mm-dd>/raw/EBS ...
+Cada corrida reemplaza las tablas de su país y semana; por país se conservan solo las
+últimas publish.history semanas (las tablas viven en memoria mientras dure el proceso).
+Los crudos en spill (archivos que RawStore.close borra) se copian a memoria al publicarse.
+
+Consumidor:
+  import pyarrow.flight as fl
+  client = fl.connect("grpc://127.0.0.1:8815")
+  [f.descriptor.path for f in client.list_flights()]
+  df = client.do_get(fl.Ticket(b"VE/consolidado")).read_pandas()
+"""
+from __future__ import annotations
+import importlib.util
+import threading
+from typing import Any, Dict, List, Mapping, Tuple
+import pandas as pd
+
+from core.rawstore import RawStore
+
+DEFAULT_PUBLISH_CFG = {"enabled": False, "host": "127.0.0.1", "port": 8815, "raw": True, "history": 1}
+
+
+class PublishError(RuntimeError):
+    """No se puede publicar (pyarrow.flight no instalado)."""
+
+
+def flight_available() -> bool:
+    try:
+        return importlib.util.find_spec("pyarrow.flight") is not None
+    except ImportError:
+        return False
+
+
+def _server_class():
+    import pyarrow.flight as fl
+
+    class FrameServer(fl.FlightServerBase):
+        """Servidor Flight de solo lectura sobre las tablas publicadas (ticket = llave)."""
+
+        def __init__(self, location: str, tables: Dict[str, Any], lock: threading.Lock):
+            super().__init__(location)
+            self._tables = tables
+            self._lock = lock
+
+        def _table(self, key: str):
+            with self._lock:
+                table = self._tables.get(key)
+            if table is None:
+                raise fl.FlightServerError(f"No hay nada publicado como {key!r}")
+            return table
+
+        def _info(self, key: str, table):
+            desc = fl.FlightDescriptor.for_path(*key.split("/"))
+            endpoint = fl.FlightEndpoint(key.encode("utf-8"), [])
+            return fl.FlightInfo(table.schema, desc, [endpoint], table.num_rows, table.nbytes)
+
+        def list_flights(self, context, criteria):
+            with self._lock:
+                items = list(self._tables.items())
+            for key, table in items:
+                yield self._info(key, table)
+
+        def get_flight_info(self, context, descriptor):
+            key = "/".join(p.decode("utf-8") if isinstance(p, bytes) else p for p in descriptor.path)
+            return self._info(key, self._table(key))
+
+        def do_get(self, context, ticket):
+            return fl.RecordBatchStream(self._table(ticket.ticket.decode("utf-8")))
+
+    return FrameServer
+
+
+class ArrowPublisher:
+    """Tablas publicadas por un servidor Flight local (uno por host/puerto en el proceso)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8815):
+        if not flight_available():
+            raise PublishError("export.publish requiere pyarrow con Flight (pyarrow.flight).")
+        self._tables: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._server = _server_class()(f"grpc://{host}:{int(port)}", self._tables, self._lock)
+        self.location = f"grpc://{host}:{self._server.port}"
+
+    def publish(self, key: str, table) -> None:
+        with self._lock:
+            self._tables[key] = table
+
+    def replace(self, prefixes: List[str], tables: Mapping[str, Any], drop: List[str] | None = None) -> None:
+        """
+        Quita las llaves bajo cada prefijo de `prefixes` y de `drop` y publica `tables`, todo en
+        un paso: un consumidor no ve una corrida a medias ni tablas viejas de la misma semana.
+        """
+        gone = tuple(prefixes) + tuple(drop or ())
+        with self._lock:
+            for key in [k for k in self._tables if k.startswith(gone)]:
+                del self._tables[key]
+            self._tables.update(tables)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return sorted(self._tables)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        with self._lock:
+            self._tables.clear()
+
+
+_PUBLISHERS: Dict[Tuple[str, int], ArrowPublisher] = {}
+_PUBLISHERS_LOCK = threading.Lock()
+
+
+def get_publisher(cfg: Mapping[str, Any] | None = None) -> ArrowPublisher:
+    """Publicador del proceso para (host, port); se crea (y empieza a escuchar) en el primer uso."""
+    c = {**DEFAULT_PUBLISH_CFG, **dict(cfg or {})}
+    key = (str(c["host"]), int(c["port"]))
+    with _PUBLISHERS_LOCK:
+        pub = _PUBLISHERS.get(key)
+        if pub is None:
+            pub = _PUBLISHERS[key] = ArrowPublisher(*key)
+        return pub
+
+
+def frame_table(df: pd.DataFrame):
+    """Tabla Arrow del consolidado con la metadata pandas (dtypes del schema) para to_pandas."""
+    import pyarrow as pa
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def publish_run(export_cfg: Mapping[str, Any], df: pd.DataFrame, raw_sources: Mapping[str, pd.DataFrame] | None,
+                exec_mon: pd.Timestamp) -> Tuple[str, List[str]] | None:
+    """
+    Publica el consolidado (y los crudos si publish.raw) de una corrida según export.publish.
+    Retorna (ubicación, tickets) o None si la publicación no está habilitada.
+    """
+    cfg = {**DEFAULT_PUBLISH_CFG, **dict(export_cfg.get("publish") or {})}
+    if not cfg.get("enabled"):
+        return None
+    pub = get_publisher(cfg)
+    pais = export_cfg.get("__pais") or "NA"
+    week = pd.Timestamp(exec_mon).date().isoformat()
+    tables = {"consolidado": frame_table(df)}
+    if cfg.get("raw") and raw_sources is not None:
+        for name in raw_sources:
+            if isinstance(raw_sources, RawStore):
+                # Copia solo si la tabla está mapeada desde un archivo de spill
+                table = raw_sources.arrow_table(name, detach=True)
+            else:
+                raw = raw_sources.get(name)
+                table = None if raw is None else frame_table(raw.rename(columns=str))
+            if table is not None:
+                tables[f"raw/{name}"] = table
+    out = {}
+    for name, table in tables.items():
+        out[f"{pais}/{name}"] = out[f"{pais}/{week}/{name}"] = table
+    # Semanas del país que ya no entran en publish.history (la de esta corrida se reemplaza)
+    history = max(1, int(cfg.get("history") or 1))
+    weeks = sorted({k.split("/")[1] for k in pub.keys() if k.startswith(f"{pais}/") and _is_week(k.split("/")[1])} - {week})
+    old_weeks = [f"{pais}/{w}/" for w in weeks[:max(0, len(weeks) - (history - 1))]]
+    pub.replace([f"{pais}/{week}/", f"{pais}/raw/"], out, drop=old_weeks)
+    return pub.location, list(out)
+
+
+def _is_week(part: str) -> bool:
+    try:
+        return pd.Timestamp(part).date().isoformat() == part
+    except (ValueError, TypeError):
+        return False
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import pandas as pd
+
+from core.partition import SourcePartition
+
+REPORT_COLS = ["factura", "orden_compra", "proveedor", "monto_neto", "monto_bruto"]
+
+
+def _norm_text(s: pd.Series) -> pd.Series:
+    """Normalización de llaves de documento: NBSP/invisibles fuera, sin espacios, mayúsculas."""
+    s = (s.astype("string")
+          .str.replace("\u00A0", " ", regex=False)
+          .str.replace("[\u200B\u200C\u200D\uFEFF]", "", regex=True)
+          .str.replace(r"\s+", "", regex=True)
+          .str.upper())
+    return s.mask(s.str.len().eq(0).fillna(False))
+
+
+def _column_codes(values: pd.Series, canon: Callable[[pd.Series], pd.Series]) -> np.ndarray:
+    """Código entero por fila de la llave normalizada (-1 = vacío). Normaliza solo valores distintos."""
+    codes, uniques = pd.factorize(values)
+    if len(uniques) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    ucodes, _ = pd.factorize(canon(pd.Series(uniques)))
+    return np.where(codes >= 0, ucodes[codes], -1).astype(np.int64)
+
+
+def _key_codes(df: pd.DataFrame, cols: List[str], cache: Dict[str, np.ndarray],
+               canon_prov: Callable[[pd.Series], pd.Series] | None) -> np.ndarray | None:
+    """Código entero de la llave compuesta `cols` (-1 si algún componente está vacío)."""
+    out = None
+    for c in cols:
+        if c not in df.columns:
+            return None
+        if c not in cache:
+            canon = canon_prov if (c == "proveedor" and canon_prov is not None) else _norm_text
+            cache[c] = _column_codes(df[c], canon)
+        cc = cache[c]
+        if out is None:
+            out = cc.copy()
+            continue
+        valid = (out >= 0) & (cc >= 0)
+        comb = np.where(valid, out * (int(cc.max()) + 1) + cc, 0)
+        out, _ = pd.factorize(pd.arrays.IntegerArray(comb, ~valid))
+        out = out.astype(np.int64)
+    return out
+
+
+def _first_match(probe: np.ndarray, build: np.ndarray, build_pos: np.ndarray) -> np.ndarray:
+    """Hash join: para cada llave de `probe`, posición de la primera fila de `build` con esa llave (-1 si no hay)."""
+    ok = build >= 0
+    first = pd.Series(build_pos[ok], index=build[ok])
+    first = first[~first.index.duplicated(keep="first")]
+    idx = first.index.get_indexer(probe)
+    return np.where((probe >= 0) & (idx >= 0), first.to_numpy()[np.maximum(idx, 0)], -1)
+
+
+def reconcile_sources(
+    base: pd.DataFrame,
+    rec_cfg: Dict[str, Any] | None,
+    canon_prov: Callable[[pd.Series], pd.Series] | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame | None]:
+    """
+    Conciliación entre fuentes del consolidado (EBS/REIM/RSF) según mercancia.reconciliation.
+
+    Cada regla es:
+      - cruzada: {name, left, right, keys: [...], action}: filas de `right` cuya llave ya existe en `left`
+      - intra:   {name, within: [...], keys: [...], action}: repetidas dentro de cada fuente (se conserva la primera)
+    action: flag (marca en `flag_column`) | drop (descarta las filas señaladas).
+
+    Las llaves se normalizan una vez por columna (factorize) y cada regla es un hash join
+    sobre códigos enteros: costo lineal en filas.
+
+    Retorna (base, reporte); reporte es None si la conciliación no está habilitada.
+    """
+    rc = rec_cfg or {}
+    if not rc.get("enabled") or base.empty:
+        return base, None
+
+    flag_col = rc.get("flag_column", "conciliacion")
+    sources = SourcePartition.of(base)
+    cache: Dict[str, np.ndarray] = {}
+
+    flags = np.full(len(base), "", dtype=object)
+    drop = np.zeros(len(base), dtype=bool)
+    found: List[Tuple[str, str, np.ndarray, np.ndarray]] = []
+
+    for rule in rc.get("rules") or []:
+        name = rule.get("name") or "REGLA"
+        action = (rule.get("action") or "flag").lower()
+        key = _key_codes(base, list(rule.get("keys") or []), cache, canon_prov)
+        if key is None:
+            continue
+
+        pairs = []
+        if rule.get("within"):
+            for src in rule["within"]:
+                pos = sources.positions(src)
+                if len(pos) == 0:
+                    continue
+                k = key[pos]
+                dup = pd.Series(k).duplicated(keep="first").to_numpy() & (k >= 0)
+                cp = _first_match(k[dup], k, pos)
+                pairs.append((pos[dup], cp))
+        else:
+            lpos = sources.positions(rule.get("left", ""))
+            rpos = sources.positions(rule.get("right", ""))
+            if len(lpos) and len(rpos):
+                cp = _first_match(key[rpos], key[lpos], lpos)
+                hit = cp >= 0
+                pairs.append((rpos[hit], cp[hit]))
+
+        for rows, cps in pairs:
+            if len(rows) == 0:
+                continue
+            flags[rows] = np.where(flags[rows] == "", name, flags[rows] + "; " + name)
+            if action == "drop":
+                drop[rows] = True
+            found.append((name, action, rows, cps))
+
+    # Reporte: fila señalada + contraparte
+    show = (["APP"] if "APP" in base.columns else []) + [c for c in REPORT_COLS if c in base.columns]
+    parts = []
+    for name, action, rows, cps in found:
+        left = base.iloc[rows][show].reset_index(drop=True)
+        right = base.iloc[cps][show].reset_index(drop=True)
+        right.columns = [f"{c}_contraparte" for c in right.columns]
+        part = pd.concat([left, right], axis=1)
+        part.insert(0, "accion", action)
+        part.insert(0, "regla", name)
+        parts.append(part)
+    report = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["regla", "accion"])
+
+    base = base.copy()
+    base[flag_col] = pd.Series(flags, index=base.index, dtype="string").replace("", pd.NA)
+    if drop.any():
+        base = base.loc[~drop].reset_index(drop=True)
+    return base, report
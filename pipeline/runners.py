@@ -1,52 +1,225 @@
 from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from typing import Any, Dict, Tuple
-
-from core.Lectura import load_yaml, read_source
+from typing import Any, Callable, Dict, List, Tuple
+
+from core.cache import JobCaches, file_digest
+from core.checkpoint import CheckpointStore, stage_key
+from core.http_fetch import MasterFetcher
+from core.inputs import InputRef, combine_source_files, read_workers, resolve_input_files
+from core.Lectura import apply_native, read_source, read_source_sample, read_source_typed
+from core.numeric_format import NumericFormatTable
+from core.partition import SourcePartition, source_column
+from core.payment_terms import PaymentTermTable
+from core.plan import SOURCES, PipelinePlan, compile_plan, thaw
+from core.rawstore import RawStore, pyarrow_available
+from core.timing import StageClock
+from pipeline.archive import RunArchive
 from pipeline.normalize import normalize_source
-from pipeline.post import apply_post
-from core.dtypes import cast_dtypes, to_dt
-from lookups.prioridad import load_priorities_from_config, apply_priority_lookup
-from lookups.factoring import load_factoring_from_config, apply_factoring_lookup
-from lookups.tipo import load_tipo_map_from_config
+from pipeline.polars_engine import filter_spec, keep_mask_pandas, keep_positions_polars, resolve_engine
+from pipeline.post import apply_post, filter_point
+from pipeline.reconcile import reconcile_sources
+from pipeline.validate import validate_source, combine_validations
+from core.dtypes import as_string_storage, cast_dtypes, resolve_string_storage, to_dt
+from lookups.proveedores import ProveedorIndex
+from lookups.masters import MasterPrefetch
+from lookups.prioridad import apply_priority_lookup
+from lookups.factoring import apply_factoring_lookup
+from lookups.tipo import register_tipo, apply_tipo_lookup
 from pipeline.enrich import grupo_pago_from_prioridad, grupo_pago_from_tienda_sucursal_o_proveedor
 
 
 def run_mercancia(
     schema_path: str,
     country_path: str,
-    ebs_path: str,
-    reim_path: str,
-    rsf_path: str,
+    ebs_path: InputRef,
+    reim_path: InputRef,
+    rsf_path: InputRef,
     exec_date: pd.Timestamp | None = None,
-) -> Tuple[pd.DataFrame, dict, dict]:
+    plan: PipelinePlan | None = None,
+    caches: JobCaches | None = None,
+    checkpoints: bool | None = None,
+    sample: Dict[str, Any] | None = None,
+) -> Tuple[pd.DataFrame, RawStore, dict]:
     """Runner unificado para Mercancía (CO/VE).
 
-    Retorna: (df_consolidado_estandar, raw_sources, export_cfg)
-    - export_cfg incluye headers/order del país y, si aplica, "__tipo_map".
-    """
-    country_all = load_yaml(country_path)
-    schema = load_yaml(schema_path)["mercancia"]
-    cfg = country_all["mercancia"]
+    La configuración sale del plan compilado (core.plan) para (schema, país); si no se
+    pasa uno se compila/recupera del cache por hash de contenido.
 
-    dtypes = schema["dtypes"]
-    inputs = cfg.get("inputs", {})
+    Es reentrante: no modifica el plan ni estado global, así que varias corridas pueden
+    ejecutarse a la vez (servicio local). Con `caches` (core.cache) los maestros y los
+    crudos ya parseados se reutilizan entre corridas.
 
-    # Leer crudos
-    ebs_df = read_source(Path(ebs_path), inputs.get("ebs", {}))
-    reim_df = read_source(Path(reim_path), inputs.get("reim", {}))
-    rsf_df = read_source(Path(rsf_path), inputs.get("rsf", {}))
-    raw_sources = {"EBS": ebs_df, "REIM": reim_df, "RSF": rsf_df}
+    Corre por etapas (STAGES: read → normalize → concat → lookups → post → calendar →
+    filters). Con checkpoints (mercancia.checkpoints.enabled, o `checkpoints` para forzarlo)
+    la salida de cada etapa queda en disco y una nueva corrida retoma desde la primera etapa
+    cuya llave cambió; export_cfg["__checkpoints"] indica cuáles se reutilizaron.
 
-    # Normalizar por fuente
-    ebs_n = normalize_source(ebs_df, "ebs", cfg, schema); ebs_n["APP"] = "EBS"
-    reim_n = normalize_source(reim_df, "reim", cfg, schema); reim_n["APP"] = "REIM"
-    rsf_n = normalize_source(rsf_df, "rsf", cfg, schema); rsf_n["APP"] = "RSF"
-    base = pd.concat([ebs_n, reim_n, rsf_n], ignore_index=True, sort=False)
+    Cada fuente puede venir en varios archivos (lista, glob, rutas separadas por ";" o una
+    carpeta filtrada por inputs.<src>.file_pattern): se leen en paralelo y se unen con
+    core.inputs.combine_source_files (encabezados alineados por column_maps, dedupe opcional
+    por inputs.<src>.dedupe y el archivo de cada fila en la columna archivo_origen del crudo).
+
+    Con `sample` (vista previa, ver pipeline.preview) cada fuente se lee como una muestra
+    acotada (core.Lectura.read_source_sample) y no se usan checkpoints ni el cache de crudos.
+
+    Retorna: (df_consolidado_estandar, raw_sources, export_cfg)
+    - raw_sources es un RawStore (mapping de solo lectura EBS/REIM/RSF, ver export.raw_store).
+    - export_cfg incluye headers/order del país y, si aplica, "__tipo_map".
+    """
+    if plan is None:
+        plan = compile_plan(schema_path, country_path)
+    # Texto de toda la corrida en Arrow (string[pyarrow]) o en objetos Python
+    storage = resolve_string_storage((plan.cfg.get("execution") or {}).get("string_storage"))
+    # La opción de pandas es global al proceso: solo se toca si difiere de la vigente
+    same = pd.get_option("mode.string_storage") == storage
+    with (nullcontext() if same else pd.option_context("mode.string_storage", storage)):
+        return _run_mercancia(plan, ebs_path, reim_path, rsf_path, exec_date, storage, caches, checkpoints, sample)
+
+
+@dataclass
+class _Run:
+    """Datos fijos de una corrida (lo que las etapas leen y no guardan en checkpoints)."""
+    plan: PipelinePlan
+    paths: Dict[str, List[Path]]    # ebs/reim/rsf -> archivos (core.inputs.resolve_input_files)
+    exec_mon: pd.Timestamp
+    storage: str
+    caches: JobCaches | None = None
+    sample: Dict[str, Any] | None = None   # vista previa: filas/semilla/estratos por fuente
+    http: MasterFetcher | None = None       # sesión HTTP de la corrida para los maestros
+    masters: MasterPrefetch | None = None   # maestros que se bajan mientras se leen las fuentes
+
+    @property
+    def typed(self) -> bool:
+        return self.sample is None and bool((self.plan.cfg.get("execution") or {}).get("typed_ingestion"))
+
+    @property
+    def hoist_filters(self) -> bool:
+        """execution.hoist_filters: filtro de montos dentro de post (opt-in, ver _stage_post)."""
+        return bool((self.plan.cfg.get("execution") or {}).get("hoist_filters"))
+
+    @property
+    def engine(self) -> str:
+        return resolve_engine((self.plan.cfg.get("execution") or {}).get("engine"))
+
+    @property
+    def fetch(self):
+        http = self.http.read_csv if self.http is not None else None
+        if self.caches is not None:
+            return lambda url: self.caches.fetch_master(url, loader=http)
+        return http
+
+    def prefetch(self) -> MasterPrefetch:
+        if self.masters is None:
+            self.masters = MasterPrefetch(self.plan.lookups, self.fetch)
+        return self.masters
+
+
+def _new_prov_index(plan: PipelinePlan) -> ProveedorIndex:
+    # Índice único de proveedores para conciliación y lookups de la corrida
+    # (copias mutables de la config: el índice se guarda en los checkpoints con pickle)
+    prov_index = ProveedorIndex(thaw(plan.lookups["proveedor_key"]))
+    prov_index.enable_fuzzy(thaw(plan.lookups["fuzzy"]))
+    return prov_index
+
+
+def _hoist_monto_filter(run: _Run, base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adelanta el filtro de montos del consolidado (ver _stage_filters) a cuando monto ya es
+    definitivo: los pasos siguientes de post y el calendario corren solo sobre las filas que
+    sobreviven y _stage_filters, que vuelve a aplicar todos los filtros, llega al mismo consolidado.
+    """
+    part = {"monto": True, "caja": None, "grupo_pago": None}
+    keep = keep_positions_polars(base, part) if run.engine == "polars" else np.flatnonzero(keep_mask_pandas(base, part))
+    if len(keep) == len(base):
+        return base
+    # El fallback de monto en _stage_filters se decide con "todo nulo": no adelantar si lo cambia
+    if "monto" in base.columns:
+        na = base["monto"].isna().to_numpy(dtype=bool)
+        if not na.all() and na[keep].all():
+            return base
+    return base.take(keep)
+
+
+def _read_file(run: _Run, src: str, path: Path, n_files: int) -> Tuple[pd.DataFrame, Dict[int, pd.Series]]:
+    """Un archivo de la fuente: (crudo, nativos), del cache de crudos si lo hay."""
+    sp = run.plan.sources[src]
+    # Ingesta tipada: fechas/números nativos de Excel se conservan aparte del crudo (texto)
+    kinds = sp.native if run.typed else None
+
+    def load():
+        if kinds:
+            df, overlay = read_source_typed(path, sp.read_opts, kinds)
+            return as_string_storage(df, run.storage), overlay
+        return as_string_storage(read_source(path, sp.read_opts), run.storage), {}
+
+    if run.sample is not None:
+        smp = run.sample
+        rows = -(-int(smp["rows"]) // n_files)   # la muestra se reparte entre los archivos
+        df = read_source_sample(path, sp.read_opts, rows, seed=smp.get("seed") or 0,
+                                strata=(smp.get("strata") or {}).get(src), full_scan=bool(smp.get("full_scan")))
+        return as_string_storage(df, run.storage), {}
+    variant = f"{run.storage}+typed" if kinds else run.storage
+    return run.caches.read_input(path, sp.read_opts, load, variant=variant) if run.caches is not None else load()
+
+
+def _stage_read(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Leer crudos y validar cada fuente apenas se lee (aborta antes de las etapas costosas)."""
+    cfg = run.plan.cfg
+    raw, native, ok, vals = {}, {}, {}, []
+    for src in SOURCES:
+        sp = run.plan.sources[src]
+        files = run.paths[src]
+        if len(files) == 1:
+            parts = [(files[0], *_read_file(run, src, files[0], 1))]
+        else:
+            # Varios archivos de la misma fuente: en paralelo, en el orden de la lista
+            with ThreadPoolExecutor(max_workers=read_workers(len(files), sp.read_opts),
+                                    thread_name_prefix=f"lectura-{src}") as pool:
+                read = pool.map(lambda p: _read_file(run, src, p, len(files)), files)
+                parts = [(p, *res) for p, res in zip(files, read)]
+        df, overlay = combine_source_files(parts, sp.headers, sp.read_opts.get("dedupe"))
+        typed = apply_native(df, overlay)
+        df_ok, val = validate_source(typed, src, cfg, headers=sp.headers)
+        raw[src.upper()] = df
+        native[src] = overlay
+        ok[src] = None if df_ok is typed else df_ok   # None: se normaliza el crudo (+ nativos) tal cual
+        vals.append(val)
+    return {"raw": raw, "native": native, "ok": ok, "validation": combine_validations(vals, cfg.get("validation"))}
+
+
+def _stage_normalize(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Normalizar por fuente (montos con el formato numérico detectado/recordado por fuente y columna)."""
+    plan = run.plan
+    numbers = NumericFormatTable(thaw(plan.cfg.get("numeric_formats") or {}))
+    parts = {}
+    for src in SOURCES:
+        df = st["ok"][src] if st["ok"][src] is not None else apply_native(st["raw"][src.upper()], st["native"][src])
+        part = normalize_source(df, src, plan.cfg, plan.schema, headers=plan.sources[src].headers, numbers=numbers)
+        part["APP"] = src.upper()
+        parts[src.upper()] = part
+    numbers.save()
+    return {"parts": parts}
+
+
+def _stage_concat(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Consolidar fuentes, conciliar duplicados EBS/REIM/RSF y completar fecha_creacion de EBS."""
+    parts = st["parts"]
+    base = pd.concat(list(parts.values()), ignore_index=True, sort=False)
+    # APP categórica armada desde el largo de cada parte: las etapas siguientes toman las
+    # filas de cada fuente de sus códigos (SourcePartition) sin volver a comparar texto
+    base["APP"] = source_column([len(p) for p in parts.values()], list(parts))
+
+    # Conciliación entre fuentes (duplicados EBS/REIM/RSF) antes de los enriquecimientos
+    base, rec_report = reconcile_sources(base, run.plan.cfg.get("reconciliation"), canon_prov=st["prov_index"].canonical)
 
     # Fecha creación robusta en EBS
-    mask_ebs = base.get("APP", pd.Series("", index=base.index)).eq("EBS")
+    mask_ebs = SourcePartition.of(base).series_mask(base.index, "EBS")
     if "fecha_creacion" in base.columns:
         fc = pd.to_datetime(base.loc[mask_ebs, "fecha_creacion"], errors="coerce", dayfirst=True)
     else:
@@ -55,65 +228,70 @@ def run_mercancia(
         alt = pd.to_datetime(base.loc[mask_ebs, "fecha"], errors="coerce", dayfirst=True)
         fc = fc.combine_first(alt)
     base.loc[mask_ebs, "fecha_creacion"] = fc
+    return {"base": base, "rec_report": rec_report}
 
-    # Lookups (prioridades/factoring) declarados bajo mercancia.lookups
-    lk_cfg = (cfg.get("lookups", {}) or {})
 
-    pr_cfg = (lk_cfg.get("prioridades", {}) or {})
+def _stage_lookups(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Lookups (prioridades/factoring) declarados bajo mercancia.lookups y mini maestro TIPO (VE).
+    Los maestros ya se vienen bajando desde el inicio de la corrida (MasterPrefetch).
+    """
+    base, prov_index, masters = st["base"], st["prov_index"], run.prefetch()
+    lk_cfg = run.plan.lookups
+    pr_cfg = lk_cfg["prioridades"]
     if pr_cfg.get("enabled"):
-        master = load_priorities_from_config(pr_cfg)
+        master = masters.result("prioridades")
         if master is not None and not master.empty:
-            base = apply_priority_lookup(base, pr_cfg, master)
+            base = apply_priority_lookup(base, pr_cfg, master, index=prov_index)
 
-    fx_cfg = (lk_cfg.get("factoring", {}) or {})
+    fx_cfg = lk_cfg["factoring"]
     if fx_cfg.get("enabled"):
-        master_fx = load_factoring_from_config(fx_cfg)
+        master_fx = masters.result("factoring")
         if master_fx is not None and not master_fx.empty:
-            base = apply_factoring_lookup(base, fx_cfg, master_fx)
+            base = apply_factoring_lookup(base, fx_cfg, master_fx, index=prov_index)
 
     # Mini maestro TIPO a nivel raíz (VE)
     tipo_map = None
-    tp_cfg_root = (country_all.get("lookups", {}) or {}).get("tipo_mercancia", {})
+    tp_cfg_root = lk_cfg["tipo_mercancia"]
     if tp_cfg_root.get("enabled"):
-        tipo_map = load_tipo_map_from_config(tp_cfg_root)
+        tipo_map = masters.result("tipo_mercancia")
+        register_tipo(prov_index, tipo_map, tp_cfg_root)
         mpc = (tp_cfg_root or {}).get("match_policy_consolidated", {})
         if mpc and mpc.get("enabled") and (tipo_map is not None and not getattr(tipo_map, "empty", True)):
-            apply_srcs = set(mpc.get("apply_to_sources", ["EBS", "REIM", "RSF"]))
-            on_col = mpc.get("on_column", "proveedor")
-            out_col = mpc.get("write_to", "tipo")
-            overwrite = bool(mpc.get("overwrite_existing", False))
-            trace_f = mpc.get("trace_field")
-            trace_val = mpc.get("trace_value", "MAESTRO_TIPO")
-
-            app_col = "APP" if "APP" in base.columns else ("origen" if "origen" in base.columns else None)
-            mask_src = base[app_col].astype("string").str.upper().isin({s.upper() for s in apply_srcs}) if app_col else False
-            if out_col not in base.columns:
-                base[out_col] = pd.NA
-            need = mask_src & (overwrite | (base[out_col].isna() | (base[out_col].astype("string").str.len() == 0)))
-            if need.any():
-                prov = base.loc[need, on_col].astype("string").str.replace("\u00A0", " ", regex=False).str.strip()
-                lk = prov.map(tipo_map)
-                base.loc[need & lk.notna(), out_col] = lk[lk.notna()]
-                if trace_f:
-                    base.loc[need & lk.notna(), trace_f] = trace_val
-
-    # Lunes de ejecución
-    if exec_date is None:
-        exec_date = pd.Timestamp.today().normalize()
-    exec_mon = exec_date - pd.to_timedelta(exec_date.weekday(), unit="D")
-
-    # Post (acepta bajo mercancia.post o raíz.post)
-    post_cfg = (cfg.get("post", {}) or country_all.get("post", {}) or {})
-    base = apply_post(base, post_cfg, context={"exec_mon": exec_mon})
-
-    # Enriquecimientos solicitados para VE en consolidado: Caja y Grupo de Pago
-    pais = (cfg.get("const", {}) or {}).get("pais") or (country_all.get("mercancia", {}).get("const", {}) if isinstance(country_all.get("mercancia", {}), dict) else {}).get("pais")
+            mp_defaults = {"apply_to_sources": ["EBS", "REIM", "RSF"], "on_column": "proveedor", "write_to": "tipo",
+                           "overwrite_existing": False, "trace_value": "MAESTRO_TIPO"}
+            base = apply_tipo_lookup(base, {"match_policy": {**mp_defaults, **mpc}}, tipo_map, index=prov_index)
+    return {"base": base, "prov_index": prov_index, "tipo_map": tipo_map}
+
+
+def _stage_post(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Post (mercancia.post o raíz.post, ya compilado en el plan) con la tabla de términos de pago."""
+    terms = PaymentTermTable(thaw(run.plan.cfg.get("payment_terms") or {}))
+    context = {"exec_mon": run.exec_mon, "term_days": terms.days}
+    # execution.hoist_filters: filtro de montos apenas el monto queda definitivo (los pasos
+    # restantes son fila a fila). El consolidado no cambia, pero las estadísticas de lookups
+    # del calendario (Grupo de Pago) cuentan solo las filas que sobreviven.
+    post = run.plan.post_compute
+    cut = filter_point(post, "monto") if run.hoist_filters else len(post)
+    base = apply_post(st["base"], {"compute": post[:cut]}, context=context)
+    if 0 < cut < len(post) and "monto" in base.columns:
+        base = _hoist_monto_filter(run, base)
+    base = apply_post(base, {"compute": post[cut:]}, context=context)
+    terms.save()
+    return {"base": base, "term_report": terms.report()}
+
+
+def _stage_calendar(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Vencimientos, Caja contra el lunes de ejecución, fecha del documento y Grupo de Pago."""
+    base, prov_index, tipo_map = st["base"], st["prov_index"], st["tipo_map"]
+    rules, exec_mon, raw_sources = run.plan.rules, run.exec_mon, st["raws"]
+    has_app = "APP" in base.columns
+    sources = SourcePartition.of(base)  # el calendario no agrega ni quita filas: una partición para toda la etapa
 
     # Fallback VE (RSF): asegurar fecha_vencimiento = fecha_recepcion + dias_condicion_rms
-    if (pais or "").upper() == "VE":
-        app_col_fv = "APP" if "APP" in base.columns else None
-        if app_col_fv and "fecha_recepcion" in base.columns and "dias_condicion_rms" in base.columns:
-            mask_rsf_all = base[app_col_fv].astype("string").str.upper().eq("RSF")
+    if rules["rsf_due_from_dias_condicion"]:
+        if has_app and "fecha_recepcion" in base.columns and "dias_condicion_rms" in base.columns:
+            mask_rsf_all = sources.series_mask(base.index, "RSF")
             rec = to_dt(base.loc[mask_rsf_all, "fecha_recepcion"]) if mask_rsf_all.any() else None
             days = pd.to_numeric(base.loc[mask_rsf_all, "dias_condicion_rms"], errors="coerce") if mask_rsf_all.any() else None
             if rec is not None and days is not None:
@@ -133,12 +311,11 @@ def run_mercancia(
         base["Caja"] = caja
 
     # Fecha del Documento (VE): EBS/REIM -> 'fecha'; RSF -> 'fecha_recepcion'
-    if (pais or "").upper() == "VE":
-        app_col_fd = "APP" if "APP" in base.columns else None
-        if app_col_fd:
-            mask_ebs_fd = base[app_col_fd].astype("string").str.upper().eq("EBS")
-            mask_reim_fd = base[app_col_fd].astype("string").str.upper().eq("REIM")
-            mask_rsf_fd = base[app_col_fd].astype("string").str.upper().eq("RSF")
+    if rules["fecha_documento"]:
+        if has_app:
+            mask_ebs_fd = sources.series_mask(base.index, "EBS")
+            mask_reim_fd = sources.series_mask(base.index, "REIM")
+            mask_rsf_fd = sources.series_mask(base.index, "RSF")
             base["fecha_documento"] = pd.NaT
             # EBS: usar exclusivamente 'fecha' (mapeada desde "FECHA DOCUMENTO" en YAML)
             if mask_ebs_fd.any() and "fecha" in base.columns:
@@ -182,11 +359,10 @@ def run_mercancia(
                     base.loc[need, "fecha_documento"] = mapped.loc[need[need].index].values
 
     # Grupo de Pago: EBS por prioridad; REIM/RSF por reglas + mini maestro
-    app_col = "APP" if "APP" in base.columns else None
-    if app_col:
-        mask_ebs = base[app_col].astype("string").str.upper().eq("EBS")
-        mask_reim = base[app_col].astype("string").str.upper().eq("REIM")
-        mask_rsf = base[app_col].astype("string").str.upper().eq("RSF")
+    if has_app:
+        mask_ebs = sources.series_mask(base.index, "EBS")
+        mask_reim = sources.series_mask(base.index, "REIM")
+        mask_rsf = sources.series_mask(base.index, "RSF")
 
         # inicializar columna
         if "Grupo de Pago" not in base.columns:
@@ -203,18 +379,30 @@ def run_mercancia(
         if tienda_col and prov_col:
             if mask_reim.any():
                 base.loc[mask_reim, "Grupo de Pago"] = grupo_pago_from_tienda_sucursal_o_proveedor(
-                    base.loc[mask_reim], tienda_col=tienda_col, sucursal_col=suc_col or "sucursal_proveedor", proveedor_col=prov_col, tipo_map=tipo_map
+                    base.loc[mask_reim], tienda_col=tienda_col, sucursal_col=suc_col or "sucursal_proveedor", proveedor_col=prov_col, tipo_map=tipo_map,
+                    index=prov_index, source="REIM"
                 ).values
             if mask_rsf.any():
                 base.loc[mask_rsf, "Grupo de Pago"] = grupo_pago_from_tienda_sucursal_o_proveedor(
-                    base.loc[mask_rsf], tienda_col=tienda_col, sucursal_col=suc_col or "sucursal_proveedor", proveedor_col=prov_col, tipo_map=tipo_map
+                    base.loc[mask_rsf], tienda_col=tienda_col, sucursal_col=suc_col or "sucursal_proveedor", proveedor_col=prov_col, tipo_map=tipo_map,
+                    index=prov_index, source="RSF"
                 ).values
 
+    # Persistir matches aproximados aceptados (si lookups.fuzzy está activo)
+    prov_index.save_fuzzy_cache()
+
     # Forzar tipo_documento STANDARD para RSF (VE)
-    if app_col:
-        mask_rsf_all = base[app_col].astype("string").str.upper().eq("RSF")
+    if has_app:
+        mask_rsf_all = sources.series_mask(base.index, "RSF")
         if mask_rsf_all.any():
             base.loc[mask_rsf_all, "tipo_documento"] = "STANDARD"
+    return {"base": base, "prov_index": prov_index}
+
+
+def _stage_filters(run: _Run, st: Dict[str, Any]) -> Dict[str, Any]:
+    """Filtros del consolidado, tipado y orden estándar por schema."""
+    base, rules, plan = st["base"], run.plan.rules, run.plan
+    schema, dtypes = plan.schema, plan.dtypes
 
     # Fallback VE: calcular 'monto' si faltó en post (neto o bruto)
     if ("monto" not in base.columns) or base["monto"].isna().all():
@@ -222,93 +410,251 @@ def run_mercancia(
             pd.to_numeric(base.get("monto_bruto"), errors="coerce")
         )
 
-    # Filtro general del consolidado: excluir 0 <= monto <= 100
-    if "monto" in base.columns:
-        _m = pd.to_numeric(base["monto"], errors="coerce")
-        base = base[_m.isna() | (_m < 0) | (_m > 100)].copy()
-
-    # Filtro consolidado VE: conservar solo Caja en valores permitidos (configurable por YAML)
-    if (pais or "").upper() == "VE" and "Caja" in base.columns:
-        cfg_export = (cfg.get("export") or country_all.get("export") or {})
-        caja_allowed = cfg_export.get("filter_caja_values", ["Martes", "Jueves"]) or ["Martes", "Jueves"]
-        base = base[base["Caja"].isin(caja_allowed)].copy()
-
-    # Filtro consolidado VE: conservar solo Grupo de Pago permitido (configurable por YAML)
-    if (pais or "").upper() == "VE" and "Grupo de Pago" in base.columns:
-        cfg_export = (cfg.get("export") or country_all.get("export") or {})
-        gp_allowed_conf = cfg_export.get("filter_grupo_pago_values")
-        gp_allowed = {s.upper() for s in (gp_allowed_conf or ["DIRECTO", "ALMACEN", "PPV RMS", "SUMINISTROS"]) }
-        gp_norm = base["Grupo de Pago"].astype("string").str.upper()
-        base = base[gp_norm.isin(gp_allowed)].copy()
-
-    # Para Colombia: no incluir columna calculada 'Grupo de Pago' en el consolidado
-    if (pais or "").upper() == "CO" and "Grupo de Pago" in base.columns:
-        base.drop(columns=["Grupo de Pago"], inplace=True)
+    # Filtros del consolidado (excluir 0 <= monto <= 100; VE: Caja y Grupo de Pago permitidos por YAML)
+    # en una sola selección; con engine=polars el predicado se evalúa como consulta lazy.
+    # Con execution.hoist_filters el de montos ya se adelantó en post: aquí se repite sobre lo que quedó
+    spec = filter_spec(rules, plan.export)
+    keep = keep_positions_polars(base, spec) if run.engine == "polars" else np.flatnonzero(keep_mask_pandas(base, spec))
+
+    # Solo se copian las columnas que llegan al consolidado (orden, extras del país y tipado)
+    order = schema.get("order", [])
+    # La marca de la conciliación (reconciliation.flag_column) también llega al consolidado
+    rc = plan.cfg.get("reconciliation") or {}
+    flag_col = [rc.get("flag_column", "conciliacion")] if rc.get("enabled") else []
+    needed = set(order) | set(rules["extra_columns"]) | set(dtypes) | set(flag_col)
+    if rules["drop_grupo_pago"]:
+        # Para Colombia: no incluir columna calculada 'Grupo de Pago' en el consolidado
+        needed.discard("Grupo de Pago")
+    if not any(c in base.columns or c in dtypes for c in order):
+        needed = set(base.columns) - ({"Grupo de Pago"} if rules["drop_grupo_pago"] else set())
+    base = base.iloc[keep, np.flatnonzero(base.columns.isin(needed))]
 
     # Tipado y orden estándar por schema
     base = cast_dtypes(base, dtypes)
-    order = schema.get("order", [])
     final_cols = [c for c in order if c in base.columns]
-    # Asegurar columnas VE necesarias en consolidado
-    if (pais or "").upper() == "VE":
-        for extra in ["fecha_documento", "Grupo de Pago", "Caja"]:
-            if extra in base.columns and extra not in final_cols:
-                final_cols.append(extra)
+    # Asegurar columnas del país necesarias en consolidado (VE) y la marca de conciliación
+    for extra in [*rules["extra_columns"], *flag_col]:
+        if extra in base.columns and extra not in final_cols:
+            final_cols.append(extra)
     out = base[final_cols] if final_cols else base
-
-    # Export config (mercancia.export o raíz.export)
-    export_cfg = (cfg.get("export") or country_all.get("export") or {})
-    # Override de export para Venezuela: columnas solicitadas
-    if (pais or "").upper() == "VE":
-        export_cfg = dict(export_cfg)  # copia superficial
-        headers = dict(export_cfg.get("headers", {}))
-        headers.update({
-            "factura": "Numero de Factura",
-            "orden_compra": "Orden De Compra",
-            "proveedor": "Proveedor",
-            "fecha_documento": "Fecha del documento",
-            "monto": "Monto",
-            "APP": "APP",
-        })
-        export_cfg["headers"] = headers
-        export_cfg["order"] = [
-            "APP",
-            "Grupo de Pago",
-            "Proveedor",
-            "Numero de Factura",
-            "Orden De Compra",
-            "Fecha del documento",
-            "Monto",
-            "Caja",
-        ]
-    export_cfg["__tipo_map"] = tipo_map
-    # Bandera de país para export y políticas de RAW
-    export_cfg["__pais"] = (pais or "").upper() if pais else None
-    if (pais or "").upper() == "CO":
-        # Colombia: escribir RAW sin enriquecer, y filtrar RSF a Recepción sin factura
-        export_cfg = dict(export_cfg)
-        export_cfg["write_sources_raw"] = True
-        export_cfg["enrich_raw_sources"] = False
-    return out, raw_sources, export_cfg
+    return {"base": out}
+
+
+# Etapas del runner en orden: (nombre, función, estado que usa, estado que produce).
+# La etapa "export" (pipeline.export) no se cachea: su salida es el propio xlsx.
+STAGES: Tuple[Tuple[str, Callable, Tuple[str, ...], Tuple[str, ...]], ...] = (
+    ("read", _stage_read, (), ("raw", "native", "ok", "validation")),
+    ("normalize", _stage_normalize, ("raw", "native", "ok"), ("parts",)),
+    ("concat", _stage_concat, ("parts", "prov_index"), ("base", "rec_report")),
+    ("lookups", _stage_lookups, ("base", "prov_index"), ("base", "prov_index", "tipo_map")),
+    ("post", _stage_post, ("base",), ("base", "term_report")),
+    ("calendar", _stage_calendar, ("base", "raws", "prov_index", "tipo_map"), ("base", "prov_index")),
+    ("filters", _stage_filters, ("base",), ("base",)),
+)
+_STAGE_INDEX = {s[0]: i for i, s in enumerate(STAGES)}
+# Estado que sale del runner además del consolidado
+_RESULT_STATE = ("raw", "validation", "rec_report", "prov_index", "tipo_map", "term_report", "base")
+
+
+def _stage_keys(run: _Run, ck_cfg: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Llave de cada etapa = hash(llave anterior, porción de config/datos que usa). Cambiar la
+    fecha de ejecución invalida desde post; cambiar un archivo de entrada, desde read.
+    """
+    plan, cfg = run.plan, run.plan.cfg
+    digest = run.caches.shared.file_digest if run.caches is not None else file_digest
+    srcs = plan.sources
+    ttl = float(ck_cfg.get("master_ttl_s") or 0)
+    parts = {
+        "read": ({s: [(digest(p), p.suffix.lower()) for p in run.paths[s]] for s in SOURCES},
+                 {s: srcs[s].read_opts for s in SOURCES}, {s: srcs[s].headers for s in SOURCES},
+                 cfg.get("validation"), run.storage, run.typed and {s: srcs[s].native for s in SOURCES}),
+        # Con formatos numéricos recordados distintos el mismo crudo puede parsear distinto
+        "normalize": ({k: cfg.get(k) for k in ("column_maps", "const", "date_formats", "text_normalize", "value_maps", "filters",
+                                               "numeric_formats")},
+                      plan.dtypes, NumericFormatTable(thaw(cfg.get("numeric_formats") or {})).state()),
+        "concat": (cfg.get("reconciliation"), plan.lookups["proveedor_key"], plan.lookups["fuzzy"]),
+        # Maestros remotos: se vuelven a bajar cuando vence master_ttl_s
+        "lookups": (plan.lookups, int(time.time() // ttl) if ttl > 0 else 0),
+        "post": (plan.post_compute, run.exec_mon, cfg.get("payment_terms"), run.hoist_filters),
+        "calendar": (plan.rules, run.exec_mon),
+        "filters": (plan.rules, plan.dtypes, plan.schema.get("order"),
+                    {k: plan.export.get(k) for k in ("filter_caja_values", "filter_grupo_pago_values")}),
+    }
+    keys, prev = {}, ""
+    for name, *_ in STAGES:
+        prev = keys[name] = stage_key(prev, name, *parts[name])
+    return keys
+
+
+def _stage_rows(out: Dict[str, Any]) -> int:
+    """Filas a la salida de una etapa (suma de fuentes en read/normalize, consolidado en el resto)."""
+    if "base" in out:
+        return len(out["base"])
+    frames = out.get("parts") or out.get("raw") or {}
+    return sum(len(df) for df in frames.values())
+
+
+def _resume_state(ck: CheckpointStore, keys: Dict[str, str], start: int) -> Dict[str, Any]:
+    """Estado para retomar en STAGES[start]: cada nombre desde la última etapa previa que lo produjo."""
+    needed = set(_RESULT_STATE).union(*(s[2] for s in STAGES[start:]))
+    producer: Dict[str, str] = {}
+    for name, _, _, makes in STAGES[:start]:
+        for m in makes:
+            if m in needed:
+                producer[m] = name
+    st: Dict[str, Any] = {}
+    for stage in dict.fromkeys(producer.values()):
+        st.update(ck.load(stage, keys[stage], [m for m, p in producer.items() if p == stage]))
+        ck.touch(stage, keys[stage])
+    return st
+
+
+def _archive_run(run: _Run, base: pd.DataFrame, clock: StageClock, stage_rows: list) -> str | None:
+    """Agrega el consolidado al archivo histórico (mercancia.archive); ruta de la partición o None."""
+    cfg = thaw(run.plan.cfg.get("archive") or {})
+    if not cfg.get("enabled") or not pyarrow_available():
+        return None
+    inputs = {}
+    for src, files in run.paths.items():
+        found = []
+        for path in files:
+            stt = path.stat()
+            found.append({"path": str(path.resolve()), "bytes": stt.st_size, "mtime": stt.st_mtime})
+        inputs[src] = found[0] if len(found) == 1 else found
+    manifest = {
+        "creado": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "plan": run.plan.key,
+        "monto_total": float(pd.to_numeric(base.get("monto"), errors="coerce").sum()) if "monto" in base.columns else None,
+        "inputs": inputs,
+        "etapas": {name: {"segundos": round(sec, 3)} for name, sec in clock.laps},
+        "filas_por_etapa": {r["etapa"]: r["filas"] for r in stage_rows},
+    }
+    return str(RunArchive(cfg).append(base, run.plan.pais, run.exec_mon, manifest))
+
+
+def _run_mercancia(
+    plan: PipelinePlan,
+    ebs_path: InputRef,
+    reim_path: InputRef,
+    rsf_path: InputRef,
+    exec_date: pd.Timestamp | None,
+    storage: str,
+    caches: JobCaches | None = None,
+    checkpoints: bool | None = None,
+    sample: Dict[str, Any] | None = None,
+) -> Tuple[pd.DataFrame, RawStore, dict]:
+    # Lunes de ejecución
+    if exec_date is None:
+        exec_date = pd.Timestamp.today().normalize()
+    exec_mon = exec_date - pd.to_timedelta(exec_date.weekday(), unit="D")
+    refs = {"ebs": ebs_path, "reim": reim_path, "rsf": rsf_path}
+    paths = {s: resolve_input_files(refs[s], plan.sources[s].read_opts.get("file_pattern")) for s in SOURCES}
+    run = _Run(plan, paths, exec_mon, storage, caches, sample, http=MasterFetcher(plan.lookups["http"]))
+    clock = StageClock()
+
+    # Checkpoints por etapa (mercancia.checkpoints): se retoma desde la primera etapa cuya llave cambió
+    ck_cfg = thaw(plan.cfg.get("checkpoints") or {})
+    use_ck = bool(ck_cfg.get("enabled")) if checkpoints is None else bool(checkpoints)
+    use_ck = use_ck and sample is None
+    ck = CheckpointStore(ck_cfg) if use_ck else None
+    keys = _stage_keys(run, ck.cfg) if ck is not None else {}
+    start = 0
+    st: Dict[str, Any] = {}
+    if ck is not None:
+        while start < len(STAGES) and ck.has(STAGES[start][0], keys[STAGES[start][0]]):
+            start += 1
+        if start:
+            try:
+                st = _resume_state(ck, keys, start)
+            except Exception:
+                # Checkpoint podado o ilegible a mitad de camino: corrida completa
+                start, st = 0, {}
+            clock.lap("checkpoint")
+    st.setdefault("prov_index", _new_prov_index(plan))
+    # Maestros remotos: se empiezan a bajar ya, en paralelo con la lectura (si lookups se va a correr)
+    if start <= _STAGE_INDEX["lookups"]:
+        run.prefetch()
+
+    # Crudos retenidos en forma compacta hasta el export (hojas "(Original)")
+    raw_sources = RawStore(plan.export.get("raw_store"))
+    st["raws"] = raw_sources
+
+    def keep_raws() -> None:
+        for name, df in st["raw"].items():
+            raw_sources.put(name, df)
+
+    if start > 0:
+        keep_raws()
+    stage_rows = []
+    try:
+        for i in range(start, len(STAGES)):
+            name, fn, _, _ = STAGES[i]
+            out = fn(run, st)
+            stage_rows.append({"etapa": name, "filas": _stage_rows(out)})
+            if ck is not None:
+                ck.save(name, keys[name], out)
+            st.update(out)
+            if name == "read":
+                keep_raws()
+            # Soltar lo que ya no usa ninguna etapa siguiente
+            alive = (set(_RESULT_STATE) - {"raw"}).union(*(s[2] for s in STAGES[i + 1:]))
+            for k in [k for k in st if k not in alive and k != "raws"]:
+                del st[k]
+            clock.lap(name)
+    finally:
+        run.http.close()
+    st.pop("raw", None)
+
+    prov_index = st["prov_index"]
+    validation = st["validation"]
+    # Export config: headers/order/flags del país ya resueltos en el plan (copia por corrida)
+    export_cfg = thaw(plan.export)
+    export_cfg["__tipo_map"] = st["tipo_map"]
+    export_cfg["__proveedor_index"] = prov_index
+    export_cfg["__lookup_stats"] = prov_index.match_stats()
+    export_cfg["__reconciliation"] = st["rec_report"]
+    export_cfg["__validation"] = validation["report"]
+    export_cfg["__quarantine"] = validation["quarantine"]
+    export_cfg["__payment_terms"] = st["term_report"]
+    export_cfg["__timings"] = clock.table()
+    export_cfg["__stage_rows"] = pd.DataFrame(stage_rows, columns=["etapa", "filas"])
+    export_cfg["__string_storage"] = storage
+    export_cfg["__engine"] = run.engine
+    export_cfg["__cache_stats"] = dict(caches.stats) if caches is not None else None
+    export_cfg["__archive"] = export_cfg["__archive_error"] = None
+    if sample is None:
+        # El histórico es un extra: si falla (disco, permisos) la corrida sigue y se avisa
+        try:
+            export_cfg["__archive"] = _archive_run(run, st["base"], clock, stage_rows)
+        except Exception as e:
+            export_cfg["__archive_error"] = f"{type(e).__name__}: {e}"
+    export_cfg["__checkpoints"] = pd.DataFrame(
+        [{"etapa": s[0], "estado": "reutilizada" if i < start else "calculada", "llave": keys[s[0]]}
+         for i, s in enumerate(STAGES)]
+    ) if ck is not None else None
+    return st["base"], raw_sources, export_cfg
 
 
 def run_colombia_mercancia(
     schema_path: str,
     country_path: str,
-    ebs_path: str,
-    reim_path: str,
-    rsf_path: str,
+    ebs_path: InputRef,
+    reim_path: InputRef,
+    rsf_path: InputRef,
     exec_date: pd.Timestamp | None = None,
+    checkpoints: bool | None = None,
 ) -> Tuple[pd.DataFrame, dict, dict]:
-    return run_mercancia(schema_path, country_path, ebs_path, reim_path, rsf_path, exec_date)
+    return run_mercancia(schema_path, country_path, ebs_path, reim_path, rsf_path, exec_date, checkpoints=checkpoints)
 
 
 def run_venezuela_mercancia(
     schema_path: str,
     country_path: str,
-    ebs_path: str,
-    reim_path: str,
-    rsf_path: str,
+    ebs_path: InputRef,
+    reim_path: InputRef,
+    rsf_path: InputRef,
     exec_date: pd.Timestamp | None = None,
+    checkpoints: bool | None = None,
 ) -> Tuple[pd.DataFrame, dict, dict]:
-    return run_mercancia(schema_path, country_path, ebs_path, reim_path, rsf_path, exec_date)
+    return run_mercancia(schema_path, country_path, ebs_path, reim_path, rsf_path, exec_date, checkpoints=checkpoints)
@@ -0,0 +1,374 @@
+"""
+Servicio HTTP local para correr consolidaciones (run_mercancia + write_excel_with_raw)
+con una cola de trabajos y un pool acotado de workers que comparten caches de maestros
+y de crudos parseados.
+
+Uso:  python -m pipeline.service --port 8765 --workers 2
+
+  POST   /uploads?name=ebs.xlsx        cuerpo = bytes del archivo -> {"upload_id": ...}
+  POST   /jobs                         {"pais": "VE", "exec_date": "2025-03-10",
+                                        "ebs": "<ruta compartida> | upload:<id>", "reim": ..., "rsf": ...}
+                                       (cada fuente acepta también un glob o una lista: "reim": ["upload:<id1>", "upload:<id2>"])
+  GET    /jobs                         lista de trabajos
+  GET    /jobs/<id>                    estado + métricas
+  GET    /jobs/<id>/output             Excel generado
+  DELETE /jobs/<id>                    borra un trabajo terminado y sus archivos
+  GET    /health                       workers, cola y tamaño de caches
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from core.cache import SharedCaches
+from core.dtypes import resolve_string_storage
+from core.inputs import resolve_input_files
+from core.plan import compile_plan
+from pipeline.export import write_excel_with_raw
+from pipeline.publish import publish_run
+from pipeline.runners import run_mercancia
+from pipeline.validate import ValidationError
+
+DEFAULT_CONFIGS = {"CO": "./schema/colombia.yaml", "VE": "./schema/venezuela.yaml"}
+SOURCES = ("ebs", "reim", "rsf")
+MAX_UPLOAD_BYTES = 512 * 2**20
+
+
+class QueueFull(RuntimeError):
+    """La cola de trabajos está llena (HTTP 503)."""
+
+
+@dataclass
+class Job:
+    id: str
+    pais: str
+    exec_date: str
+    inputs: Dict[str, List[str]]
+    status: str = "en_cola"          # en_cola | corriendo | listo | error
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    output: str | None = None
+    error: str | None = None
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "pais": self.pais, "exec_date": self.exec_date, "inputs": self.inputs,
+            "status": self.status, "error": self.error, "metrics": self.metrics,
+            "espera_s": round((self.started or time.time()) - self.created, 3),
+            "duracion_s": round(self.finished - self.started, 3) if (self.started and self.finished) else None,
+            "output": f"/jobs/{self.id}/output" if self.output else None,
+        }
+
+
+class _StorageGate:
+    """
+    mode.string_storage de pandas es global al proceso. Los trabajos con el almacenamiento
+    del proceso corren en paralelo; uno que pida otro corre solo (excluye al resto).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+
+    def acquire(self, exclusive: bool) -> None:
+        with self._cond:
+            if exclusive:
+                self._cond.wait_for(lambda: not self._exclusive and self._shared == 0)
+                self._exclusive = True
+            else:
+                self._cond.wait_for(lambda: not self._exclusive)
+                self._shared += 1
+
+    def release(self, exclusive: bool) -> None:
+        with self._cond:
+            if exclusive:
+                self._exclusive = False
+            else:
+                self._shared -= 1
+            self._cond.notify_all()
+
+
+class ConsolidationService:
+    """Cola de trabajos + pool de workers; el estado vive en memoria y los archivos en workdir."""
+
+    def __init__(self, schema_path: str = "./schema/schema.yaml", configs: Dict[str, str] | None = None,
+                 workdir: str = "./.cache/service", workers: int = 2, max_queue: int = 8,
+                 caches: SharedCaches | None = None):
+        self.schema_path = schema_path
+        self.configs = {k.upper(): v for k, v in (configs or DEFAULT_CONFIGS).items()}
+        self.workdir = Path(workdir)
+        (self.workdir / "uploads").mkdir(parents=True, exist_ok=True)
+        (self.workdir / "jobs").mkdir(parents=True, exist_ok=True)
+        self.workers = int(workers)
+        self.max_queue = int(max_queue)
+        self.caches = caches or SharedCaches()
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="consolidacion")
+        self._gate = _StorageGate()
+        # almacenamiento de texto del proceso (ver execution.string_storage)
+        self.storage = resolve_string_storage("auto")
+        pd.set_option("mode.string_storage", self.storage)
+
+    # --- archivos ---
+    def save_upload(self, name: str, body: bytes) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.basename(name or "archivo"))[-80:]
+        upload_id = f"{uuid.uuid4().hex[:12]}_{safe}"
+        (self.workdir / "uploads" / upload_id).write_bytes(body)
+        return upload_id
+
+    def _resolve_input(self, ref: str | List[str]) -> List[str]:
+        """Archivos de una fuente: una ruta/glob/upload o una lista de ellos (core.inputs)."""
+        out = []
+        for item in ([ref] if isinstance(ref, str) else list(ref)):
+            item = str(item)
+            if item.startswith("upload:"):
+                found = [self.workdir / "uploads" / os.path.basename(item[len("upload:"):])]
+            else:
+                try:
+                    found = resolve_input_files(item)
+                except FileNotFoundError as e:
+                    raise ValueError(str(e)) from None
+            for path in found:
+                if not path.is_file():
+                    raise ValueError(f"No existe el archivo de entrada: {item}")
+                out.append(str(path))
+        if not out:
+            raise ValueError("Fuente sin archivos de entrada")
+        return out
+
+    # --- cola ---
+    def submit(self, params: Dict[str, Any]) -> Job:
+        pais = str(params.get("pais") or "").upper()
+        if pais not in self.configs:
+            raise ValueError(f"pais inválido: {pais!r} (opciones: {', '.join(self.configs)})")
+        exec_date = pd.to_datetime(params.get("exec_date") or pd.Timestamp.today().normalize(), errors="coerce")
+        if pd.isna(exec_date):
+            raise ValueError("exec_date inválida (usa yyyy-mm-dd)")
+        missing = [s for s in SOURCES if not params.get(s)]
+        if missing:
+            raise ValueError(f"Faltan fuentes: {', '.join(missing)}")
+        inputs = {s: self._resolve_input(params[s]) for s in SOURCES}
+
+        with self._lock:
+            pending = sum(1 for j in self.jobs.values() if j.status in ("en_cola", "corriendo"))
+            if pending >= self.workers + self.max_queue:
+                raise QueueFull(f"Cola llena ({pending} trabajos pendientes)")
+            job = Job(id=uuid.uuid4().hex[:12], pais=pais, exec_date=str(exec_date.date()), inputs=inputs)
+            self.jobs[job.id] = job
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job) -> None:
+        job.status, job.started = "corriendo", time.time()
+        caches = self.caches.job()
+        exclusive = False
+        try:
+            plan = compile_plan(self.schema_path, self.configs[job.pais])
+            storage = resolve_string_storage((plan.cfg.get("execution") or {}).get("string_storage"))
+            exclusive = storage != self.storage
+            self._gate.acquire(exclusive)
+            raws = None
+            try:
+                exec_date = pd.Timestamp(job.exec_date)
+                exec_mon = exec_date - pd.to_timedelta(exec_date.weekday(), unit="D")
+                df, raws, export_cfg = run_mercancia(
+                    self.schema_path, self.configs[job.pais], job.inputs["ebs"], job.inputs["reim"], job.inputs["rsf"],
+                    exec_date=exec_mon, plan=plan, caches=caches,
+                )
+                out_dir = self.workdir / "jobs" / job.id
+                out_dir.mkdir(parents=True, exist_ok=True)
+                out = out_dir / f"mercancia_{job.pais}_{exec_mon.date()}.xlsx"
+                tipo_map = export_cfg.get("__tipo_map") if job.pais == "VE" else None
+                published = publish_run(export_cfg, df, raws, exec_mon)
+                t_export = time.perf_counter()
+                write_excel_with_raw(str(out), df, export_cfg, raw_sources=raws, exec_mon=exec_mon, tipo_map=tipo_map)
+            finally:
+                if raws is not None:
+                    raws.close()   # libera crudos retenidos / archivos de spill aunque falle el export
+                self._gate.release(exclusive)
+            timings = export_cfg["__timings"]
+            job.metrics = {
+                "filas": int(len(df)),
+                "etapas_s": {r.etapa: round(r.segundos, 3) for r in timings.itertuples(index=False)},
+                "export_s": round(time.perf_counter() - t_export, 3),
+                "caches": dict(caches.stats),
+                "string_storage": storage,
+                "etapas_reutilizadas": [] if export_cfg.get("__checkpoints") is None else [
+                    r.etapa for r in export_cfg["__checkpoints"].itertuples(index=False) if r.estado == "reutilizada"],
+                "cuarentena": int(len(export_cfg.get("__quarantine") if export_cfg.get("__quarantine") is not None else [])),
+                "archivo": export_cfg.get("__archive"),
+                "archivo_error": export_cfg.get("__archive_error"),
+                "publicado": None if published is None else {"ubicacion": published[0], "tickets": published[1]},
+            }
+            job.output = str(out)
+            job.status = "listo"
+        except ValidationError as e:
+            job.status, job.error = "error", str(e)
+            job.metrics["caches"] = dict(caches.stats)
+        except Exception:
+            job.status, job.error = "error", traceback.format_exc(limit=10)
+            job.metrics["caches"] = dict(caches.stats)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self.jobs.values(), key=lambda j: j.created)
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in ("en_cola", "corriendo"):
+                return False
+            del self.jobs[job_id]
+        shutil.rmtree(self.workdir / "jobs" / job_id, ignore_errors=True)
+        for refs in job.inputs.values():
+            for ref in refs:
+                p = Path(ref)
+                if p.parent == self.workdir / "uploads":
+                    p.unlink(missing_ok=True)
+        return True
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for j in self.jobs.values():
+                counts[j.status] = counts.get(j.status, 0) + 1
+        return {"workers": self.workers, "max_queue": self.max_queue, "trabajos": counts,
+                "string_storage": self.storage,
+                "caches": {"maestros": len(self.caches.masters), "crudos": len(self.caches.inputs)}}
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+def make_handler(service: ConsolidationService):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "MercanciaService/1"
+
+        def _json(self, code: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            n = int(self.headers.get("Content-Length") or 0)
+            if n > MAX_UPLOAD_BYTES:
+                raise ValueError(f"Archivo demasiado grande ({n} bytes)")
+            return self.rfile.read(n) if n else b""
+
+        def _parts(self) -> List[str]:
+            return [p for p in urlparse(self.path).path.split("/") if p]
+
+        def do_GET(self):
+            parts = self._parts()
+            if parts == ["health"]:
+                return self._json(200, service.health())
+            if parts == ["jobs"]:
+                return self._json(200, [j.to_dict() for j in service.list()])
+            if len(parts) in (2, 3) and parts[0] == "jobs":
+                job = service.get(parts[1])
+                if job is None:
+                    return self._json(404, {"error": "trabajo no encontrado"})
+                if len(parts) == 2:
+                    return self._json(200, job.to_dict())
+                if parts[2] == "output":
+                    if job.status != "listo" or not job.output:
+                        return self._json(409, {"error": f"trabajo en estado {job.status}"})
+                    data = Path(job.output).read_bytes()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                    self.send_header("Content-Disposition", f'attachment; filename="{Path(job.output).name}"')
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+            self._json(404, {"error": "ruta no encontrada"})
+
+        def do_POST(self):
+            parts = self._parts()
+            try:
+                if parts == ["uploads"]:
+                    name = (parse_qs(urlparse(self.path).query).get("name") or ["archivo"])[0]
+                    return self._json(201, {"upload_id": service.save_upload(name, self._body())})
+                if parts == ["jobs"]:
+                    params = json.loads(self._body() or b"{}")
+                    job = service.submit(params)
+                    return self._json(202, job.to_dict())
+            except QueueFull as e:
+                return self._json(503, {"error": str(e)})
+            except (ValueError, json.JSONDecodeError) as e:
+                return self._json(400, {"error": str(e)})
+            self._json(404, {"error": "ruta no encontrada"})
+
+        def do_DELETE(self):
+            parts = self._parts()
+            if len(parts) == 2 and parts[0] == "jobs":
+                ok = service.delete(parts[1])
+                return self._json(200 if ok else 409, {"borrado": ok})
+            self._json(404, {"error": "ruta no encontrada"})
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def serve(service: ConsolidationService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """Crea el servidor HTTP (sin iniciar serve_forever)."""
+    return ThreadingHTTPServer((host, port), make_handler(service))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Servicio local de consolidación de Mercancía")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--max-queue", type=int, default=8)
+    ap.add_argument("--schema", default="./schema/schema.yaml")
+    ap.add_argument("--config-co", default=DEFAULT_CONFIGS["CO"])
+    ap.add_argument("--config-ve", default=DEFAULT_CONFIGS["VE"])
+    ap.add_argument("--workdir", default="./.cache/service")
+    ap.add_argument("--master-ttl", type=float, default=3600, help="segundos que un maestro descargado se reutiliza")
+    a = ap.parse_args()
+
+    service = ConsolidationService(a.schema, {"CO": a.config_co, "VE": a.config_ve}, a.workdir,
+                                   workers=a.workers, max_queue=a.max_queue, caches=SharedCaches(master_ttl_s=a.master_ttl))
+    httpd = serve(service, a.host, a.port)
+    print(f"Servicio en http://{a.host}:{a.port} ({a.workers} workers)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Mapping, Tuple
+import numpy as np
+import pandas as pd
+from core.dtypes import to_datetime_smart, smart_to_numeric
+from core.inputs import SOURCE_FILE_COLUMN
+from core.utils import header_matcher, match_headers
+
+
+class ValidationError(ValueError):
+    """Fuente claramente inválida: se aborta la corrida antes de las etapas costosas."""
+
+
+REPORT_COLS = ["fuente", "chequeo", "columna", "valor", "umbral", "estado"]
+
+
+def _bad_cells(raw: pd.Series, parser: Callable[[pd.Series], pd.Series]) -> Tuple[int, np.ndarray]:
+    """
+    (celdas no vacías, máscara de celdas que no parsean). Se parsea una vez por valor distinto
+    y el resultado se propaga a las filas con los códigos de factorize.
+    """
+    s = raw.astype("string").str.strip()
+    present = (s.notna() & s.str.len().gt(0)).fillna(False).to_numpy()
+    codes, uniques = pd.factorize(s.where(present))
+    if len(uniques) == 0:
+        return 0, np.zeros(len(s), dtype=bool)
+    ok_u = parser(pd.Series(uniques, dtype="string")).notna().to_numpy()
+    bad = present & (codes >= 0) & ~ok_u[np.maximum(codes, 0)]
+    return int(present.sum()), bad
+
+
+def validate_source(df_raw: pd.DataFrame, src: str, cfg: Dict[str, Any],
+                    headers: Mapping[str, str] | None = None) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Valida una fuente recién leída según mercancia.validation.sources.<src>:
+      required: columnas estándar que deben poder mapearse desde column_maps
+      dates / numeric: {columna_estandar: tasa_minima_de_parseo}
+      min_rows: mínimo de filas (sin él no se exige; una fuente vacía solo se informa)
+      max_bad_lines: máximo de líneas CSV descartadas por mal formadas (sin él solo se informan)
+    Las filas con celdas no parseables van a cuarentena (y se descartan si quarantine.drop).
+    Si algún chequeo falla y abort_on_fail (default) se levanta ValidationError.
+
+    Retorna (df_para_normalizar, {"report": ..., "quarantine": ...}).
+    """
+    val_cfg = (cfg.get("validation") or {})
+    empty = {"report": pd.DataFrame(columns=REPORT_COLS), "quarantine": pd.DataFrame()}
+    if not val_cfg.get("enabled"):
+        return df_raw, empty
+
+    src_cfg = (val_cfg.get("sources") or {}).get(src, {}) or {}
+    if headers is None:
+        headers = header_matcher((cfg.get("column_maps") or {}).get(src, {}) or {})
+    label = src.upper()
+
+    # estándar -> primer encabezado crudo presente que lo mapea (mismo match que normalize_source)
+    rename = match_headers(df_raw.columns, headers)
+    std_to_raw: Dict[str, str] = {std: raw_name for raw_name, std in rename.items()}
+
+    rows: List[Dict[str, Any]] = []
+    failures: List[str] = []
+
+    def add(chequeo, columna, valor, umbral, ok):
+        rows.append({"fuente": label, "chequeo": chequeo, "columna": columna, "valor": valor, "umbral": umbral,
+                     "estado": "OK" if ok else "FALLA"})
+        if not ok:
+            failures.append(f"{label}: {chequeo} '{columna}' = {valor} (umbral {umbral})")
+
+    # Una fuente vacía (p. ej. una semana sin recepciones RSF) es válida salvo que se pida min_rows
+    min_rows = src_cfg.get("min_rows")
+    if min_rows is not None:
+        add("filas", "*", len(df_raw), int(min_rows), len(df_raw) >= int(min_rows))
+    elif not len(df_raw):
+        rows.append({"fuente": label, "chequeo": "filas", "columna": "*", "valor": 0, "umbral": None, "estado": "INFO"})
+
+    # Líneas CSV mal formadas que el lector descartó (core.Lectura.read_csv_source)
+    bad_lines = df_raw.attrs.get("bad_lines")
+    if bad_lines:
+        max_bad = src_cfg.get("max_bad_lines")
+        if max_bad is None:
+            rows.append({"fuente": label, "chequeo": "lineas_descartadas", "columna": "*", "valor": int(bad_lines),
+                         "umbral": None, "estado": "INFO"})
+        else:
+            add("lineas_descartadas", "*", int(bad_lines), int(max_bad), bad_lines <= int(max_bad))
+
+    # Fuente en varios archivos (core.inputs.combine_source_files)
+    files = df_raw.attrs.get("input_files")
+    if files:
+        rows.append({"fuente": label, "chequeo": "archivos", "columna": ", ".join(files), "valor": len(files),
+                     "umbral": None, "estado": "INFO"})
+        if df_raw.attrs.get("duplicate_rows"):
+            rows.append({"fuente": label, "chequeo": "duplicados_entre_archivos", "columna": "*",
+                         "valor": int(df_raw.attrs["duplicate_rows"]), "umbral": None, "estado": "INFO"})
+
+    for std in src_cfg.get("required", []) or []:
+        add("columna_requerida", std, std_to_raw.get(std, "—"), "mapeada", std in std_to_raw)
+
+    unmapped = [c for c in df_raw.columns if c not in rename and c != SOURCE_FILE_COLUMN]
+    if unmapped:
+        rows.append({"fuente": label, "chequeo": "encabezados_sin_mapear", "columna": ", ".join(map(str, unmapped)),
+                     "valor": len(unmapped), "umbral": None, "estado": "INFO"})
+
+    bad_any = np.zeros(len(df_raw), dtype=bool)
+    reasons = np.full(len(df_raw), "", dtype=object)
+    checks = [("fecha", to_datetime_smart, src_cfg.get("dates") or {}),
+              ("numero", smart_to_numeric, src_cfg.get("numeric") or {})]
+    for kind, parser, cols in checks:
+        for std, min_rate in cols.items():
+            raw_name = std_to_raw.get(std)
+            if raw_name is None:
+                continue
+            n, bad = _bad_cells(df_raw[raw_name], parser)
+            rate = 1.0 - (bad.sum() / n) if n else 1.0
+            add(f"tasa_parseo_{kind}", std, round(rate, 4), min_rate, rate >= float(min_rate))
+            if bad.any():
+                bad_any |= bad
+                reasons[bad] = np.where(reasons[bad] == "", f"{std} no es {kind}", reasons[bad] + f"; {std} no es {kind}")
+
+    report = pd.DataFrame(rows, columns=REPORT_COLS)
+    if failures and val_cfg.get("abort_on_fail", True):
+        raise ValidationError("Validación de entradas fallida:\n  " + "\n  ".join(failures))
+
+    quarantine = pd.DataFrame()
+    if bad_any.any():
+        quarantine = df_raw.loc[bad_any].copy()
+        quarantine.insert(0, "__motivo", reasons[bad_any])
+        quarantine.insert(0, "__fuente", label)
+        if (val_cfg.get("quarantine") or {}).get("drop", False):
+            df_raw = df_raw.loc[~bad_any].reset_index(drop=True)
+    return df_raw, {"report": report, "quarantine": quarantine}
+
+
+def combine_validations(results: List[Dict[str, pd.DataFrame]], val_cfg: Dict[str, Any] | None = None) -> Dict[str, pd.DataFrame]:
+    """Une reportes/cuarentenas por fuente y, si se configuró quarantine.path, escribe el CSV."""
+    report = pd.concat([r["report"] for r in results], ignore_index=True) if results else pd.DataFrame(columns=REPORT_COLS)
+    qs = [r["quarantine"] for r in results if not r["quarantine"].empty]
+    quarantine = pd.concat(qs, ignore_index=True, sort=False) if qs else pd.DataFrame()
+    path = ((val_cfg or {}).get("quarantine") or {}).get("path")
+    if path and not quarantine.empty:
+        quarantine.to_csv(path, index=False, encoding="utf-8-sig")
+    return {"report": report, "quarantine": quarantine}
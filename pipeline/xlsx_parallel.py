@@ -0,0 +1,152 @@
+"""
+Export paralelo del libro (export.writer.mode: parallel).
+
+Cada hoja de un xlsx es una parte XML independiente dentro del zip. Cada hoja se escribe
+en un proceso aparte como un libro xlsxwriter de una sola hoja (constant_memory: strings
+inline, sin tabla de strings compartida que reconciliar) con los mismos formatos fijados
+en el mismo orden, así el styles.xml de todas las partes coincide con el del esqueleto.
+Al final se arma el paquete: un esqueleto con todas las hojas vacías (workbook.xml,
+rels, content types, estilos) al que se le cambian las partes de hoja por las de los
+workers, copiando los bytes ya comprimidos (sin volver a comprimir en el proceso principal).
+"""
+from __future__ import annotations
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Tuple
+import pandas as pd
+
+from .xlsx_stream import DEFAULT_CHUNK_ROWS, StreamingSheetWriter
+
+_PLACEHOLDER = "_"          # hoja vacía que queda seleccionada en las partes (solo la 1.ª del libro final lo está)
+_ZIP64_LIMIT = 0xFFFFFFFF
+
+
+def _new_book(path: str, chunk_rows: int):
+    import xlsxwriter
+    book = xlsxwriter.Workbook(path, {"constant_memory": True})
+    sw = StreamingSheetWriter(book, chunk_rows)
+    sw.pin_formats()
+    return book, sw
+
+
+def write_sheet_part(path: str, df: pd.DataFrame, first: bool,
+                     extra: Tuple[str, Callable[[int], str]] | None = None,
+                     chunk_rows: int = DEFAULT_CHUNK_ROWS) -> str:
+    """
+    (En un worker) libro de una hoja con df. Si la hoja no va primera en el libro final se
+    antepone una hoja vacía para que la de datos no quede seleccionada. Retorna el nombre
+    de la parte XML de la hoja dentro de `path`.
+    """
+    book, sw = _new_book(path, chunk_rows)
+    if not first:
+        book.add_worksheet(_PLACEHOLDER)
+    sw.write("Hoja", df, extra=extra)
+    book.close()
+    return f"xl/worksheets/sheet{1 if first else 2}.xml"
+
+
+class ParallelWorkbook:
+    """
+    Libro cuyas hojas se serializan en paralelo. add() manda la hoja a un worker apenas se
+    pide (en el orden final del libro) y close() espera las partes y arma el paquete.
+    """
+
+    def __init__(self, out_path: str, workers: int | None = None, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.out_path = out_path
+        self.chunk_rows = int(chunk_rows)
+        self.workers = int(workers or 0) or (os.cpu_count() or 1)
+        self._tmp = tempfile.mkdtemp(prefix="xlsx_parts_", dir=os.path.dirname(os.path.abspath(out_path)))
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._sheets: List[Tuple[str, str, Future]] = []
+
+    def add(self, sheet_name: str, df: pd.DataFrame, extra: Tuple[str, Callable[[int], str]] | None = None) -> None:
+        part = os.path.join(self._tmp, f"part{len(self._sheets)}.xlsx")
+        fut = self._pool.submit(write_sheet_part, part, df, not self._sheets, extra, self.chunk_rows)
+        self._sheets.append((sheet_name, part, fut))
+
+    def close(self) -> None:
+        try:
+            members = [(part, fut.result()) for _, part, fut in self._sheets]
+            skeleton = os.path.join(self._tmp, "skeleton.xlsx")
+            book, _ = _new_book(skeleton, self.chunk_rows)
+            for name, _, _ in self._sheets:
+                book.add_worksheet(name)
+            book.close()
+            _assemble(self.out_path, skeleton, members)
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+# --- armado del zip copiando miembros ya comprimidos ---
+
+def _assemble(out_path: str, skeleton: str, parts: List[Tuple[str, str]]) -> None:
+    """Paquete final: miembros del esqueleto, con xl/worksheets/sheetN.xml tomado de la parte N."""
+    swap = {f"xl/worksheets/sheet{i + 1}.xml": src for i, src in enumerate(parts)}
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(skeleton) as sk, open(tmp, "wb") as out:
+        central: List[bytes] = []
+        for info in sk.infolist():
+            if info.filename in swap:
+                path, member = swap[info.filename]
+                with zipfile.ZipFile(path) as zp:
+                    central.append(_copy_member(out, path, zp.getinfo(member), info.filename))
+            else:
+                central.append(_copy_member(out, skeleton, info, info.filename))
+        _end_of_central_directory(out, central)
+    os.replace(tmp, out_path)
+
+
+def _dos_datetime(info: zipfile.ZipInfo) -> Tuple[int, int]:
+    y, mo, d, h, mi, s = info.date_time
+    return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+
+def _copy_member(out, src_path: str, info: zipfile.ZipInfo, arcname: str) -> bytes:
+    """Copia el miembro comprimido tal cual (sin descomprimir) y retorna su entrada del directorio central."""
+    offset = out.tell()
+    name = arcname.encode("utf-8")
+    dtime, ddate = _dos_datetime(info)
+    zip64 = info.file_size >= _ZIP64_LIMIT or info.compress_size >= _ZIP64_LIMIT
+    extra = struct.pack("<HHQQ", 1, 16, info.file_size, info.compress_size) if zip64 else b""
+    sizes = (_ZIP64_LIMIT, _ZIP64_LIMIT) if zip64 else (info.compress_size, info.file_size)
+    version = 45 if zip64 else 20
+    out.write(struct.pack("<IHHHHHIIIHH", 0x04034B50, version, 0, info.compress_type, dtime, ddate,
+                          info.CRC, *sizes, len(name), len(extra)) + name + extra)
+    with open(src_path, "rb") as f:
+        f.seek(info.header_offset)
+        head = f.read(30)
+        f.seek(info.header_offset + 30 + struct.unpack("<H", head[26:28])[0] + struct.unpack("<H", head[28:30])[0])
+        left = info.compress_size
+        while left:
+            buf = f.read(min(left, 1 << 20))
+            out.write(buf)
+            left -= len(buf)
+
+    big_offset = offset >= _ZIP64_LIMIT
+    cextra = b""
+    if zip64 or big_offset:
+        vals = ([info.file_size, info.compress_size] if zip64 else []) + ([offset] if big_offset else [])
+        cextra = struct.pack("<HH", 1, 8 * len(vals)) + struct.pack(f"<{len(vals)}Q", *vals)
+        version = 45
+    return struct.pack("<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, 0, info.compress_type, dtime, ddate,
+                       info.CRC, *sizes, len(name), len(cextra), 0, 0, 0, 0,
+                       _ZIP64_LIMIT if big_offset else offset) + name + cextra
+
+
+def _end_of_central_directory(out, central: List[bytes]) -> None:
+    start = out.tell()
+    for entry in central:
+        out.write(entry)
+    size, n = out.tell() - start, len(central)
+    if start >= _ZIP64_LIMIT or n >= 0xFFFF:
+        eocd64 = out.tell()
+        out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, n, n, size, start))
+        out.write(struct.pack("<IIQI", 0x07064B50, 0, eocd64, 1))
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, _ZIP64_LIMIT, _ZIP64_LIMIT, 0))
+    else:
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, n, n, size, start, 0))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+import datetime as _dt
+from typing import Callable, List, Tuple
+import numpy as np
+import pandas as pd
+
+EXCEL_MAX_ROWS = 1_048_576        # filas por hoja (incluye el encabezado)
+DEFAULT_CHUNK_ROWS = 20_000
+
+# Mismos formatos que usa pandas.to_excel
+HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+DATE_FORMAT = "yyyy-mm-dd"
+
+
+def split_ranges(n: int, max_rows: int = EXCEL_MAX_ROWS) -> List[Tuple[int, int]]:
+    """Tramos [ini, fin) de filas de datos que caben en una hoja (se reserva la fila del encabezado)."""
+    per = max(int(max_rows) - 1, 1)
+    if n <= per:
+        return [(0, n)]
+    return [(a, min(a + per, n)) for a in range(0, n, per)]
+
+
+def _column_kind(s: pd.Series) -> str:
+    dt = s.dtype
+    if isinstance(dt, pd.CategoricalDtype):
+        return _column_kind(pd.Series(dt.categories)) if len(dt.categories) else "any"
+    if pd.api.types.is_datetime64_any_dtype(dt):
+        return "datetime"
+    if pd.api.types.is_bool_dtype(dt):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(dt):
+        return "number"
+    return "any"
+
+
+def _column_values(s: pd.Series, kind: str) -> Tuple[list, np.ndarray]:
+    """(valores Python del tramo, máscara de vacíos) para una columna."""
+    missing = s.isna().to_numpy()
+    if kind == "datetime":
+        if getattr(s.dt, "tz", None) is not None:
+            s = s.dt.tz_localize(None)
+        return list(s.dt.to_pydatetime()), missing
+    if kind == "number":
+        return s.to_numpy(dtype=float, na_value=np.nan).tolist(), missing
+    if kind == "bool":
+        return s.astype(object).tolist(), missing
+    return s.astype(object).tolist(), missing
+
+
+class StreamingSheetWriter:
+    """
+    Escritura de DataFrames con xlsxwriter en modo constant_memory: cada fila se vuelca a
+    disco al pasar a la siguiente, así la memoria no crece con el tamaño de la hoja.
+    Los valores se preparan por tramos de columnas (chunk_rows) y se escriben fila a fila.
+    """
+
+    def __init__(self, workbook, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.wb = workbook
+        self.chunk_rows = int(chunk_rows)
+        self.f_header = workbook.add_format(HEADER_FORMAT)
+        self.f_datetime = workbook.add_format({"num_format": DATETIME_FORMAT})
+        self.f_date = workbook.add_format({"num_format": DATE_FORMAT})
+
+    def pin_formats(self) -> None:
+        """
+        Fija el índice de estilo de los tres formatos en orden (xlsxwriter los numera al primer
+        uso): libros armados por separado quedan con el mismo styles.xml (export paralelo).
+        """
+        for f in (self.f_header, self.f_datetime, self.f_date):
+            f._get_xf_index()
+
+    def write(self, sheet_name: str, df: pd.DataFrame, start: int = 0, stop: int | None = None,
+              extra: Tuple[str, Callable[[int], str]] | None = None) -> None:
+        """
+        Escribe df.iloc[start:stop] en una hoja nueva. `extra` = (encabezado, fórmula(fila_excel))
+        agrega una columna de fórmula al final (fila_excel empieza en 2).
+        """
+        ws = self.wb.add_worksheet(sheet_name)
+        stop = len(df) if stop is None else stop
+        ncols = df.shape[1]
+        for c, name in enumerate(df.columns):
+            ws.write(0, c, name, self.f_header)
+        if extra is not None:
+            ws.write(0, ncols, extra[0])
+
+        kinds = [_column_kind(df.iloc[:, c]) for c in range(ncols)]
+        r = 1
+        for a in range(start, stop, self.chunk_rows):
+            b = min(a + self.chunk_rows, stop)
+            part = df.iloc[a:b]
+            cols = [_column_values(part.iloc[:, c], kinds[c]) for c in range(ncols)]
+            for i in range(b - a):
+                for c in range(ncols):
+                    vals, miss = cols[c]
+                    if miss[i]:
+                        continue
+                    self._cell(ws, r, c, vals[i], kinds[c])
+                if extra is not None:
+                    ws.write_formula(r, ncols, extra[1](r + 1))
+                r += 1
+
+    def _cell(self, ws, r: int, c: int, v, kind: str) -> None:
+        if kind == "number":
+            if np.isfinite(v):
+                ws.write_number(r, c, v)
+            return
+        if kind == "datetime":
+            ws.write_datetime(r, c, v, self.f_datetime)
+            return
+        if isinstance(v, (pd.Timestamp, _dt.datetime)):
+            if isinstance(v, pd.Timestamp):
+                v = v.tz_localize(None).to_pydatetime() if v.tzinfo else v.to_pydatetime()
+            ws.write_datetime(r, c, v, self.f_datetime)
+        elif isinstance(v, _dt.date):
+            ws.write_datetime(r, c, v, self.f_date)
+        elif isinstance(v, (float, np.floating)):
+            if np.isfinite(v):
+                ws.write_number(r, c, float(v))
+        elif isinstance(v, (bool, np.bool_)):
+            ws.write_boolean(r, c, bool(v))
+        elif isinstance(v, (int, np.integer)):
+            ws.write_number(r, c, int(v))
+        else:
+            ws.write(r, c, v if isinstance(v, str) else str(v))
+